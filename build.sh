@@ -5,5 +5,6 @@ set -o errexit
 pip install -r requirements.txt
 
 python manage.py migrate
+python manage.py createcachetable
 python manage.py collectstatic --no-input
 python manage.py loaddata currencies.json
\ No newline at end of file
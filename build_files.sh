@@ -2,5 +2,7 @@ pip install wheel
 pip install -r requirements.txt
 
 # python manage.py migrate
+# the default cache is a database table
+python3.9 manage.py createcachetable
 python3.9 manage.py collectstatic --no-input
 # python manage.py loaddata currencies.json
\ No newline at end of file
@@ -9,7 +9,12 @@ from .models import (
     UserPreferences,
     Loan,
     Rate,
-    CreditCard
+    RateHistory,
+    CreditCard,
+    CategoryMonthlyTotal,
+    PooledGuestUser,
+    TransactionName,
+    BalanceSnapshot,
 )
 
 
@@ -74,3 +79,33 @@ class UserPreferencesAdmin(admin.ModelAdmin):
 class RateAdmin(admin.ModelAdmin):
     list_display = ('currency', 'rate', 'updated')
     ordering = ('currency',)
+
+
+@admin.register(RateHistory)
+class RateHistoryAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'date', 'rate')
+    ordering = ('currency', '-date')
+
+
+@admin.register(BalanceSnapshot)
+class BalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('user', 'content_type', 'object_id', 'date', 'balance')
+    ordering = ('user__username', 'content_type', 'object_id', '-date')
+
+
+@admin.register(CategoryMonthlyTotal)
+class CategoryMonthlyTotalAdmin(admin.ModelAdmin):
+    list_display = ('user', 'category', 'currency', 'year', 'month', 'type', 'total', 'count')
+    ordering = ('user__username', '-year', '-month')
+
+
+@admin.register(TransactionName)
+class TransactionNameAdmin(admin.ModelAdmin):
+    list_display = ('user', 'name', 'type', 'count', 'last_used')
+    ordering = ('user__username', '-count')
+
+
+@admin.register(PooledGuestUser)
+class PooledGuestUserAdmin(admin.ModelAdmin):
+    list_display = ('user', 'created')
+    ordering = ('created',)
@@ -0,0 +1,55 @@
+'''
+Request-scoped asset snapshot. Pages that show several asset dropdowns and currency or
+balance data load a user's active accounts, loans and credit cards once per request and
+share them between helpers, forms and templates.
+'''
+from django.utils.functional import cached_property
+from .models import Account, CreditCard, Loan
+
+
+class AssetSnapshot:
+    """
+    Active accounts, loans and credit cards of a user with their currencies. Each asset
+    type is loaded with one query when it is first used.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def get_assets(self, model):
+        return list(model.objects.filter(user=self.user, is_active=True).select_related("currency"))
+
+    @cached_property
+    def accounts(self):
+        return self.get_assets(Account)
+
+    @cached_property
+    def loans(self):
+        return self.get_assets(Loan)
+
+    @cached_property
+    def cards(self):
+        return self.get_assets(CreditCard)
+
+    @staticmethod
+    def get_currency_data(assets):
+        """
+        Returns a dictionary in which keys are asset ids and values are currency codes.
+        """
+        return {asset.id: asset.currency.code for asset in assets}
+
+    @staticmethod
+    def get_balance_data(assets):
+        """
+        Returns a dictionary in which keys are asset ids and values are balances.
+        """
+        return {asset.id: asset.balance for asset in assets}
+
+
+def get_asset_snapshot(request):
+    """
+    Returns the asset snapshot of the request user, creating it on first use.
+    """
+    if not hasattr(request, "asset_snapshot"):
+        request.asset_snapshot = AssetSnapshot(request.user)
+    return request.asset_snapshot
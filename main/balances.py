@@ -0,0 +1,142 @@
+'''
+Asset balance ledger. Balances are changed in the database with
+UPDATE ... SET balance = balance + delta, so concurrent requests never overwrite each
+other's changes with a stale balance read into memory. Multi-leg operations (transfers,
+debt payments, edits) collect their deltas in a batch and apply one UPDATE per asset
+at the end, in a fixed asset order so two batches can't deadlock on each other's rows.
+Balance changes of transactions are also applied to the daily balance snapshots of their
+dates, after the asset rows are updated and so locked.
+'''
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from decimal import Decimal
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from .snapshots import apply_balance_snapshot_delta
+
+_current_ledger = ContextVar("balance_ledger", default=None)
+
+
+class BalanceLedger:
+    """
+    Balance deltas by asset and by asset and date. assets maps (model label, id) keys to
+    the asset model and to the in-memory instances whose balance is kept in step with the
+    database.
+    """
+
+    def __init__(self):
+        self.deltas = {}
+        self.daily_deltas = {}
+        self.assets = {}
+
+    def add(self, model, asset_id, delta, instance=None, day=None):
+        """
+        Adds a balance delta of an asset. Deltas with a date are also applied to the
+        balance snapshots of the asset.
+        """
+        key = (model._meta.label, asset_id)
+        self.deltas[key] = self.deltas.get(key, Decimal(0)) + Decimal(delta)
+        if day is not None:
+            daily_key = (*key, day)
+            self.daily_deltas[daily_key] = self.daily_deltas.get(daily_key, Decimal(0)) + Decimal(delta)
+        model, instances = self.assets.setdefault(key, (model, []))
+        if instance is not None and all(instance is not other for other in instances):
+            instances.append(instance)
+
+    def add_transaction(self, transaction_obj, sign=1):
+        """
+        Adds (sign=1) or withdraws (sign=-1) a transaction's effect on its asset balance.
+        """
+        model = ContentType.objects.get_for_id(transaction_obj.content_type_id).model_class()
+        instance = type(transaction_obj).content_object.get_cached_value(transaction_obj, None)
+        if not isinstance(instance, model) or instance.pk != transaction_obj.object_id:
+            instance = None
+        day = type(transaction_obj)._meta.get_field("date").to_python(transaction_obj.date)
+        self.add(model, transaction_obj.object_id, sign * get_balance_delta(transaction_obj), instance, day)
+
+    def apply(self):
+        """
+        Applies the deltas with one UPDATE per asset, ordered by model and id, then the
+        daily deltas to the balance snapshots. Returns the number of updated assets.
+        """
+        updated = 0
+        changes = [(key, self.deltas[key]) for key in sorted(self.deltas) if self.deltas[key]]
+        daily_changes = [(key, self.daily_deltas[key]) for key in sorted(self.daily_deltas) if self.daily_deltas[key]]
+        with transaction.atomic() if len(changes) > 1 or daily_changes else nullcontext():
+            for key, delta in changes:
+                model, instances = self.assets[key]
+                updated += model.objects.filter(pk=key[1]).update(balance=F("balance") + delta)
+                for instance in instances:
+                    instance.balance += delta
+            locked = {key for key, delta in changes}
+            for (label, asset_id, day), delta in daily_changes:
+                model = self.assets[(label, asset_id)][0]
+                if (label, asset_id) not in locked:
+                    # a date change nets to zero on the asset, lock it as the UPDATE would have
+                    list(model.objects.select_for_update().filter(pk=asset_id).values_list("pk"))
+                    locked.add((label, asset_id))
+                apply_balance_snapshot_delta(model, asset_id, day, delta)
+        self.deltas = {}
+        self.daily_deltas = {}
+        self.assets = {}
+        return updated
+
+
+def get_balance_delta(transaction_obj):
+    """
+    Returns the change a transaction makes to its asset balance: expenses decrease it,
+    incomes increase it.
+    """
+    amount = abs(type(transaction_obj)._meta.get_field("amount").to_python(transaction_obj.amount))
+    return -amount if transaction_obj.type == "E" else amount
+
+
+def get_current_ledger():
+    return _current_ledger.get()
+
+
+@contextmanager
+def batch_balance_updates():
+    """
+    Collects balance changes made inside the block and applies them when the outermost
+    block exits without an error. Nested blocks join the outer batch.
+    """
+    ledger = get_current_ledger()
+    if ledger is not None:
+        yield ledger
+        return
+    ledger = BalanceLedger()
+    token = _current_ledger.set(ledger)
+    try:
+        with transaction.atomic():
+            yield ledger
+            _current_ledger.reset(token)
+            token = None
+            ledger.apply()
+    finally:
+        if token is not None:
+            _current_ledger.reset(token)
+
+
+def change_asset_balance(transaction_obj, sign=1):
+    """
+    Adds (sign=1) or withdraws (sign=-1) a transaction's effect on its asset balance,
+    in the open batch if there is one or right away otherwise.
+    """
+    ledger = get_current_ledger()
+    if ledger is not None:
+        ledger.add_transaction(transaction_obj, sign)
+        return
+    ledger = BalanceLedger()
+    ledger.add_transaction(transaction_obj, sign)
+    ledger.apply()
+
+
+def lock_asset_balance(asset):
+    """
+    Locks an asset row until the end of the transaction, reloads its balance and
+    returns it. Used where a decision depends on the current balance.
+    """
+    asset.balance = type(asset).objects.select_for_update().values_list("balance", flat=True).get(pk=asset.pk)
+    return asset.balance
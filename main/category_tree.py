@@ -0,0 +1,102 @@
+'''
+Per-user category tree cache. A user's categories are loaded with one query into plain
+arrays (tree order, children, lft/rght ranges) and kept in Django's cache until a
+category of the user is saved or deleted. Stats functions use it to find descendants and
+to roll sums up the tree without querying categories again.
+'''
+from bisect import bisect_right
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Category
+
+CATEGORY_TREE_KEY = "main:category_tree:{user_id}"
+CATEGORY_TREE_TIMEOUT = 60 * 60 * 24
+CATEGORY_TREE_FIELDS = ("id", "user_id", "name", "parent_id", "tree_id", "lft", "rght", "level", "type", "is_transfer", "is_protected")
+
+
+class CategoryTree:
+    """
+    Category tree of a user. categories maps ids to dictionaries of category fields.
+    """
+
+    def __init__(self, user_id, rows):
+        self.user_id = user_id
+        rows = sorted(rows, key=lambda row: (row["tree_id"], row["lft"]))
+        self.categories = {row["id"]: row for row in rows}
+        self.order = [row["id"] for row in rows]
+        self.children = {}
+        self.trees = {}
+        for row in rows:
+            self.children.setdefault(row["parent_id"], []).append(row["id"])
+            self.trees.setdefault(row["tree_id"], []).append(row["id"])
+        self.tree_lfts = {
+            tree_id: [self.categories[category_id]["lft"] for category_id in ids]
+            for tree_id, ids in self.trees.items()
+        }
+
+    def __contains__(self, category_id):
+        return category_id in self.categories
+
+    def get_descendant_ids(self, category_id, include_self=True):
+        """
+        Returns ids of descendants of a category in tree order.
+        """
+        category = self.categories[category_id]
+        tree = self.trees[category["tree_id"]]
+        start = tree.index(category_id)
+        end = bisect_right(self.tree_lfts[category["tree_id"]], category["rght"])
+        return tree[start if include_self else start + 1:end]
+
+    def get_root_id(self, category_id):
+        return self.trees[self.categories[category_id]["tree_id"]][0]
+
+    def get_child_ids(self, parent_id, category_type):
+        """
+        Returns ids of the user's categories of a type under a parent id, None for main
+        categories.
+        """
+        return [
+            category_id for category_id in self.children.get(parent_id, [])
+            if self.categories[category_id]["type"] == category_type
+            and self.categories[category_id]["user_id"] == self.user_id
+        ]
+
+    def get_main_category_ids(self, category_type):
+        return self.get_child_ids(None, category_type)
+
+    def get_subtree_sum(self, category_id, sums):
+        """
+        Takes a category id and a dictionary of sums by category id. Returns the total of
+        the category and its descendants or None if none of them has a sum.
+        """
+        values = [sums[descendant_id] for descendant_id in self.get_descendant_ids(category_id) if descendant_id in sums]
+        return sum(values) if values else None
+
+
+def get_category_tree(user, *category_ids):
+    """
+    Takes a user or user id and returns the cached CategoryTree of the user. If category
+    ids are given and the cached tree lacks one of them, the tree was cached before the
+    category was created (e.g. read by another worker while the write was in flight) and
+    is reloaded. None ids are ignored.
+    """
+    user_id = getattr(user, "id", user)
+    key = CATEGORY_TREE_KEY.format(user_id=user_id)
+    tree = cache.get(key)
+    if tree is None or any(category_id is not None and category_id not in tree for category_id in category_ids):
+        tree_ids = Category.objects.filter(user_id=user_id).values("tree_id")
+        rows = Category.objects.filter(tree_id__in=tree_ids).values(*CATEGORY_TREE_FIELDS)
+        tree = CategoryTree(user_id, list(rows))
+        cache.set(key, tree, CATEGORY_TREE_TIMEOUT)
+    return tree
+
+
+def invalidate_category_tree(user):
+    cache.delete(CATEGORY_TREE_KEY.format(user_id=getattr(user, "id", user)))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_user_category_tree(sender, instance, **kwargs):
+    invalidate_category_tree(instance.user_id)
@@ -12,10 +12,54 @@ from django.forms import (
 )
 
 from .models import Account, Currency, Transaction, Transfer, Category, Loan, CreditCard
+from django.forms.models import ModelChoiceIterator
 from mptt.forms import TreeNodeChoiceField
 from datetime import date
 from .form_fields import MathDecimalField
 
+class AssetChoiceIterator(ModelChoiceIterator):
+
+    def __iter__(self):
+        if self.field.assets is None:
+            yield from super().__iter__()
+            return
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for asset in self.field.assets:
+            yield self.choice(asset)
+
+    def __len__(self):
+        if self.field.assets is None:
+            return super().__len__()
+        return len(self.field.assets) + (self.field.empty_label is not None)
+
+
+class AssetChoiceField(ModelChoiceField):
+    """
+    Model choice field which renders and validates choices from a list of loaded assets
+    (see AssetSnapshot) instead of querying its queryset. Works as a ModelChoiceField 
+    if no assets are given.
+    """
+    iterator = AssetChoiceIterator
+
+    def __init__(self, queryset, assets=None, **kwargs):
+        self.assets = assets
+        super().__init__(queryset, **kwargs)
+
+    def to_python(self, value):
+        if self.assets is None:
+            return super().to_python(value)
+        if value in self.empty_values:
+            return None
+        key = str(getattr(value, "pk", value))
+        for asset in self.assets:
+            if str(asset.pk) == key:
+                return asset
+        raise ValidationError(
+            self.error_messages["invalid_choice"], code="invalid_choice", params={"value": value}
+        )
+
+
 class MyModelChoiceField(ModelChoiceField):
 
    def to_python(self, value):
@@ -165,14 +209,16 @@ class TransferForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop("user", None)
+        assets = kwargs.pop("assets", None)
         super().__init__(*args, **kwargs)
         if user:
             qs = Account.objects.filter(user=user, is_active=True)
-            self.fields["from_account"] = forms.ModelChoiceField(
-                queryset=qs, widget=Select(attrs={"id": "from-account-field"})
+            accounts = assets.accounts if assets else None
+            self.fields["from_account"] = AssetChoiceField(
+                queryset=qs, assets=accounts, widget=Select(attrs={"id": "from-account-field"})
             )
-            self.fields["to_account"] = forms.ModelChoiceField(
-                queryset=qs, widget=Select(attrs={"id": "to-account-field"})
+            self.fields["to_account"] = AssetChoiceField(
+                queryset=qs, assets=accounts, widget=Select(attrs={"id": "to-account-field"})
             )
 
     def clean(self):
@@ -198,15 +244,20 @@ class PayLoanForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop("user", None)
+        assets = kwargs.pop("assets", None)
         super().__init__(*args, **kwargs)
         if user:
             qs_account = Account.objects.filter(user=user, is_active=True)
             qs_loan = Loan.objects.filter(user=user, is_active=True)
-            self.fields["account"] = forms.ModelChoiceField(
-                queryset=qs_account, widget=Select(attrs={"id": "account-field"})
+            self.fields["account"] = AssetChoiceField(
+                queryset=qs_account,
+                assets=assets.accounts if assets else None,
+                widget=Select(attrs={"id": "account-field"}),
             )
-            self.fields["loan"] = forms.ModelChoiceField(
-                queryset=qs_loan, widget=Select(attrs={"id": "loan-field"})
+            self.fields["loan"] = AssetChoiceField(
+                queryset=qs_loan,
+                assets=assets.loans if assets else None,
+                widget=Select(attrs={"id": "loan-field"}),
             )
             self.user = user
         self.fields["account"].label_from_instance = self.label_from_instance
@@ -240,15 +291,20 @@ class PayCreditCardForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop("user", None)
+        assets = kwargs.pop("assets", None)
         super().__init__(*args, **kwargs)
         if user:
             qs_account = Account.objects.filter(user=user, is_active=True)
             qs_card = CreditCard.objects.filter(user=user, is_active=True)
-            self.fields["account"] = forms.ModelChoiceField(
-                queryset=qs_account, widget=Select(attrs={"id": "account-field"})
+            self.fields["account"] = AssetChoiceField(
+                queryset=qs_account,
+                assets=assets.accounts if assets else None,
+                widget=Select(attrs={"id": "account-field"}),
             )
-            self.fields["card"] = forms.ModelChoiceField(
-                queryset=qs_card, widget=Select(attrs={"id": "card-field"})
+            self.fields["card"] = AssetChoiceField(
+                queryset=qs_card,
+                assets=assets.cards if assets else None,
+                widget=Select(attrs={"id": "card-field"}),
             )
             self.user = user
         self.fields["account"].label_from_instance = self.label_from_instance
@@ -333,4 +389,16 @@ class CreateCreditCardForm(ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields["payment_day"] = IntegerField(max_value=31, min_value=1, required=True)
\ No newline at end of file
+        self.fields["payment_day"] = IntegerField(max_value=31, min_value=1, required=True)
+
+class TransactionImportForm(forms.Form):
+    file = forms.FileField(help_text="A CSV file with date, name and amount columns or an OFX statement.")
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop("user", None)
+        super().__init__(*args, **kwargs)
+        self.fields["account"] = ModelChoiceField(
+            queryset=Account.objects.filter(user=user, is_active=True),
+            required=False,
+            help_text="Account of the rows that don't name an asset and of OFX statements.",
+        )
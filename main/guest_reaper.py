@@ -0,0 +1,138 @@
+'''
+Expired guest user reaper. Guest users are bound to a session that expires after a day.
+Once no unexpired session is left, their data is deleted in batches of users with one
+DELETE statement per table, bypassing Django's deletion collector and MPTT.
+
+The in-process reaper thread starts in every web worker. A run first takes a lock in the
+shared cache that expires after the interval, so the workers reap in turns, not all at once.
+'''
+import logging
+import threading
+import time
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import (
+    Account,
+    BalanceSnapshot,
+    Category,
+    CategoryMonthlyTotal,
+    CreditCard,
+    GuestUserSession,
+    Loan,
+    PooledGuestUser,
+    Transaction,
+    TransactionName,
+    Transfer,
+    User,
+    UserPreferences,
+)
+
+logger = logging.getLogger(__name__)
+
+GUEST_USER_REAPER_LOCK_KEY = "guest_user_reaper_lock"
+
+# deleted in this order so that rows are removed before the rows they reference
+USER_DATA_MODELS = [
+    Transfer,
+    CategoryMonthlyTotal,
+    TransactionName,
+    BalanceSnapshot,
+    Transaction,
+    Category,
+    Account,
+    CreditCard,
+    Loan,
+    UserPreferences,
+    PooledGuestUser,
+]
+
+
+def get_expired_guest_users():
+    """
+    Returns a queryset of guest users without an unexpired session. Pooled guest users
+    haven't been claimed yet, so they are excluded.
+    """
+    active_users = GuestUserSession.objects.filter(
+        session__expire_date__gte=timezone.now()
+    ).values("user_id")
+    return User.objects.filter(is_guest=True, pooled_guest_user__isnull=True).exclude(id__in=active_users)
+
+
+def raw_delete(queryset):
+    """
+    Deletes rows of a queryset with a single DELETE statement without sending signals or
+    collecting related objects. Returns the number of deleted rows.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def delete_users_data(user_ids):
+    """
+    Deletes the given users and all of their data. Returns the number of deleted rows.
+    """
+    rows = 0
+    with transaction.atomic():
+        session_keys = list(
+            GuestUserSession.objects.filter(user_id__in=user_ids).values_list("session_id", flat=True)
+        )
+        rows += raw_delete(GuestUserSession.objects.filter(user_id__in=user_ids))
+        rows += raw_delete(Session.objects.filter(session_key__in=session_keys))
+        for model in USER_DATA_MODELS:
+            rows += raw_delete(model.objects.filter(user_id__in=user_ids))
+        # remaining relations (permissions, groups, admin log) are few, let the collector handle them
+        deleted, _ = User.objects.filter(id__in=user_ids).delete()
+        rows += deleted
+    return rows
+
+
+def reap_expired_guest_users(batch_size=100, max_batches=None):
+    """
+    Deletes expired guest users batch by batch. Returns the number of deleted users, the
+    number of deleted rows and elapsed seconds.
+    """
+    users = rows = batches = 0
+    start = time.perf_counter()
+    while max_batches is None or batches < max_batches:
+        user_ids = list(get_expired_guest_users().order_by("id").values_list("id", flat=True)[:batch_size])
+        if not user_ids:
+            break
+        rows += delete_users_data(user_ids)
+        users += len(user_ids)
+        batches += 1
+    return users, rows, time.perf_counter() - start
+
+
+def reap_expired_guest_users_if_due(interval, batch_size=100):
+    """
+    Reaps expired guest users unless another process did in the last interval seconds.
+    Returns the result of reap_expired_guest_users or None if the run was skipped.
+    """
+    if not cache.add(GUEST_USER_REAPER_LOCK_KEY, True, interval):
+        return None
+    return reap_expired_guest_users(batch_size)
+
+
+def start_guest_user_reaper(interval, batch_size=100):
+    """
+    Starts a daemon thread that reaps expired guest users every interval seconds, taking
+    turns with the reapers of other processes.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                result = reap_expired_guest_users_if_due(interval, batch_size)
+                if result is not None:
+                    users, rows, seconds = result
+                    logger.info("Deleted %s expired guest users (%s rows) in %.2f s.", users, rows, seconds)
+            except Exception:
+                # keep the thread alive, the next run retries
+                logger.exception("Reaping expired guest users failed.")
+            finally:
+                connection.close()
+
+    thread = threading.Thread(target=run, name="guest-user-reaper", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,87 @@
+'''
+Loan analytics. The running balance of a loan is computed by the database with a window
+function over its transactions, SUM(change) OVER (ORDER BY date), and read in one query.
+The chart series and the amortization projection (remaining months at the average monthly
+payment so far) are built in the same pass over the rows.
+'''
+import math
+from dateutil.relativedelta import relativedelta
+from django.db.models import Case, F, Sum, When, Window
+
+LOAN_PROJECTION_MAX_MONTHS = 360
+
+
+def get_loan_balance_rows(loan):
+    """
+    Returns a queryset of (date, type, amount, balance change up to and including the date)
+    tuples of a loan's transactions ordered by date.
+    """
+    change = Case(When(type="I", then=F("amount")), default=-F("amount"))
+    return (
+        loan.transactions.annotate(running_change=Window(Sum(change), order_by=F("date").asc()))
+        .order_by("date")
+        .values_list("date", "type", "amount", "running_change")
+    )
+
+
+def get_months_between(start, end):
+    return (end.year - start.year) * 12 + end.month - start.month
+
+
+def get_loan_projection(balance, average_payment, start):
+    """
+    Returns parallel lists of monthly dates after start and the remaining debt on them if
+    the loan is paid at the average payment, up to LOAN_PROJECTION_MAX_MONTHS months.
+    """
+    debt = abs(min(balance, 0))
+    if not debt or not average_payment:
+        return [], []
+    months = min(math.ceil(debt / average_payment), LOAN_PROJECTION_MAX_MONTHS)
+    dates = [start + relativedelta(months=month) for month in range(1, months + 1)]
+    balances = [max(debt - average_payment * month, 0) for month in range(1, months + 1)]
+    return dates, balances
+
+
+def get_loan_analytics(loan):
+    """
+    Takes a loan and returns a dictionary with parallel lists of dates and remaining debts
+    for the balance chart, payment totals, the average monthly payment and the projected
+    remaining months, payoff date and debts on the following months.
+    """
+    dates = [loan.created.date()]
+    balances = [abs(loan.initial)]
+    balance = loan.initial
+    paid = 0
+    first_payment = last_payment = None
+    for day, type, amount, running_change in get_loan_balance_rows(loan).iterator():
+        balance = loan.initial + running_change
+        if type == "I":
+            paid += amount
+            first_payment = first_payment or day
+            last_payment = day
+        # rows of a date share the closing balance of the date
+        if dates[-1] == day:
+            balances[-1] = abs(balance)
+        else:
+            dates.append(day)
+            balances.append(abs(balance))
+    average_payment = None
+    if last_payment is not None:
+        average_payment = round(paid / (get_months_between(first_payment, last_payment) + 1), 2)
+    projection_dates, projection_balances = get_loan_projection(balance, average_payment, last_payment or dates[-1])
+    remaining_months = None
+    if balance >= 0:
+        remaining_months = 0
+    elif average_payment:
+        remaining_months = math.ceil(abs(balance) / average_payment)
+    return {
+        "dates": dates,
+        "balances": balances,
+        "balance": balance,
+        "paid": paid,
+        "average_payment": average_payment,
+        "remaining_months": remaining_months,
+        "payoff_date": projection_dates[-1] if remaining_months and remaining_months <= LOAN_PROJECTION_MAX_MONTHS else None,
+        "projection_dates": projection_dates,
+        "projection_balances": projection_balances,
+    }
@@ -0,0 +1,116 @@
+import datetime
+import random
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from main.models import Account, Category, CreditCard, Currency, Loan, Transaction, User
+from main.utils import get_monthly_asset_balance_change
+
+BENCHMARK_INDEXES = [
+    "transaction_user_date_idx",
+    "transaction_asset_date_idx",
+    "transaction_category_date_idx",
+    "transaction_due_expense_idx",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds transactions and reports query plans and latencies of transaction hot "
+        "paths without and with the transaction indexes. All changes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transactions", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            assets = self.seed(options["transactions"], options["users"], options["batch_size"])
+            queries = self.get_queries(*assets)
+            indexes = [index for index in Transaction._meta.indexes if index.name in BENCHMARK_INDEXES]
+            self.execute_index_sql(index.remove_sql for index in indexes)
+            self.stdout.write(self.style.MIGRATE_HEADING("Without indexes"))
+            self.run_queries(queries, options["repeat"])
+            self.execute_index_sql(index.create_sql for index in indexes)
+            self.stdout.write(self.style.MIGRATE_HEADING("With indexes"))
+            self.run_queries(queries, options["repeat"])
+            transaction.set_rollback(True)
+
+    def execute_index_sql(self, sql_methods):
+        schema_editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for sql_method in sql_methods:
+                cursor.execute(str(sql_method(Transaction, schema_editor)))
+
+    def seed(self, transaction_count, user_count, batch_size):
+        currency = Currency.objects.first() or Currency.objects.create(code="USD", name="US Dollar")
+        prefix = uuid.uuid4().hex[:8]
+        user_assets = []
+        for number in range(max(user_count, 1)):
+            user = User.objects.create_user(username=f"benchmark-{prefix}-{number}")
+            user_assets.append((
+                user,
+                Account.objects.create(user=user, name="Account", currency=currency),
+                CreditCard.objects.create(user=user, name="Card", currency=currency, payment_day=15),
+                Loan.objects.create(user=user, name="Loan", currency=currency),
+                list(Category.objects.filter(user=user, children__isnull=True)),
+            ))
+        today = datetime.date.today()
+        for start in range(0, transaction_count, batch_size):
+            rows = []
+            for _ in range(min(batch_size, transaction_count - start)):
+                user, account, card, loan, categories = random.choice(user_assets)
+                asset = random.choices([account, card, loan], weights=[6, 3, 1])[0]
+                category = random.choice(categories)
+                row = Transaction(
+                    content_object=asset,
+                    user=user,
+                    asset_kind=asset._meta.model_name,
+                    name=f"transaction {random.randint(1, 500)}",
+                    amount=random.randint(1, 1000),
+                    date=today - datetime.timedelta(days=random.randint(-90, 5 * 365)),
+                    category=category,
+                    type=category.type,
+                )
+                if asset is card:
+                    row.due_date = card.get_next_payment_date(row.date)
+                rows.append(row)
+            Transaction.objects.bulk_create(rows)
+            self.stdout.write(f"{start + len(rows)} transactions created.")
+        user, account, card, loan, categories = user_assets[0]
+        return user, account, card, loan, categories[0]
+
+    def get_queries(self, user, account, card, loan, category):
+        month_start = datetime.date.today().replace(day=1)
+        month_end = (month_start + datetime.timedelta(days=32)).replace(day=1)
+        ordering = ("-date", "-created")
+        return {
+            "transaction archive": Transaction.objects.filter(
+                user=user, asset_kind__in=["account", "creditcard"], date__gte=month_start, date__lt=month_end
+            ).order_by(*ordering),
+            "account archive": account.transactions.filter(
+                date__gte=month_start, date__lt=month_end
+            ).order_by(*ordering),
+            "category archive": Transaction.objects.filter(
+                category=category, date__gte=month_start, date__lt=month_end
+            ).order_by(*ordering),
+            "credit card payment plan": card.transactions.filter(
+                due_date__gt=datetime.date.today(), type="E"
+            ),
+            "loan payment stats": loan.transactions.order_by("date"),
+            "monthly asset balance change": get_monthly_asset_balance_change(account),
+        }
+
+    def run_queries(self, queries, repeat):
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(max(repeat, 1)):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(self.style.SUCCESS(f"{name}: {min(timings) * 1000:.2f} ms"))
+            self.stdout.write(queryset.explain())
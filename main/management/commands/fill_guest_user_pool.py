@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from main.utils import fill_guest_user_pool, get_guest_user_pool_metrics
+
+
+class Command(BaseCommand):
+    help = "Tops up the pool of ready guest users used by test drives."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size", type=int, help="Number of guest users to keep. Defaults to GUEST_USER_POOL_SIZE."
+        )
+        parser.add_argument(
+            "--interval", type=int, help="Keep running and top up the pool every given seconds."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            created = fill_guest_user_pool(options["size"])
+            depth = get_guest_user_pool_metrics()["depth"]
+            self.stdout.write(self.style.SUCCESS(f"{created} guest users created. Pool depth: {depth}."))
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
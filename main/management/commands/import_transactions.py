@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from main.models import Account, User
+from main.transaction_import import (
+    IMPORT_CHUNK_SIZE,
+    TransactionImportError,
+    get_file_format,
+    import_transactions,
+)
+
+
+class Command(BaseCommand):
+    help = "Imports transactions of a user from a CSV or OFX file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path of the CSV or OFX file.")
+        parser.add_argument("--user", required=True, help="Username of the user the transactions belong to.")
+        parser.add_argument("--account", help="Name of the account of rows without an asset and of OFX statements.")
+        parser.add_argument("--format", choices=["csv", "ofx"], help="File format, guessed from the file extension by default.")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Number of rows inserted per query.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist.")
+        account = None
+        if options["account"]:
+            try:
+                account = Account.objects.get(user=user, name=options["account"], is_active=True)
+            except Account.DoesNotExist:
+                raise CommandError(f"Account {options['account']} does not exist.")
+        file_format = options["format"] or get_file_format(options["path"])
+        start = time.perf_counter()
+        try:
+            with open(options["path"], encoding="utf-8-sig", newline="") as lines:
+                count = import_transactions(user, lines, file_format, account, options["chunk_size"])
+        except (OSError, TransactionImportError) as e:
+            raise CommandError(str(e))
+        seconds = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"{count} transactions imported in {seconds:.2f} s."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from main.guest_reaper import reap_expired_guest_users
+
+
+class Command(BaseCommand):
+    help = "Deletes guest users whose sessions have expired, together with all of their data."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Number of users deleted per batch.")
+        parser.add_argument("--max-batches", type=int, help="Stop after the given number of batches.")
+
+    def handle(self, *args, **options):
+        users, rows, seconds = reap_expired_guest_users(options["batch_size"], options["max_batches"])
+        rate = rows / seconds if seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{users} guest users and {rows} rows deleted in {seconds:.2f} s ({rate:.0f} rows/s)."
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from main.models import User
+from main.snapshots import rebuild_balance_snapshots
+
+
+class Command(BaseCommand):
+    help = "Rebuilds daily asset balance snapshots from transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", help="Username of a single user whose snapshots will be rebuilt."
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist.")
+        count = rebuild_balance_snapshots(user)
+        self.stdout.write(self.style.SUCCESS(f"{count} balance snapshots created."))
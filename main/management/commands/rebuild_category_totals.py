@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from main.models import User
+from main.utils import rebuild_category_monthly_totals
+
+
+class Command(BaseCommand):
+    help = "Rebuilds monthly category totals from account transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", help="Username of a single user whose totals will be rebuilt."
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist.")
+        count = rebuild_category_monthly_totals(user)
+        self.stdout.write(self.style.SUCCESS(f"{count} monthly category totals created."))
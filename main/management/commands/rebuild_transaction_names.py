@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from main.models import User
+from main.utils import rebuild_transaction_names
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the transaction name autocomplete index from account and credit card transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", help="Username of a single user whose names will be rebuilt."
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist.")
+        count = rebuild_transaction_names(user)
+        self.stdout.write(self.style.SUCCESS(f"{count} transaction names created."))
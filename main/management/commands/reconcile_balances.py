@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from main.models import User
+from main.reconciliation import reconcile_balances
+
+
+class Command(BaseCommand):
+    help = "Checks that asset balances equal initial balance plus incomes minus expenses and optionally repairs them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", help="Username of a single user whose balances will be checked."
+        )
+        parser.add_argument("--repair", action="store_true", help="Correct the balances that drifted.")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Number of users checked per query.")
+        parser.add_argument("--workers", type=int, default=1, help="Number of chunks processed in parallel.")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options["user"]:
+            users = users.filter(username=options["user"])
+            if not users.exists():
+                raise CommandError(f"User {options['user']} does not exist.")
+        checked, drifts, repaired = reconcile_balances(
+            users, options["repair"], options["chunk_size"], options["workers"]
+        )
+        for drift in drifts:
+            self.stdout.write(self.style.WARNING(
+                f"{drift['model'].__name__} {drift['id']} of user {drift['user_id']}: "
+                f"balance {drift['balance']}, expected {drift['expected']} (drift {drift['drift']})."
+            ))
+        self.stdout.write(self.style.SUCCESS(f"{checked} assets checked, {len(drifts)} drifted."))
+        if options["repair"]:
+            self.stdout.write(self.style.SUCCESS(f"{repaired} balances repaired."))
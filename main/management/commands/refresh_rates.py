@@ -0,0 +1,43 @@
+import json
+from decimal import Decimal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from main.rates import refresh_rates
+
+RATES_API_URL = "https://api.apilayer.com/fixer/latest?base=USD"
+
+
+class Command(BaseCommand):
+    help = "Refreshes currency rates from the rates API or a local JSON payload in one transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", help="Path of a JSON payload to read instead of calling the API.")
+        parser.add_argument("--save", help="Path to write the fetched API payload to, e.g. rates.json.")
+
+    def get_payload(self, options):
+        if options["file"]:
+            try:
+                with open(options["file"]) as f:
+                    return f.read()
+            except OSError as e:
+                raise CommandError(str(e))
+        import requests  # only needed to call the API, which is not a dependency of the app
+
+        response = requests.get(RATES_API_URL, headers={"apikey": settings.CURRENCY_RATES_API_KEY})
+        if response.status_code != 200:
+            raise CommandError(f"Data fetching failed. Status code: {response.status_code}")
+        if options["save"]:
+            with open(options["save"], "w") as f:
+                f.write(response.text)
+        return response.text
+
+    def handle(self, *args, **options):
+        try:
+            # parse rates as decimals so that they aren't rounded through floats
+            rates = json.loads(self.get_payload(options), parse_float=Decimal)["rates"]
+        except (ValueError, KeyError, TypeError):
+            raise CommandError("Invalid rates payload.")
+        updated, created, missing = refresh_rates(rates)
+        self.stdout.write(self.style.SUCCESS(f"{updated} rates updated, {created} rates created."))
+        if missing:
+            self.stdout.write(self.style.WARNING(f"No rates for {', '.join(missing)}."))
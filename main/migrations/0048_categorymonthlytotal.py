@@ -0,0 +1,33 @@
+# Generated by Django 4.0.10 on 2026-10-18 10:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0047_user_is_guest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryMonthlyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('month', models.PositiveIntegerField()),
+                ('type', models.CharField(choices=[('E', 'Expense'), ('I', 'Income')], max_length=1)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_totals', to='main.category')),
+                ('currency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_monthly_totals', to='main.currency')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_monthly_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='categorymonthlytotal',
+            constraint=models.UniqueConstraint(fields=('user', 'category', 'currency', 'year', 'month', 'type'), name='unique category monthly total'),
+        ),
+    ]
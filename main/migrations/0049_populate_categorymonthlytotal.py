@@ -0,0 +1,55 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def populate_category_monthly_totals(apps, schema_editor):
+    '''
+    Creates CategoryMonthlyTotal rows for existing account transactions.
+    '''
+    Account = apps.get_model('main', 'Account')
+    Transaction = apps.get_model('main', 'Transaction')
+    CategoryMonthlyTotal = apps.get_model('main', 'CategoryMonthlyTotal')
+    accounts = {
+        account['id']: account
+        for account in Account.objects.values('id', 'user_id', 'currency_id')
+    }
+    rows = (
+        Transaction.objects.filter(content_type__model='account', category__isnull=False)
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('object_id', 'category_id', 'year', 'month', 'type')
+        .annotate(sum=Sum('amount'), transaction_count=Count('id'))
+        .order_by()
+    )
+    totals = {}
+    for row in rows.iterator():
+        account = accounts.get(row['object_id'])
+        if not account:
+            continue
+        key = (
+            account['user_id'], row['category_id'], account['currency_id'],
+            row['year'], row['month'], row['type']
+        )
+        total, count = totals.get(key, (0, 0))
+        totals[key] = (total + row['sum'], count + row['transaction_count'])
+    CategoryMonthlyTotal.objects.bulk_create(
+        [
+            CategoryMonthlyTotal(
+                user_id=user_id, category_id=category_id, currency_id=currency_id,
+                year=year, month=month, type=type, total=total, count=count
+            )
+            for (user_id, category_id, currency_id, year, month, type), (total, count) in totals.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0048_categorymonthlytotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_category_monthly_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0.10 on 2026-10-18 10:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0049_populate_categorymonthlytotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='asset_kind',
+            field=models.CharField(blank=True, choices=[('account', 'Account'), ('creditcard', 'Credit Card'), ('loan', 'Loan')], editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='user',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-date', '-created'], name='transaction_user_date_idx'),
+        ),
+    ]
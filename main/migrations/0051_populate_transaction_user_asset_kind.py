@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def populate_transaction_user_asset_kind(apps, schema_editor):
+    '''
+    Copies owner and model name of the asset of existing transactions.
+    '''
+    Transaction = apps.get_model('main', 'Transaction')
+    for model_name in ['account', 'creditcard', 'loan']:
+        Asset = apps.get_model('main', model_name)
+        owner = Asset.objects.filter(pk=OuterRef('object_id')).values('user_id')[:1]
+        Transaction.objects.filter(content_type__app_label='main', content_type__model=model_name).update(
+            user=Subquery(owner), asset_kind=model_name
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0050_transaction_user_asset_kind'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_transaction_user_asset_kind, migrations.RunPython.noop),
+    ]
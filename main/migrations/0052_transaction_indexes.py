@@ -0,0 +1,25 @@
+# Generated by Django 4.0.10 on 2026-10-18 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0051_populate_transaction_user_asset_kind'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['content_type', 'object_id', '-date', '-created'], name='transaction_asset_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['category', '-date'], name='transaction_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('due_date__isnull', False), ('type', 'E')), fields=['object_id', 'due_date'], name='transaction_due_expense_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.10 on 2026-10-18 11:00
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0052_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledGuestUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateField(default=datetime.date.today)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pooled_guest_user', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
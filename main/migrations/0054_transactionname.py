@@ -0,0 +1,36 @@
+# Generated by Django 4.0.10 on 2026-10-18 11:15
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0053_pooledguestuser'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionName',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128)),
+                ('search_name', models.CharField(editable=False, max_length=128)),
+                ('type', models.CharField(choices=[('E', 'Expense'), ('I', 'Income')], max_length=1)),
+                ('count', models.IntegerField(default=0)),
+                ('last_used', models.DateField(default=datetime.date.today)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_names', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transactionname',
+            index=models.Index(fields=['user', 'type', 'search_name'], name='transaction_name_search_idx', opclasses=['int8_ops', 'varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddConstraint(
+            model_name='transactionname',
+            constraint=models.UniqueConstraint(fields=('user', 'type', 'name'), name='unique transaction name'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def populate_transaction_names(apps, schema_editor):
+    '''
+    Creates TransactionName rows for names of existing account and credit card transactions.
+    '''
+    Transaction = apps.get_model('main', 'Transaction')
+    TransactionName = apps.get_model('main', 'TransactionName')
+    rows = (
+        Transaction.objects.filter(asset_kind__in=['account', 'creditcard'], user__isnull=False)
+        .values('user_id', 'type', 'name')
+        .annotate(transaction_count=Count('id'), last_used=Max('date'))
+        .order_by()
+    )
+    TransactionName.objects.bulk_create(
+        [
+            TransactionName(
+                user_id=row['user_id'], type=row['type'], name=row['name'],
+                search_name=row['name'].lower(), count=row['transaction_count'],
+                last_used=row['last_used']
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0054_transactionname'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_transaction_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.10 on 2026-10-18 11:28
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0055_populate_transactionname'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(default=datetime.date.today)),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('currency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rate_history', to='main.currency')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ratehistory',
+            constraint=models.UniqueConstraint(fields=('currency', 'date'), name='unique rate history currency and date'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def populate_rate_history(apps, schema_editor):
+    '''
+    Creates a RateHistory row for each existing rate on the day it was last updated.
+    '''
+    Rate = apps.get_model('main', 'Rate')
+    RateHistory = apps.get_model('main', 'RateHistory')
+    RateHistory.objects.bulk_create(
+        [
+            RateHistory(currency_id=rate.currency_id, date=rate.updated.date(), rate=rate.rate)
+            for rate in Rate.objects.iterator()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0056_ratehistory'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_rate_history, migrations.RunPython.noop),
+    ]
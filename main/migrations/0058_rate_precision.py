@@ -0,0 +1,23 @@
+# Generated by Django 4.0.10 on 2026-10-18 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0057_populate_ratehistory'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rate',
+            name='rate',
+            field=models.DecimalField(decimal_places=10, default=0, max_digits=18),
+        ),
+        migrations.AlterField(
+            model_name='ratehistory',
+            name='rate',
+            field=models.DecimalField(decimal_places=10, max_digits=18),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+from django.db.models import Case, F, Sum, When
+
+
+def populate_balance_snapshots(apps, schema_editor):
+    '''
+    Creates a BalanceSnapshot row for each date an asset has transactions on, with the
+    initial balance of the asset plus the balance changes up to and including the date.
+    '''
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Transaction = apps.get_model('main', 'Transaction')
+    BalanceSnapshot = apps.get_model('main', 'BalanceSnapshot')
+    openings = {}
+    for model_name in ['account', 'creditcard', 'loan']:
+        content_type = ContentType.objects.filter(app_label='main', model=model_name).first()
+        if content_type is None:
+            continue
+        model = apps.get_model('main', model_name)
+        for id, user_id, initial in model.objects.values_list('id', 'user_id', 'initial').iterator():
+            openings[(content_type.id, id)] = (user_id, initial)
+    rows = (
+        Transaction.objects.values('content_type_id', 'object_id', 'date')
+        .annotate(change=Sum(Case(When(type='E', then=-F('amount')), default=F('amount'))))
+        .order_by('content_type_id', 'object_id', 'date')
+        .values_list('content_type_id', 'object_id', 'date', 'change')
+    )
+    snapshots = []
+    key = None
+    for content_type_id, object_id, day, change in rows.iterator():
+        if (content_type_id, object_id) not in openings:
+            continue
+        if key != (content_type_id, object_id):
+            key = (content_type_id, object_id)
+            user_id, balance = openings[key]
+        balance += change
+        snapshots.append(BalanceSnapshot(
+            user_id=user_id, content_type_id=content_type_id, object_id=object_id, date=day, balance=balance
+        ))
+    BalanceSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0059_balancesnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_balance_snapshots, migrations.RunPython.noop),
+    ]
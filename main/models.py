@@ -31,7 +31,8 @@ class Currency(models.Model):
         return self.code
 
     def get_rate(self):
-        return self.rate.rate
+        from .rates import get_rate # import the function here due to circular import
+        return get_rate(self)
 
 
 class UserPreferences(models.Model):
@@ -85,6 +86,12 @@ class Transaction(models.Model):
         ("I", "Income"),
     )
 
+    ASSET_KINDS = (
+        ("account", "Account"),
+        ("creditcard", "Credit Card"),
+        ("loan", "Loan"),
+    )
+
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, default=ContentType.objects.get(app_label='main', model='account').id)
     object_id = models.PositiveIntegerField(default=7)
     content_object = GenericForeignKey('content_type', 'object_id')
@@ -98,6 +105,11 @@ class Transaction(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     due_date = models.DateTimeField(blank=True, null=True)
+    # owner and model name of content_object, denormalized so that listings don't join assets
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, editable=False, related_name='transactions'
+    )
+    asset_kind = models.CharField(max_length=16, choices=ASSET_KINDS, blank=True, editable=False)
 
     class Meta:
         constraints = [
@@ -106,6 +118,22 @@ class Transaction(models.Model):
                 name='installments_btw_0_36'
             )
         ]
+        indexes = [
+            # transaction archives and latest transactions of a user
+            models.Index(fields=['user', '-date', '-created'], name='transaction_user_date_idx'),
+            # account, card and loan archives, payment and monthly balance stats of an asset
+            models.Index(
+                fields=['content_type', 'object_id', '-date', '-created'], name='transaction_asset_date_idx'
+            ),
+            # category archives
+            models.Index(fields=['category', '-date'], name='transaction_category_date_idx'),
+            # unpaid installments of credit card payment plans
+            models.Index(
+                fields=['object_id', 'due_date'],
+                condition=Q(type='E', due_date__isnull=False),
+                name='transaction_due_expense_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.amount} on {self.content_object}"
@@ -127,14 +155,22 @@ class Transaction(models.Model):
                 return self.transfer_from.first().to_transaction
         return None
 
-    def save(self, *args, **kwargs):
+    def set_derived_fields(self):
+        '''
+            Sets the fields derived from amount and content_object. Must be called before bulk_create.
+        '''
         from .utils import get_transaction_installment_due_date
         self.amount = abs(self.amount)
+        self.user_id = self.content_object.user_id
+        self.asset_kind = self.content_object._meta.model_name
         if isinstance(self.content_object, CreditCard):
             if self.installments:
                 self.due_date = get_transaction_installment_due_date(self.date, self.installments, self.content_object)
             else:
                 self.due_date = self.content_object.get_next_payment_date(self.date)
+
+    def save(self, *args, **kwargs):
+        self.set_derived_fields()
         super().save(*args, **kwargs)
 
     @property
@@ -155,10 +191,6 @@ class Transaction(models.Model):
     def is_editable(self):
         return self.content_object.is_active
 
-    @property
-    def user(self):
-        return self.content_object.user
-
 
 class Assets(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -182,6 +214,7 @@ class Assets(models.Model):
 
 class Account(Assets):
     transactions = GenericRelation(Transaction, related_query_name='account')
+    balance_snapshots = GenericRelation('BalanceSnapshot', related_query_name='account')
     currency = models.ForeignKey(
         Currency, on_delete=models.SET_DEFAULT, default=DEFAULT_CURRENCY_PK, related_name='accounts'
     )
@@ -202,6 +235,7 @@ class Account(Assets):
 
 class Loan(Assets):
     transactions = GenericRelation(Transaction, related_query_name='loan')
+    balance_snapshots = GenericRelation('BalanceSnapshot', related_query_name='loan')
     currency = models.ForeignKey(
         Currency, on_delete=models.SET_DEFAULT, default=DEFAULT_CURRENCY_PK, related_name='loans'
     )
@@ -222,6 +256,7 @@ class Loan(Assets):
 
 class CreditCard(Assets):
     transactions = GenericRelation(Transaction, related_query_name='credit_card')
+    balance_snapshots = GenericRelation('BalanceSnapshot', related_query_name='credit_card')
     currency = models.ForeignKey(
         Currency, on_delete=models.SET_DEFAULT, default=DEFAULT_CURRENCY_PK, related_name='credit_cards'
     )
@@ -290,13 +325,125 @@ class Transfer(models.Model):
 
 class Rate(models.Model):
     currency = models.OneToOneField(Currency, on_delete=models.CASCADE, related_name='rate')
-    rate = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    rate = models.DecimalField(max_digits=18, decimal_places=10, default=0)
     updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'{self.currency} - {self.rate}'
+
+
+class RateHistory(models.Model):
+    '''
+    Rate of a currency on a date. Rates are valid from their date until the next rate
+    of the currency.
+    '''
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE, related_name='rate_history')
+    date = models.DateField(default=date.today)
+    rate = models.DecimalField(max_digits=18, decimal_places=10)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['currency', 'date'], name='unique rate history currency and date')
+        ]
+
+    def __str__(self):
+        return f'{self.currency} - {self.rate} on {self.date}'
     
 
 class GuestUserSession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="guest_user_session")
-    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="guest_user_session")
\ No newline at end of file
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="guest_user_session")
+
+class PooledGuestUser(models.Model):
+    '''
+    A guest user whose demo data is ready and who waits to be claimed by a test drive.
+    Demo data dates are relative to the created day.
+    '''
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="pooled_guest_user")
+    created = models.DateField(default=date.today)
+
+    def __str__(self):
+        return f"{self.user} pooled on {self.created}"
+
+class CategoryMonthlyTotal(models.Model):
+    '''
+    Monthly totals of account transactions grouped by category, account currency and
+    transaction type. Kept up to date by transaction utility functions and used for
+    category stats instead of aggregating every transaction.
+    '''
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="category_monthly_totals")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="monthly_totals")
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE, related_name="category_monthly_totals")
+    year = models.PositiveIntegerField()
+    month = models.PositiveIntegerField()
+    type = models.CharField(max_length=1, choices=Transaction.TRANSACTION_TYPES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'category', 'currency', 'year', 'month', 'type'],
+                name='unique category monthly total'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.category} - {self.year}-{self.month:02d} - {self.total} {self.currency}'
+
+
+class TransactionName(models.Model):
+    '''
+    Distinct names of account and credit card transactions of a user by transaction type,
+    with usage counts and last used dates. Kept up to date by transaction utility functions
+    and used for transaction name autocomplete.
+    '''
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="transaction_names")
+    name = models.CharField(max_length=128)
+    search_name = models.CharField(max_length=128, editable=False)
+    type = models.CharField(max_length=1, choices=Transaction.TRANSACTION_TYPES)
+    count = models.IntegerField(default=0)
+    last_used = models.DateField(default=date.today)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['user', 'type', 'name'], name='unique transaction name')
+        ]
+        indexes = [
+            # pattern ops let PostgreSQL use the index for LIKE 'prefix%' lookups
+            models.Index(
+                fields=['user', 'type', 'search_name'],
+                name='transaction_name_search_idx',
+                opclasses=['int8_ops', 'varchar_pattern_ops', 'varchar_pattern_ops'],
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.count})'
+
+    def save(self, *args, **kwargs):
+        self.search_name = self.name.lower()
+        super().save(*args, **kwargs)
+
+
+class BalanceSnapshot(models.Model):
+    '''
+    Closing balance of an asset on a date it has transactions on. The balance at any date
+    is the closing balance of the latest snapshot up to that date, or the initial balance
+    of the asset. Kept up to date by the balance ledger and rebuilt from transactions by
+    the rebuild_balance_snapshots command.
+    '''
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="balance_snapshots")
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['content_type', 'object_id', 'date'], name='unique balance snapshot')
+        ]
+
+    def __str__(self):
+        return f'{self.content_object} - {self.balance} on {self.date}'
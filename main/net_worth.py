@@ -0,0 +1,152 @@
+'''
+Net worth engine. Builds monthly balance series of all accounts of a user from a single
+grouped transaction query. Months are handled as integer indexes (year * 12 + month - 1)
+so balances are built with list arithmetic instead of walking month strings.
+'''
+from decimal import Decimal
+from datetime import date
+from itertools import accumulate
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+from .models import Account, Transaction
+from .rates import convert_series_as_of
+
+
+def get_month_index(year, month):
+    return year * 12 + month - 1
+
+
+def get_month_end(index):
+    """
+    Returns the last day of a month index, or today for the current and future months.
+    """
+    next_month = date((index + 1) // 12, (index + 1) % 12 + 1, 1)
+    return min(date.fromordinal(next_month.toordinal() - 1), date.today())
+
+
+def get_month_label(index):
+    """
+    Converts a month index to a '%Y-%m' formatted string.
+    """
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+
+def get_account_monthly_changes(user):
+    """
+    Takes a user and returns a dictionary in which keys are account ids and values are
+    dictionaries of monthly balance change (total incomes - total expenses) by month index.
+    """
+    rows = (
+        Transaction.objects.filter(account__user=user)
+        .annotate(year=ExtractYear("date"), month=ExtractMonth("date"))
+        .values("object_id", "year", "month")
+        .annotate(
+            total=Coalesce(Sum("amount", filter=Q(type="I")), Decimal(0))
+            - Coalesce(Sum("amount", filter=Q(type="E")), Decimal(0))
+        )
+        .order_by()
+    )
+    changes = {}
+    for row in rows:
+        month = get_month_index(row["year"], row["month"])
+        changes.setdefault(row["object_id"], {})[month] = row["total"]
+    return changes
+
+
+def get_account_balances(account, changes, last_month):
+    """
+    Takes an account, its monthly changes and the last month index. Returns the first
+    month index of the account and a dense list of monthly balances until the last month.
+    """
+    first_month = min([get_month_index(account.created.year, account.created.month), *changes])
+    deltas = [Decimal(0)] * (last_month - first_month + 1)
+    deltas[0] = account.initial
+    for month, total in changes.items():
+        deltas[month - first_month] += total
+    return first_month, list(accumulate(deltas))
+
+
+def add_series(series, first_month, balances, balances_first_month):
+    """
+    Adds balances starting from balances_first_month to series starting from first_month.
+    """
+    offset = balances_first_month - first_month
+    series[offset:] = [value + balance for value, balance in zip(series[offset:], balances)]
+
+
+def get_currency_balances(user):
+    """
+    Takes a user and returns a dictionary in which keys are currencies of user's active
+    accounts and values are (first month index, dense list of monthly balances) tuples
+    covering all accounts of the user in that currency until the current month.
+    """
+    accounts = list(Account.objects.filter(user=user).select_related("currency"))
+    active_currencies = {account.currency for account in accounts if account.is_active}
+    accounts = [account for account in accounts if account.currency in active_currencies]
+    if not accounts:
+        return {}
+
+    changes = get_account_monthly_changes(user)
+    today = date.today()
+    last_month = max(
+        [get_month_index(today.year, today.month)]
+        + [month for account_changes in changes.values() for month in account_changes]
+    )
+    account_balances = {}
+    for account in accounts:
+        first_month, balances = get_account_balances(account, changes.get(account.id, {}), last_month)
+        account_balances.setdefault(account.currency, []).append((first_month, balances))
+
+    currency_balances = {}
+    for currency, rows in account_balances.items():
+        first_month = min(row_first_month for row_first_month, balances in rows)
+        series = [Decimal(0)] * (last_month - first_month + 1)
+        for row_first_month, balances in rows:
+            add_series(series, first_month, balances, row_first_month)
+        currency_balances[currency] = (first_month, series)
+    return currency_balances
+
+
+def get_labeled_series(first_month, series):
+    return [(get_month_label(first_month + index), value) for index, value in enumerate(series)]
+
+
+def get_worth_stats(currency_balances):
+    """
+    Takes currency balances and returns a dictionary in which keys are currencies and
+    values are lists of ('%Y-%m', balance) tuples.
+    """
+    return {
+        currency: get_labeled_series(first_month, series)
+        for currency, (first_month, series) in currency_balances.items()
+    }
+
+
+def get_total_worth_stats(currency_balances, primary_currency):
+    """
+    Takes currency balances and a primary currency. Converts each monthly balance to the
+    primary currency with the rates as of the end of its month and returns a dictionary
+    in which the only key is the primary currency and the value is a list of
+    ('%Y-%m', total) tuples.
+    """
+    if not currency_balances:
+        return {primary_currency: []}
+    total_first_month = min(first_month for first_month, series in currency_balances.values())
+    last_month = max(first_month + len(series) - 1 for first_month, series in currency_balances.values())
+    total = [Decimal(0)] * (last_month - total_first_month + 1)
+    for currency, (first_month, series) in currency_balances.items():
+        days = [get_month_end(first_month + index) for index in range(len(series))]
+        converted = convert_series_as_of(series, days, currency, primary_currency)
+        add_series(total, total_first_month, converted, first_month)
+    return {primary_currency: get_labeled_series(total_first_month, total)}
+
+
+def get_net_worth_stats(user):
+    """
+    Takes a user and returns worth stats and total worth stats used in net worth page.
+    """
+    currency_balances = get_currency_balances(user)
+    return (
+        get_worth_stats(currency_balances),
+        get_total_worth_stats(currency_balances, user.primary_currency),
+    )
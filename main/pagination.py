@@ -0,0 +1,104 @@
+'''
+Keyset (cursor) pagination for transaction and transfer archives. A page holds the rows
+after or before a cursor position in (date, created, id) order, so it is fetched with an
+indexed range scan of page size rows at any depth and no COUNT query is needed.
+'''
+import base64
+import datetime
+import json
+from django.db.models import Q
+
+NEWEST_FIRST = ("-date", "-created", "-id")
+OLDEST_FIRST = ("date", "created", "id")
+
+
+def encode_cursor(direction, obj=None):
+    """
+    Takes a direction (first, next, previous or last) and an object of the cursor
+    position. Returns an URL safe cursor string.
+    """
+    values = [direction]
+    if obj is not None:
+        values += [obj.date.isoformat(), obj.created.isoformat(), obj.id]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Takes a cursor string and returns its direction and (date, created, id) position.
+    Raises ValueError if the cursor is not valid.
+    """
+    if not cursor:
+        return "first", None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        direction = values[0]
+        if direction in ("first", "last"):
+            return direction, None
+        if direction not in ("next", "previous"):
+            raise ValueError
+        position = (
+            datetime.date.fromisoformat(values[1]),
+            datetime.datetime.fromisoformat(values[2]),
+            int(values[3]),
+        )
+    except (ValueError, TypeError, IndexError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return direction, position
+
+
+def get_position_filter(position, older):
+    """
+    Returns a Q object matching rows older (or newer) than a (date, created, id) position.
+    """
+    date, created, id = position
+    lookup = "lt" if older else "gt"
+    return (
+        Q(**{f"date__{lookup}": date})
+        | Q(date=date, **{f"created__{lookup}": created})
+        | Q(date=date, created=created, **{f"id__{lookup}": id})
+    )
+
+
+class CursorPage:
+    """
+    A page of objects ordered newest first with cursors of the neighbouring pages.
+    """
+
+    first_cursor = encode_cursor("first")
+    last_cursor = encode_cursor("last")
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = bool(object_list) and has_next
+        self.has_previous = bool(object_list) and has_previous
+        self.next_cursor = encode_cursor("next", object_list[-1]) if self.has_next else None
+        self.previous_cursor = encode_cursor("previous", object_list[0]) if self.has_previous else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def get_cursor_page(queryset, cursor, page_size):
+    """
+    Takes a queryset of objects with date and created fields, a cursor string and a page
+    size. Returns the CursorPage the cursor points to. Raises ValueError for invalid
+    cursors.
+    """
+    direction, position = decode_cursor(cursor)
+    forward = direction in ("first", "next")
+    queryset = queryset.order_by(*(NEWEST_FIRST if forward else OLDEST_FIRST))
+    if position is not None:
+        queryset = queryset.filter(get_position_filter(position, older=forward))
+    rows = list(queryset[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if forward:
+        return CursorPage(rows, has_next=has_more, has_previous=direction == "next")
+    return CursorPage(rows[::-1], has_next=direction == "previous", has_previous=has_more)
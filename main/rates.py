@@ -0,0 +1,293 @@
+'''
+Currency rate provider. Loads the whole Rate table once into an immutable mapping of
+currency ids to rates. The mapping is shared between processes through Django's cache
+framework and invalidated with a version stamp whenever rates change.
+
+Past rates are kept in RateHistory and loaded the same way into a RateHistoryTable of
+sorted date and rate arrays per currency, so rates as of a date are found with bisect.
+
+Amounts are converted by one kernel: amount * (target rate / source rate) rounded half up
+to cents. Aggregates are summed per currency in SQL and converted with convert_amounts,
+so every report converts with the same factors and rounding.
+'''
+import time
+import uuid
+from bisect import bisect_right
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+from types import MappingProxyType
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Currency, Rate, RateHistory
+
+RATES_VERSION_KEY = "main:rates:version"
+RATES_TABLE_KEY = "main:rates:{version}"
+RATE_HISTORY_TABLE_KEY = "main:rate_history:{version}"
+RATES_TABLE_TIMEOUT = 60 * 60 * 24
+MONEY_PLACES = Decimal("0.01")
+
+
+class RateHistoryTable:
+    """
+    Rate history of all currencies. dates maps currency ids to sorted lists of date
+    ordinals and rates to the rates of those dates.
+    """
+
+    def __init__(self, rows):
+        self.dates = {}
+        self.rates = {}
+        for currency_id, day, rate in sorted(rows):
+            self.dates.setdefault(currency_id, []).append(day.toordinal())
+            self.rates.setdefault(currency_id, []).append(rate)
+
+    def __contains__(self, currency_id):
+        return currency_id in self.dates
+
+    def get_rate(self, currency_id, day):
+        """
+        Returns the rate of a currency as of a date. Dates before the first known rate get
+        the first known rate.
+        """
+        index = bisect_right(self.dates[currency_id], day.toordinal())
+        return self.rates[currency_id][max(index - 1, 0)]
+
+    def get_rates(self, currency_id, days):
+        """
+        Returns a list of rates of a currency as of each of the given dates.
+        """
+        dates = self.dates[currency_id]
+        rates = self.rates[currency_id]
+        return [rates[max(bisect_right(dates, day.toordinal()) - 1, 0)] for day in days]
+
+
+class RateProvider:
+    """
+    Keeps the rate table of the current process. The shared version stamp is checked
+    at most once in CURRENCY_RATES_CHECK_INTERVAL seconds and the table is reloaded
+    when the version changes.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.rates = None
+        self.history = None
+        self.checked_at = 0
+
+    def get_version(self):
+        version = cache.get(RATES_VERSION_KEY)
+        if version is None:
+            cache.add(RATES_VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(RATES_VERSION_KEY)
+        return version
+
+    def load_rates(self, version):
+        key = RATES_TABLE_KEY.format(version=version)
+        rates = cache.get(key)
+        if rates is None:
+            rates = dict(Rate.objects.values_list("currency_id", "rate"))
+            cache.set(key, rates, RATES_TABLE_TIMEOUT)
+        return MappingProxyType(rates)
+
+    def load_history(self, version):
+        key = RATE_HISTORY_TABLE_KEY.format(version=version)
+        history = cache.get(key)
+        if history is None:
+            history = RateHistoryTable(RateHistory.objects.values_list("currency_id", "date", "rate"))
+            cache.set(key, history, RATES_TABLE_TIMEOUT)
+        return history
+
+    def check_version(self):
+        """
+        Drops the loaded tables if the shared version changed since they were loaded.
+        """
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < settings.CURRENCY_RATES_CHECK_INTERVAL:
+            return
+        version = self.get_version()
+        if version != self.version:
+            self.rates = None
+            self.history = None
+            self.version = version
+        self.checked_at = now
+
+    def get_rates(self):
+        self.check_version()
+        if self.rates is None:
+            self.rates = self.load_rates(self.version)
+        return self.rates
+
+    def get_history(self):
+        self.check_version()
+        if self.history is None:
+            self.history = self.load_history(self.version)
+        return self.history
+
+    def invalidate(self):
+        cache.set(RATES_VERSION_KEY, uuid.uuid4().hex, None)
+        self.version = None
+        self.rates = None
+        self.history = None
+
+
+rate_provider = RateProvider()
+
+
+def get_rates():
+    """
+    Returns an immutable dictionary of rates in which keys are currency ids.
+    """
+    return rate_provider.get_rates()
+
+
+def get_rate(currency):
+    """
+    Takes a currency object or id and returns its rate. Raises Rate.DoesNotExist if
+    the currency has no rate.
+    """
+    currency_id = getattr(currency, "id", currency)
+    try:
+        return get_rates()[currency_id]
+    except KeyError:
+        raise Rate.DoesNotExist(f"Rate of currency {currency_id} does not exist.")
+
+
+def round_money(amount):
+    """
+    Rounds an amount to cents, halves away from zero like SQL ROUND.
+    """
+    return Decimal(amount).quantize(MONEY_PLACES, rounding=ROUND_HALF_UP)
+
+
+def get_conversion_factor(from_currency, to_currency):
+    """
+    Takes two currency objects or ids and returns the factor converting amounts of the
+    first currency to the second.
+    """
+    return get_rate(to_currency) / get_rate(from_currency)
+
+
+def convert_amount(amount, from_currency, to_currency):
+    return round_money(amount * get_conversion_factor(from_currency, to_currency))
+
+
+def convert_amounts(rows, to_currency):
+    """
+    Takes an iterable of (amount, currency object or id) pairs and a target currency.
+    Returns a list of the amounts converted to the target currency, computing the
+    conversion factor once per currency.
+    """
+    factors = {}
+    converted = []
+    for amount, currency in rows:
+        currency_id = getattr(currency, "id", currency)
+        if currency_id not in factors:
+            factors[currency_id] = get_conversion_factor(currency_id, to_currency)
+        converted.append(round_money(amount * factors[currency_id]))
+    return converted
+
+
+def get_rate_history():
+    """
+    Returns the RateHistoryTable of all currencies.
+    """
+    return rate_provider.get_history()
+
+
+def get_rates_as_of(currency, days):
+    """
+    Takes a currency object or id and a list of dates. Returns a list of the currency's
+    rates as of each date, falling back to the current rate if it has no history.
+    """
+    currency_id = getattr(currency, "id", currency)
+    history = get_rate_history()
+    if currency_id not in history:
+        return [get_rate(currency_id)] * len(days)
+    return history.get_rates(currency_id, days)
+
+
+def convert_series_as_of(amounts, days, from_currency, to_currency):
+    """
+    Takes a list of amounts, a list of their dates and two currencies. Converts each amount
+    with the rates as of its date and returns the list of converted amounts.
+    """
+    from_rates = get_rates_as_of(from_currency, days)
+    to_rates = get_rates_as_of(to_currency, days)
+    return [
+        round_money(amount * (to_rate / from_rate))
+        for amount, from_rate, to_rate in zip(amounts, from_rates, to_rates)
+    ]
+
+
+def record_rate_history(rates, day=None):
+    """
+    Takes a dictionary of currency ids and rates and stores them as the rates of a date,
+    today by default, replacing rates already stored for that date.
+    """
+    day = day or date.today()
+    with transaction.atomic():
+        RateHistory.objects.filter(date=day, currency_id__in=rates).delete()
+        RateHistory.objects.bulk_create(
+            [RateHistory(currency_id=currency_id, date=day, rate=rate) for currency_id, rate in rates.items()]
+        )
+
+
+def refresh_rates(rates, day=None):
+    """
+    Takes a dictionary of currency codes and rates, e.g. the rates of an API payload.
+    Updates existing rates and creates missing ones with one bulk query each, records them
+    in the rate history and bumps the rates version. Returns the numbers of updated and
+    created rates and a sorted list of codes of currencies missing from the payload.
+    """
+    currency_ids = dict(Currency.objects.values_list("code", "id"))
+    rates = {currency_ids[code]: rate for code, rate in rates.items() if code in currency_ids}
+    missing = sorted(code for code, currency_id in currency_ids.items() if currency_id not in rates)
+    now = timezone.now()
+    with transaction.atomic():
+        rate_ids = dict(Rate.objects.filter(currency_id__in=rates).values_list("currency_id", "id"))
+        Rate.objects.bulk_update(
+            [
+                Rate(id=rate_ids[currency_id], currency_id=currency_id, rate=rate, updated=now)
+                for currency_id, rate in rates.items() if currency_id in rate_ids
+            ],
+            ["rate", "updated"],
+            batch_size=500,
+        )
+        Rate.objects.bulk_create(
+            [
+                Rate(currency_id=currency_id, rate=rate)
+                for currency_id, rate in rates.items() if currency_id not in rate_ids
+            ]
+        )
+        record_rate_history(rates, day)
+        bump_rates_version()
+        transaction.on_commit(bump_rates_version)
+    return len(rate_ids), len(rates) - len(rate_ids), missing
+
+
+def bump_rates_version():
+    """
+    Invalidates rate tables of all processes.
+    """
+    rate_provider.invalidate()
+
+
+@receiver(post_save, sender=Rate)
+def record_rate(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        # rates loaded from fixtures aren't observed rates of today
+        return
+    record_rate_history({instance.currency_id: instance.rate})
+
+
+@receiver(post_save, sender=Rate)
+@receiver(post_delete, sender=Rate)
+@receiver(post_save, sender=RateHistory)
+@receiver(post_delete, sender=RateHistory)
+def invalidate_rates(sender, **kwargs):
+    # bump again on commit so that other processes don't cache uncommitted rates
+    bump_rates_version()
+    transaction.on_commit(bump_rates_version)
@@ -0,0 +1,127 @@
+'''
+Asset balance reconciliation. Asset balances are denormalized: they are changed together
+with transactions instead of being summed on every read. Reconciliation recomputes them
+as initial + incomes - expenses with one grouped query over the transactions of a chunk
+of users, reports assets whose stored balance differs and optionally repairs them.
+'''
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from .models import Account, CreditCard, Loan, Transaction, User
+from .snapshots import rebuild_balance_snapshots
+from .utils import bump_ledger_version
+
+ASSET_MODELS = [Account, Loan, CreditCard]
+REPAIR_BATCH_SIZE = 500
+
+
+def get_balance_changes(user_ids):
+    """
+    Returns a dictionary in which keys are (content type id, asset id) pairs and values
+    are the sums of incomes minus expenses of the assets of the given users.
+    """
+    rows = (
+        Transaction.objects.filter(user_id__in=user_ids)
+        .order_by()
+        .values("content_type_id", "object_id")
+        .annotate(change=Sum(Case(When(type="E", then=-F("amount")), default=F("amount"))))
+        .values_list("content_type_id", "object_id", "change")
+    )
+    return {(content_type_id, object_id): change for content_type_id, object_id, change in rows.iterator()}
+
+
+def get_balance_drifts(user_ids):
+    """
+    Takes a list of user ids. Returns the number of checked assets and a list of
+    dictionaries describing the assets whose stored balance is not initial + incomes - expenses.
+    """
+    changes = get_balance_changes(user_ids)
+    checked = 0
+    drifts = []
+    for model in ASSET_MODELS:
+        content_type_id = ContentType.objects.get_for_model(model).id
+        assets = model.objects.filter(user_id__in=user_ids).order_by().values_list("id", "user_id", "initial", "balance")
+        for id, user_id, initial, balance in assets.iterator():
+            checked += 1
+            expected = initial + (changes.get((content_type_id, id)) or 0)
+            if balance != expected:
+                drifts.append({
+                    "model": model,
+                    "id": id,
+                    "user_id": user_id,
+                    "balance": balance,
+                    "expected": expected,
+                    "drift": balance - expected,
+                })
+    return checked, drifts
+
+
+def repair_balance_drifts(drifts):
+    """
+    Corrects drifted balances with one UPDATE per model and batch. The drifted assets are
+    locked and their drifts measured again first: the sums and balances of the first
+    measurement aren't read at one point in time, so a transaction saved in between shows
+    up as a drift of a correct balance. The locks make transactions saved from then on wait
+    for the repair. Balance snapshots of the repaired assets are rebuilt and cached
+    dashboards of the owners are invalidated. Returns the number of repaired assets.
+    """
+    repaired = 0
+    with transaction.atomic():
+        drifted = {(drift["model"], drift["id"]) for drift in drifts}
+        for model in ASSET_MODELS:
+            ids = sorted(id for drift_model, id in drifted if drift_model is model)
+            list(model.objects.select_for_update().filter(pk__in=ids).order_by("pk").values_list("pk", flat=True))
+        _, drifts = get_balance_drifts(sorted({drift["user_id"] for drift in drifts}))
+        drifts = [drift for drift in drifts if (drift["model"], drift["id"]) in drifted]
+        for model in ASSET_MODELS:
+            model_drifts = sorted((drift["id"], drift["drift"]) for drift in drifts if drift["model"] is model)
+            for start in range(0, len(model_drifts), REPAIR_BATCH_SIZE):
+                batch = dict(model_drifts[start:start + REPAIR_BATCH_SIZE])
+                correction = Case(
+                    *[When(pk=id, then=Value(drift)) for id, drift in batch.items()],
+                    output_field=DecimalField(max_digits=14, decimal_places=2),
+                )
+                repaired += model.objects.filter(pk__in=batch).update(balance=F("balance") - correction)
+        rebuild_balance_snapshots(assets=[drift["model"](pk=drift["id"]) for drift in drifts])
+        for user_id in sorted({drift["user_id"] for drift in drifts}):
+            bump_ledger_version(user_id)
+    return repaired
+
+
+def reconcile_user_chunk(user_ids, repair):
+    checked, drifts = get_balance_drifts(user_ids)
+    repaired = repair_balance_drifts(drifts) if repair and drifts else 0
+    return checked, drifts, repaired
+
+
+def reconcile_user_chunk_in_thread(user_ids, repair):
+    try:
+        return reconcile_user_chunk(user_ids, repair)
+    finally:
+        # threads get their own database connections, which Django doesn't close for them
+        connection.close()
+
+
+def get_user_id_chunks(users, chunk_size):
+    user_ids = list(users.order_by("id").values_list("id", flat=True))
+    return [user_ids[start:start + chunk_size] for start in range(0, len(user_ids), chunk_size)]
+
+
+def reconcile_balances(users=None, repair=False, chunk_size=1000, workers=1):
+    """
+    Reconciles asset balances of a queryset of users, all users by default, in chunks of
+    users processed by the given number of threads. Returns the number of checked assets,
+    a list of drifts and the number of repaired assets.
+    """
+    users = User.objects.all() if users is None else users
+    chunks = get_user_id_chunks(users, chunk_size)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(reconcile_user_chunk_in_thread, chunks, [repair] * len(chunks)))
+    else:
+        results = [reconcile_user_chunk(chunk, repair) for chunk in chunks]
+    checked = sum(result[0] for result in results)
+    drifts = [drift for result in results for drift in result[1]]
+    repaired = sum(result[2] for result in results)
+    return checked, drifts, repaired
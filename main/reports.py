@@ -0,0 +1,72 @@
+'''
+Ins/outs reports. Expense and income sums of an already filtered transaction queryset are
+read with one aggregate grouped by asset currency and transaction type. They are converted
+to the target currency with the in-memory rate table, so the report rows and their total
+come from the same query.
+'''
+from decimal import Decimal
+from django.db.models import F, Sum
+from .models import Currency
+from .rates import convert_amounts
+
+INS_OUTS_TYPES = {"E": "expense", "I": "income"}
+
+
+def get_ins_outs_sums(qs, currency_lookup="account__currency"):
+    """
+    Takes a queryset of transactions. Returns a dictionary in which keys are asset currency
+    ids and values are dictionaries of expense and income sums.
+    """
+    rows = (
+        qs.select_related(None)
+        .prefetch_related(None)
+        .annotate(currency=F(currency_lookup))
+        .values("currency", "type")
+        .annotate(sum=Sum("amount"))
+        .order_by()
+        .values_list("currency", "type", "sum")
+    )
+    sums = {}
+    for currency_id, type, amount in rows:
+        if type in INS_OUTS_TYPES:
+            sums.setdefault(currency_id, {})[INS_OUTS_TYPES[type]] = amount
+    return sums
+
+
+def get_ins_outs_total(report, target_currency):
+    """
+    Takes report rows and a target currency and returns their expense, income and balance
+    totals converted to the target currency.
+    """
+    expense, income = [
+        sum(convert_amounts([(row[key], row["currency"]) for row in report], target_currency), Decimal(0))
+        for key in ["expense", "income"]
+    ]
+    return {
+        "currency": target_currency.name,
+        "expense": expense,
+        "income": income,
+        "balance": income - expense,
+    }
+
+
+def get_ins_outs_report(user, qs, target_currency=None):
+    """
+    Takes a user and a queryset of the user's account transactions. Returns a list of
+    expense, income and balance sums per currency of the user's accounts and their total
+    in the target currency, the primary currency of the user by default.
+    """
+    target_currency = target_currency or user.primary_currency
+    sums = get_ins_outs_sums(qs)
+    report = []
+    for currency in Currency.objects.filter(accounts__user=user).distinct().order_by("id"):
+        currency_sums = sums.get(currency.id, {})
+        expense = currency_sums.get("expense", Decimal(0))
+        income = currency_sums.get("income", Decimal(0))
+        report.append({
+            "currency": currency,
+            "expense": expense,
+            "income": income,
+            "balance": income - expense,
+        })
+    return report, get_ins_outs_total(report, target_currency)
@@ -0,0 +1,133 @@
+'''
+Daily asset balance snapshots. A snapshot holds the closing balance of an asset on a date
+it has transactions on, so the balance at a date is the latest snapshot up to that date,
+read with one indexed lookup instead of a replay of the asset's transaction history. The balance ledger shifts the snapshots on and after the date of
+every balance change; rebuild_balance_snapshots recreates them from transactions.
+'''
+from functools import reduce
+from itertools import islice
+from operator import or_
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, When
+from .models import Account, BalanceSnapshot, CreditCard, Loan, Transaction
+
+SNAPSHOT_ASSET_MODELS = [Account, CreditCard, Loan]
+SNAPSHOT_BATCH_SIZE = 1000
+
+
+def get_asset_snapshots(model, asset_id):
+    return BalanceSnapshot.objects.filter(
+        content_type_id=ContentType.objects.get_for_model(model).id, object_id=asset_id
+    )
+
+
+def apply_balance_snapshot_delta(model, asset_id, day, delta):
+    """
+    Adds a balance change on a date to the snapshots of an asset. Closing balances on and
+    after the date are shifted and the snapshot of the date is created from the previous
+    closing balance, or the initial balance, if it doesn't exist yet.
+    """
+    content_type_id = ContentType.objects.get_for_model(model).id
+    snapshots = BalanceSnapshot.objects.filter(content_type_id=content_type_id, object_id=asset_id)
+    snapshots.filter(date__gte=day).update(balance=F("balance") + delta)
+    previous = snapshots.filter(date__lte=day).order_by("-date").values_list("date", "balance", "user_id").first()
+    if previous is not None and previous[0] == day:
+        return
+    if previous is None:
+        user_id, opening = model.objects.values_list("user_id", "initial").get(pk=asset_id)
+    else:
+        opening, user_id = previous[1], previous[2]
+    BalanceSnapshot.objects.create(
+        user_id=user_id, content_type_id=content_type_id, object_id=asset_id, date=day, balance=opening + delta
+    )
+
+
+def get_balance_at(asset, day):
+    """
+    Returns the closing balance of an asset on a date.
+    """
+    balance = (
+        get_asset_snapshots(type(asset), asset.pk)
+        .filter(date__lte=day)
+        .order_by("-date")
+        .values_list("balance", flat=True)
+        .first()
+    )
+    return asset.initial if balance is None else balance
+
+
+def get_snapshot_asset_querysets(user=None, assets=None):
+    """
+    Returns a list of (content type id, asset queryset) pairs of the assets of a user, of
+    the given assets or of all assets.
+    """
+    querysets = []
+    for model in SNAPSHOT_ASSET_MODELS:
+        queryset = model.objects.all()
+        if user is not None:
+            queryset = queryset.filter(user=user)
+        if assets is not None:
+            queryset = queryset.filter(pk__in=[asset.pk for asset in assets if isinstance(asset, model)])
+        querysets.append((ContentType.objects.get_for_model(model).id, queryset))
+    return querysets
+
+
+def rebuild_balance_snapshots(user=None, assets=None):
+    '''
+    Deletes and recreates the balance snapshots of a user's assets, or of the given assets,
+    from their transactions. Rebuilds snapshots of all assets if neither is given.
+    Returns created object count.
+    '''
+    querysets = get_snapshot_asset_querysets(user, assets)
+    openings = {}
+    for content_type_id, queryset in querysets:
+        for id, user_id, initial in queryset.order_by().values_list("id", "user_id", "initial").iterator():
+            openings[(content_type_id, id)] = (user_id, initial)
+    condition = reduce(or_, [
+        Q(content_type_id=content_type_id, object_id__in=queryset.values("id"))
+        for content_type_id, queryset in querysets
+    ])
+    rows = (
+        Transaction.objects.filter(condition)
+        .values("content_type_id", "object_id", "date")
+        .annotate(change=Sum(Case(When(type="E", then=-F("amount")), default=F("amount"))))
+        .order_by("content_type_id", "object_id", "date")
+        .values_list("content_type_id", "object_id", "date", "change")
+    )
+    with transaction.atomic():
+        BalanceSnapshot.objects.filter(condition).delete()
+        return create_balance_snapshots(openings, rows.iterator())
+
+
+def build_balance_snapshots(openings, rows):
+    """
+    Takes a dictionary in which keys are (content type id, asset id) pairs and values are
+    (user id, initial balance) pairs, and (content type id, asset id, date, balance change)
+    rows ordered by asset and date. Yields unsaved BalanceSnapshot objects of the assets.
+    """
+    key = None
+    for content_type_id, object_id, day, change in rows:
+        if (content_type_id, object_id) not in openings:
+            continue
+        if key != (content_type_id, object_id):
+            key = (content_type_id, object_id)
+            user_id, balance = openings[key]
+        balance += change
+        yield BalanceSnapshot(
+            user_id=user_id, content_type_id=content_type_id, object_id=object_id, date=day, balance=balance
+        )
+
+
+def create_balance_snapshots(openings, rows):
+    """
+    Saves the snapshots of build_balance_snapshots in batches. Returns created object count.
+    """
+    created = 0
+    snapshots = build_balance_snapshots(openings, rows)
+    while True:
+        batch = list(islice(snapshots, SNAPSHOT_BATCH_SIZE))
+        if not batch:
+            break
+        created += len(BalanceSnapshot.objects.bulk_create(batch))
+    return created
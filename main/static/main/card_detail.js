@@ -1,6 +1,6 @@
 import {setupDeleteButtons} from "./delete_button_handler.js";
 import { setupTimeButtons } from "./time_button_handler.js";
-import {setupPgButtons} from "./paginator_buttons_handler.js";
+import {setupPgButtons, getPageQuery} from "./paginator_buttons_handler.js";
 
 const tablePaginatorGroup = document.querySelector('#table-paginator-group');
 const timeButtonsDiv = document.querySelector('#time-buttons-div')
@@ -9,9 +9,9 @@ setupDeleteButtons();
 setupTimeButtons(getData);
 setupPgButtons(getData);
 
-function getData(page=1) {
+function getData(page, cursor) {
     const path = timeButtonsDiv.dataset.path;
-    const url = window.location.pathname + path + `?page=${page}`
+    const url = window.location.pathname + path + getPageQuery(page, cursor)
     fetch(url, {
         method: "GET",
         headers: {}
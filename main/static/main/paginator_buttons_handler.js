@@ -9,7 +9,16 @@ function setupPgButtons(callback, htmlDocument=document) {
 function pgEventHandler(event) {
     const currentButton = event.currentTarget;
     const page = currentButton.dataset.page;
-    currentButton.callback(page);
+    const cursor = currentButton.dataset.cursor;
+    currentButton.callback(page, cursor);
 };
 
-export {setupPgButtons}
\ No newline at end of file
+// cursor paginated views get a cursor instead of a page number, no cursor is the first page
+function getPageQuery(page, cursor) {
+    if (page !== undefined) {
+        return `?page=${page}`;
+    }
+    return `?cursor=${encodeURIComponent(cursor || "")}`;
+};
+
+export {setupPgButtons, getPageQuery}
\ No newline at end of file
@@ -2,7 +2,10 @@ from django.test.runner import DiscoverRunner
 from django.test.utils import override_settings
 import logging
 
-TEST_SETTINGS = {}
+TEST_SETTINGS = {
+    # tests run in one process, and query count assertions shouldn't count cache reads
+    "CACHES": {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+}
 
 class CustomRunner(DiscoverRunner):
     """
@@ -0,0 +1,125 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from main.balances import BalanceLedger, batch_balance_updates
+from main.models import Account
+from main.tests.factories import AccountFactory, AccountTransactionFactory, CategoryFactory, UserFactoryNoSignal
+from main.utils import create_transaction, create_transfer, edit_transaction
+
+
+def get_balance_updates(queries, table):
+    return [query for query in queries if query["sql"].startswith(f'UPDATE "{table}"') and "balance" in query["sql"]]
+
+
+class TestBalanceLedger(TestCase):
+    def setUp(self):
+        self.user = UserFactoryNoSignal()
+        self.account = AccountFactory(user=self.user, balance=100)
+        self.other_account = AccountFactory(user=self.user, balance=0)
+        self.category = CategoryFactory(user=self.user, parent=None)
+
+    def get_data(self, account, amount, type='E'):
+        return {
+            'content_object': account,
+            'name': 'test',
+            'amount': amount,
+            'date': datetime.date(2022, 1, 1),
+            'category': self.category,
+            'type': type,
+        }
+
+    def test_stale_instances_do_not_overwrite_balance(self):
+        stale_account = Account.objects.get(pk=self.account.pk)
+        create_transaction(self.get_data(self.account, 10))
+        create_transaction(self.get_data(stale_account, 20))
+        self.account.refresh_from_db()
+        self.assertEquals(self.account.balance, 70)
+        self.assertEquals(stale_account.balance, 80)
+
+    def test_batch_applies_one_update_per_asset(self):
+        with CaptureQueriesContext(connection) as context:
+            with batch_balance_updates():
+                create_transaction(self.get_data(self.account, 10))
+                create_transaction(self.get_data(self.account, 5, 'I'))
+                create_transaction(self.get_data(self.other_account, 5, 'I'))
+        self.assertEquals(len(get_balance_updates(context.captured_queries, Account._meta.db_table)), 2)
+        self.assertEquals(self.account.balance, 95)
+        self.assertEquals(Account.objects.get(pk=self.account.pk).balance, 95)
+        self.assertEquals(Account.objects.get(pk=self.other_account.pk).balance, 5)
+
+    def test_batch_is_discarded_on_error(self):
+        with self.assertRaises(ValueError):
+            with batch_balance_updates() as ledger:
+                ledger.add(Account, self.account.pk, 10)
+                raise ValueError
+        self.assertEquals(Account.objects.get(pk=self.account.pk).balance, 100)
+
+    def test_zero_deltas_are_skipped(self):
+        ledger = BalanceLedger()
+        ledger.add(Account, self.account.pk, 10)
+        ledger.add(Account, self.account.pk, -10)
+        with self.assertNumQueries(0):
+            self.assertEquals(ledger.apply(), 0)
+
+    def test_create_transfer(self):
+        CategoryFactory(user=self.user, name='Transfer Out', type='E', parent=None)
+        CategoryFactory(user=self.user, name='Transfer In', type='I', parent=None)
+        data = {
+            'from_account': self.account,
+            'to_account': self.other_account,
+            'from_amount': Decimal(30),
+            'to_amount': Decimal(30),
+            'date': datetime.date(2022, 1, 1),
+        }
+        create_transfer(data, self.user)
+        self.assertEquals(Account.objects.get(pk=self.account.pk).balance, 70)
+        self.assertEquals(Account.objects.get(pk=self.other_account.pk).balance, 30)
+
+    def test_edit_transaction_nets_balance_changes(self):
+        transaction_obj = create_transaction(self.get_data(self.account, 10))
+        with CaptureQueriesContext(connection) as context:
+            edit_transaction(transaction_obj, {'amount': 25})
+        self.assertEquals(len(get_balance_updates(context.captured_queries, Account._meta.db_table)), 1)
+        self.assertEquals(Account.objects.get(pk=self.account.pk).balance, 75)
+        edit_transaction(transaction_obj, {'content_object': self.other_account, 'amount': 5})
+        self.assertEquals(Account.objects.get(pk=self.account.pk).balance, 100)
+        self.assertEquals(Account.objects.get(pk=self.other_account.pk).balance, -5)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class TestConcurrentBalanceUpdates(TransactionTestCase):
+    workers = 8
+    transactions_per_worker = 25
+
+    def setUp(self):
+        self.user = UserFactoryNoSignal()
+        self.account = AccountFactory(user=self.user, balance=0)
+        self.category = CategoryFactory(user=self.user, parent=None)
+
+    def add_transactions(self, worker):
+        try:
+            # each thread loads its own copy of the account, as concurrent requests do
+            account = Account.objects.get(pk=self.account.pk)
+            for i in range(self.transactions_per_worker):
+                create_transaction({
+                    'content_object': account,
+                    'name': f'worker {worker}',
+                    'amount': Decimal(i + 1),
+                    'date': datetime.date(2022, 1, 1),
+                    'category': self.category,
+                    'type': 'I' if worker % 2 else 'E',
+                })
+        finally:
+            connection.close()
+
+    def test_concurrent_transactions_on_one_account(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(self.add_transactions, range(self.workers)))
+        worker_total = sum(range(1, self.transactions_per_worker + 1))
+        expected = sum(worker_total if worker % 2 else -worker_total for worker in range(self.workers))
+        self.account.refresh_from_db()
+        self.assertEquals(self.account.balance, expected)
+        self.assertEquals(self.account.transactions.count(), self.workers * self.transactions_per_worker)
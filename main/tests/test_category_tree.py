@@ -0,0 +1,136 @@
+import datetime
+from django.core.cache import cache
+from django.test import TestCase
+from main.category_tree import CATEGORY_TREE_KEY, CategoryTree, get_category_tree
+from main.models import Transaction
+from main.tests.factories import (
+    AccountFactory,
+    AccountTransactionFactory,
+    CategoryFactory,
+    CurrencyFactory,
+    UserFactoryNoSignal,
+    UserPreferencesFactory,
+)
+from main.utils import (
+    get_category_stats,
+    get_multi_currency_category_stats,
+    get_multi_currency_main_category_stats,
+)
+
+
+class TestCategoryTree(TestCase):
+    def setUp(self):
+        self.user = UserFactoryNoSignal()
+        self.food = CategoryFactory(user=self.user, name='food', parent=None)
+        self.groceries = CategoryFactory(user=self.user, name='groceries', parent=self.food)
+        self.fruit = CategoryFactory(user=self.user, name='fruit', parent=self.groceries)
+        self.restaurants = CategoryFactory(user=self.user, name='restaurants', parent=self.food)
+        self.rent = CategoryFactory(user=self.user, name='rent', parent=None)
+        self.salary = CategoryFactory(user=self.user, name='salary', parent=None, type='I')
+
+    def reload(self, *categories):
+        for category in categories:
+            category.refresh_from_db()
+
+    def test_get_descendant_ids(self):
+        self.reload(self.food, self.groceries, self.fruit, self.restaurants)
+        tree = get_category_tree(self.user)
+        self.assertEquals(
+            tree.get_descendant_ids(self.food.id),
+            [category.id for category in self.food.get_descendants(include_self=True)],
+        )
+        self.assertEquals(tree.get_descendant_ids(self.groceries.id, include_self=False), [self.fruit.id])
+        self.assertEquals(tree.get_descendant_ids(self.rent.id), [self.rent.id])
+        self.assertEquals(tree.get_root_id(self.fruit.id), self.food.id)
+
+    def test_get_main_category_ids(self):
+        tree = get_category_tree(self.user)
+        self.assertEquals(tree.get_main_category_ids('E'), [self.food.id, self.rent.id])
+        self.assertEquals(tree.get_main_category_ids('I'), [self.salary.id])
+
+    def test_get_subtree_sum(self):
+        tree = get_category_tree(self.user)
+        sums = {self.fruit.id: 5, self.restaurants.id: 10}
+        self.assertEquals(tree.get_subtree_sum(self.food.id, sums), 15)
+        self.assertEquals(tree.get_subtree_sum(self.groceries.id, sums), 5)
+        self.assertIsNone(tree.get_subtree_sum(self.rent.id, sums))
+
+    def test_tree_is_cached(self):
+        get_category_tree(self.user)
+        with self.assertNumQueries(0):
+            get_category_tree(self.user.id)
+
+    def test_tree_is_invalidated(self):
+        get_category_tree(self.user)
+        sweets = CategoryFactory(user=self.user, name='sweets', parent=self.food)
+        self.assertIn(sweets.id, get_category_tree(self.user).get_descendant_ids(self.food.id))
+        sweets.delete()
+        self.assertNotIn(sweets.id, get_category_tree(self.user))
+
+    def test_stale_tree_is_reloaded_for_missing_category(self):
+        get_category_tree(self.user)
+        sweets = CategoryFactory(user=self.user, name='sweets', parent=self.food)
+        # the tree was cached again before the new category was committed
+        cache.set(CATEGORY_TREE_KEY.format(user_id=self.user.id), CategoryTree(self.user.id, []))
+        self.assertEquals(get_category_tree(self.user, sweets.id).get_descendant_ids(sweets.id), [sweets.id])
+
+
+class TestCategoryTreeStats(TestCase):
+    def setUp(self):
+        self.currency1 = CurrencyFactory(rate__rate=1)
+        self.currency2 = CurrencyFactory(rate__rate=2)
+        self.user = UserFactoryNoSignal()
+        UserPreferencesFactory(user=self.user, primary_currency=self.currency1)
+        self.account1 = AccountFactory(user=self.user, currency=self.currency1)
+        self.account2 = AccountFactory(user=self.user, currency=self.currency2)
+        self.food = CategoryFactory(user=self.user, name='food', parent=None)
+        self.groceries = CategoryFactory(user=self.user, name='groceries', parent=self.food)
+        self.restaurants = CategoryFactory(user=self.user, name='restaurants', parent=self.food)
+        self.rent = CategoryFactory(user=self.user, name='rent', parent=None)
+        for account, category, amount in [
+            (self.account1, self.groceries, 10),
+            (self.account2, self.groceries, 20),
+            (self.account1, self.restaurants, 30),
+            (self.account1, self.rent, 100),
+        ]:
+            AccountTransactionFactory(
+                content_object=account,
+                category=category,
+                amount=amount,
+                type='E',
+                date=datetime.datetime(2021, 5, 1, tzinfo=datetime.timezone.utc),
+            )
+        self.qs = Transaction.objects.filter(user=self.user)
+        get_category_tree(self.user)
+
+    def test_get_category_stats(self):
+        with self.assertNumQueries(1):
+            stats = get_category_stats(self.qs, 'E', None, self.user)
+        self.assertEquals(
+            stats,
+            {
+                'food': {'sum': 60, 'id': self.food.id},
+                'rent': {'sum': 100, 'id': self.rent.id},
+            },
+        )
+
+    def test_stats_reload_a_stale_tree(self):
+        stale_tree = get_category_tree(self.user)
+        sweets = CategoryFactory(user=self.user, name='sweets', parent=self.food)
+        AccountTransactionFactory(content_object=self.account1, category=sweets, amount=5, type='E')
+        # another worker cached the tree again before the new category was committed
+        cache.set(CATEGORY_TREE_KEY.format(user_id=self.user.id), stale_tree)
+        self.assertEquals(get_category_stats(self.qs, 'E', None, self.user)['food']['sum'], 65)
+        cache.set(CATEGORY_TREE_KEY.format(user_id=self.user.id), stale_tree)
+        self.assertEquals(get_multi_currency_main_category_stats(self.qs, 'E', self.user, self.currency1)['food']['sum'], 55)
+        cache.set(CATEGORY_TREE_KEY.format(user_id=self.user.id), stale_tree)
+        stats = get_category_stats(self.qs, 'E', sweets, self.user)
+        self.assertEquals(stats, {'sweets': {'sum': 5, 'id': sweets.id}})
+
+    def test_get_multi_currency_stats(self):
+        stats = get_multi_currency_main_category_stats(self.qs, 'E', self.user, self.currency1)
+        self.assertEquals(stats['food']['sum'], 50)
+        self.assertEquals(stats['rent']['sum'], 100)
+        stats = get_multi_currency_category_stats(self.qs, self.food, self.user, self.currency1)
+        self.assertEquals(stats['groceries']['sum'], 20)
+        self.assertEquals(stats['restaurants']['sum'], 30)
@@ -0,0 +1,180 @@
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+from decimal import Decimal
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from unittest.mock import patch
+from main.models import BalanceSnapshot, CategoryMonthlyTotal, RateHistory, Transaction, TransactionName, User
+from main.rates import get_rate, get_rates
+from main.snapshots import get_balance_at
+from main.tests.factories import (
+    AccountFactory,
+    AccountTransactionFactory,
+    CategoryFactory,
+    CurrencyFactory,
+    UserFactoryNoSignal,
+)
+
+
+class TestRebuildCategoryTotalsCommand(TestCase):
+    def setUp(self):
+        self.user = UserFactoryNoSignal()
+        account = AccountFactory(user=self.user)
+        category = CategoryFactory(user=self.user, parent=None)
+        AccountTransactionFactory(content_object=account, category=category, amount=10, date=datetime.date(2001, 1, 1))
+        AccountTransactionFactory(date=datetime.date(2001, 1, 1))
+
+    def test_rebuild_all_users(self):
+        out = StringIO()
+        call_command("rebuild_category_totals", stdout=out)
+        self.assertEquals(CategoryMonthlyTotal.objects.count(), 2)
+        self.assertIn("2 monthly category totals created", out.getvalue())
+
+    def test_rebuild_single_user(self):
+        call_command("rebuild_category_totals", user=self.user.username, stdout=StringIO())
+        self.assertEquals(CategoryMonthlyTotal.objects.get().user, self.user)
+
+    def test_unknown_user(self):
+        with self.assertRaises(CommandError):
+            call_command("rebuild_category_totals", user="unknown", stdout=StringIO())
+
+
+class TestRebuildTransactionNamesCommand(TestCase):
+    def test_rebuild(self):
+        AccountTransactionFactory(name='Coffee')
+        AccountTransactionFactory(name='Tea')
+        out = StringIO()
+        call_command("rebuild_transaction_names", stdout=out)
+        self.assertEquals(TransactionName.objects.count(), 2)
+        self.assertIn("2 transaction names created", out.getvalue())
+
+
+class TestRebuildBalanceSnapshotsCommand(TestCase):
+    def setUp(self):
+        self.user = UserFactoryNoSignal()
+        account = AccountFactory(user=self.user, initial=100)
+        AccountTransactionFactory(content_object=account, type='E', amount=10, date=datetime.date(2001, 1, 1))
+        AccountTransactionFactory(content_object=account, type='I', amount=5, date=datetime.date(2001, 1, 2))
+        AccountTransactionFactory(date=datetime.date(2001, 1, 1))
+
+    def test_rebuild_all_users(self):
+        out = StringIO()
+        call_command("rebuild_balance_snapshots", stdout=out)
+        self.assertEquals(BalanceSnapshot.objects.count(), 3)
+        self.assertIn("3 balance snapshots created", out.getvalue())
+
+    def test_rebuild_single_user(self):
+        call_command("rebuild_balance_snapshots", user=self.user.username, stdout=StringIO())
+        self.assertEquals(
+            list(BalanceSnapshot.objects.order_by('date').values_list('date', 'balance')),
+            [(datetime.date(2001, 1, 1), 90), (datetime.date(2001, 1, 2), 95)],
+        )
+
+    def test_unknown_user(self):
+        with self.assertRaises(CommandError):
+            call_command("rebuild_balance_snapshots", user="unknown", stdout=StringIO())
+
+
+class TestReconcileBalancesCommand(TestCase):
+    def setUp(self):
+        self.account = AccountFactory(balance=10)
+        self.transaction = AccountTransactionFactory(content_object=self.account, type='E', amount=10)
+
+    def test_report(self):
+        out = StringIO()
+        call_command("reconcile_balances", stdout=out)
+        self.assertIn(f"Account {self.account.id} of user {self.account.user_id}: balance 10.00, expected 0.00", out.getvalue())
+        self.assertIn("1 assets checked, 1 drifted.", out.getvalue())
+        self.account.refresh_from_db()
+        self.assertEquals(self.account.balance, 10)
+
+    def test_repair(self):
+        out = StringIO()
+        call_command("reconcile_balances", user=self.account.user.username, repair=True, stdout=out)
+        self.assertIn("1 balances repaired.", out.getvalue())
+        self.account.refresh_from_db()
+        self.assertEquals(self.account.balance, 0)
+        self.assertEquals(get_balance_at(self.account, self.transaction.date), 0)
+
+    def test_unknown_user(self):
+        with self.assertRaises(CommandError):
+            call_command("reconcile_balances", user="unknown", stdout=StringIO())
+
+
+class TestImportTransactionsCommand(TestCase):
+    def setUp(self):
+        self.account = AccountFactory(name='Bank', balance=0)
+        self.path = os.path.join(tempfile.mkdtemp(), 'transactions.csv')
+        with open(self.path, 'w') as f:
+            f.write("date,name,amount\n2022-01-01,Coffee,-3\n2022-01-02,Salary,10\n")
+
+    def test_import(self):
+        out = StringIO()
+        call_command("import_transactions", self.path, user=self.account.user.username, account='Bank', stdout=out)
+        self.assertIn("2 transactions imported", out.getvalue())
+        self.account.refresh_from_db()
+        self.assertEquals(self.account.balance, 7)
+
+    def test_invalid_file(self):
+        with self.assertRaisesMessage(CommandError, "Row 1: no asset given."):
+            call_command("import_transactions", self.path, user=self.account.user.username, stdout=StringIO())
+
+    def test_unknown_account(self):
+        with self.assertRaises(CommandError):
+            call_command("import_transactions", self.path, user=self.account.user.username, account='unknown', stdout=StringIO())
+
+
+class TestRefreshRatesCommand(TestCase):
+    def setUp(self):
+        self.usd = CurrencyFactory(code='USD', rate__rate=1)
+        self.eur = CurrencyFactory(code='EUR', rate__rate=2)
+        self.jpy = CurrencyFactory(code='JPY', rate=None)
+        self.try_ = CurrencyFactory(code='TRY', rate=None)
+        self.path = os.path.join(tempfile.mkdtemp(), 'rates.json')
+        with open(self.path, 'w') as f:
+            json.dump({'base': 'USD', 'rates': {'USD': 1, 'EUR': 0.98, 'JPY': 142.39, 'GBP': 0.86}}, f)
+
+    def test_refresh(self):
+        get_rates()
+        out = StringIO()
+        with self.assertNumQueries(11):
+            call_command("refresh_rates", file=self.path, stdout=out)
+        self.assertIn("2 rates updated, 1 rates created.", out.getvalue())
+        self.assertIn("No rates for TRY.", out.getvalue())
+        self.assertEquals(get_rate(self.eur), Decimal('0.98'))
+        self.assertEquals(get_rate(self.jpy), Decimal('142.39'))
+        self.assertEquals(
+            RateHistory.objects.get(currency=self.eur, date=datetime.date.today()).rate, Decimal('0.98')
+        )
+
+    def test_invalid_payload(self):
+        with open(self.path, 'w') as f:
+            f.write('{"error": "invalid key"}')
+        with self.assertRaisesMessage(CommandError, "Invalid rates payload."):
+            call_command("refresh_rates", file=self.path, stdout=StringIO())
+
+
+class TestBenchmarkTransactionQueriesCommand(TestCase):
+    def test_benchmark(self):
+        out = StringIO()
+        call_command("benchmark_transaction_queries", transactions=50, users=2, repeat=1, stdout=out)
+        output = out.getvalue()
+        self.assertIn("Without indexes", output)
+        self.assertIn("With indexes", output)
+        self.assertIn("credit card payment plan", output)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(User.objects.filter(username__startswith="benchmark-").exists())
+
+
+class TestFillGuestUserPoolCommand(TestCase):
+    @patch("main.management.commands.fill_guest_user_pool.fill_guest_user_pool")
+    def test_fill_pool(self, fill_mock):
+        fill_mock.return_value = 3
+        out = StringIO()
+        call_command("fill_guest_user_pool", size=3, stdout=out)
+        fill_mock.assert_called_once_with(3)
+        self.assertIn("3 guest users created. Pool depth: 0.", out.getvalue())
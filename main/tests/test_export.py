@@ -0,0 +1,103 @@
+import datetime
+import json
+from django.test import TestCase
+from django.urls import reverse
+from main.tests.factories import (
+    AccountFactory,
+    AccountTransactionFactory,
+    CategoryFactory,
+    CreditCardFactory,
+    CreditCardTransactionFactory,
+    CurrencyFactory,
+    TransferFactory,
+    UserFactoryNoSignal,
+    UserPreferencesFactory,
+)
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        self.user = UserFactoryNoSignal()
+        self.client.force_login(self.user)
+        self.currency = CurrencyFactory(code='USD')
+        self.account = AccountFactory(user=self.user, name='Bank', currency=self.currency)
+        self.card = CreditCardFactory(user=self.user, name='Visa', currency=self.currency)
+        self.category = CategoryFactory(user=self.user, name='Food', parent=None)
+        AccountTransactionFactory(
+            content_object=self.account, category=self.category, name='Coffee', amount=3, type='E', date=datetime.date(2022, 1, 5)
+        )
+        CreditCardTransactionFactory(
+            content_object=self.card, category=self.category, name='Phone', amount=300, type='E',
+            date=datetime.date(2022, 2, 5), installments=None,
+        )
+
+    def get_content(self, response):
+        self.assertEquals(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_transactions_csv(self):
+        response = self.client.get(reverse('main:transactions'), {'export': 'csv'})
+        self.assertEquals(response['Content-Type'], 'text/csv')
+        self.assertIn('filename="transactions.csv"', response['Content-Disposition'])
+        self.assertEquals(self.get_content(response).splitlines(), [
+            'date,name,type,amount,currency,category,asset,asset_type,installments',
+            '2022-02-05,Phone,E,300.00,USD,Food,Visa,creditcard,',
+            '2022-01-05,Coffee,E,3.00,USD,Food,Bank,account,',
+        ])
+
+    def test_transactions_month_archive_jsonl(self):
+        url = reverse('main:transactions_month_archive', kwargs={'year': 2022, 'month': 1})
+        response = self.client.get(url, {'export': 'jsonl'})
+        self.assertIn('filename="transactions-2022-1.jsonl"', response['Content-Disposition'])
+        rows = [json.loads(line) for line in self.get_content(response).splitlines()]
+        self.assertEquals(rows, [{
+            'date': '2022-01-05',
+            'name': 'Coffee',
+            'type': 'E',
+            'amount': '3.00',
+            'currency': 'USD',
+            'category': 'Food',
+            'asset': 'Bank',
+            'asset_type': 'account',
+            'installments': None,
+        }])
+
+    def test_export_query_count_does_not_depend_on_row_count(self):
+        for day in range(1, 20):
+            AccountTransactionFactory(content_object=self.account, date=datetime.date(2022, 3, day))
+        response = self.client.get(reverse('main:transactions'), {'export': 'csv'})
+        with self.assertNumQueries(1):
+            self.get_content(response)
+
+    def test_transfers_csv(self):
+        savings = AccountFactory(user=self.user, name='Savings', currency=self.currency)
+        TransferFactory(
+            user=self.user,
+            date=datetime.date(2022, 1, 6),
+            from_transaction=AccountTransactionFactory(content_object=self.account, type='E', amount=10, name='Transfer Out'),
+            to_transaction=AccountTransactionFactory(content_object=savings, type='I', amount=10, name='Transfer In'),
+        )
+        response = self.client.get(reverse('main:transfers'), {'export': 'csv'})
+        self.assertEquals(self.get_content(response).splitlines(), [
+            'date,from_account,from_amount,from_currency,to_account,to_amount,to_currency',
+            '2022-01-06,Bank,10.00,USD,Savings,10.00,USD',
+        ])
+
+    def test_ins_outs_csv(self):
+        response = self.client.get(reverse('main:ins_outs_year_archive', kwargs={'year': 2022}), {'export': 'csv'})
+        self.assertEquals(self.get_content(response).splitlines(), [
+            'date,name,type,amount,currency,category,account',
+            '2022-01-05,Coffee,E,3.00,USD,Food,Bank',
+        ])
+        self.assertIn('filename="ins-outs-transactions-2022.csv"', response['Content-Disposition'])
+
+    def test_ins_outs_export_links(self):
+        UserPreferencesFactory(user=self.user, primary_currency=self.currency)
+        response = self.client.get(reverse('main:ins_outs_year_archive', kwargs={'year': 2022}))
+        self.assertContains(response, '?export=csv', count=1)
+
+    def test_invalid_format(self):
+        self.assertEquals(self.client.get(reverse('main:transactions'), {'export': 'xml'}).status_code, 404)
+
+    def test_export_links(self):
+        self.assertContains(self.client.get(reverse('main:transactions')), '?export=csv')
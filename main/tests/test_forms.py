@@ -10,6 +10,7 @@ from main.forms import (
     EditTransactionForm,
     CreateCreditCardForm
 )
+from main.assets import AssetSnapshot
 from main.models import UserPreferences
 from main.tests.factories import (
     AccountTransactionFactory,
@@ -285,6 +286,27 @@ class TestForms(TestCase):
         for key, value in data.items():
             self.assertIn(key, form.errors)
 
+    def test_pay_loan_form_with_asset_snapshot(self):
+        currency = CurrencyFactory()
+        valid_loan = LoanFactory(user=self.user, currency=currency)
+        valid_account = AccountFactory(user=self.user, currency=currency)
+        other_account = AccountFactory(currency=currency)
+        assets = AssetSnapshot(self.user)
+        assets.accounts, assets.loans
+        data = {
+            "account": valid_account.id,
+            "loan": valid_loan.id,
+            "amount": 10,
+            "date": datetime.date(2022, 2, 2),
+        }
+        with self.assertNumQueries(0):
+            form = PayLoanForm(user=self.user, assets=assets, data=data)
+            self.assertTrue(form.is_valid())
+            form.as_p()
+        self.assertEquals(form.cleaned_data["account"], valid_account)
+        form = PayLoanForm(user=self.user, assets=assets, data={**data, "account": other_account.id})
+        self.assertIn("account", form.errors)
+
     def test_pay_loan_form_account_and_loan_currencies_not_matching(self):
         loan_currency = CurrencyFactory()
         account_currency = CurrencyFactory()
@@ -0,0 +1,101 @@
+import datetime
+from io import StringIO
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from main.guest_reaper import (
+    GUEST_USER_REAPER_LOCK_KEY,
+    get_expired_guest_users,
+    reap_expired_guest_users,
+    reap_expired_guest_users_if_due,
+)
+from main.models import (
+    Account,
+    BalanceSnapshot,
+    Category,
+    CategoryMonthlyTotal,
+    GuestUserSession,
+    PooledGuestUser,
+    Transaction,
+    Transfer,
+    User,
+    UserPreferences,
+)
+from main.tests.factories import (
+    AccountFactory,
+    AccountTransactionFactory,
+    CurrencyFactory,
+    SessionFactory,
+    TransferFactory,
+    UserFactory,
+    UserFactoryNoSignal,
+)
+from main.snapshots import rebuild_balance_snapshots
+from main.utils import rebuild_category_monthly_totals
+
+
+class TestGuestReaper(TestCase):
+    def setUp(self):
+        CurrencyFactory(id=5)
+        self.expired_guest = self.create_guest(expire_date=timezone.now() - datetime.timedelta(days=1))
+        self.active_guest = self.create_guest(expire_date=timezone.now() + datetime.timedelta(days=1))
+        self.pooled_guest = UserFactoryNoSignal(is_guest=True)
+        PooledGuestUser.objects.create(user=self.pooled_guest)
+        self.user = UserFactoryNoSignal()
+
+    def create_guest(self, expire_date):
+        user = UserFactory(is_guest=True)
+        session = SessionFactory(expire_date=expire_date)
+        GuestUserSession.objects.create(user=user, session=session)
+        account = AccountFactory(user=user)
+        category = Category.objects.filter(user=user, children__isnull=True).first()
+        transactions = [
+            AccountTransactionFactory(content_object=account, category=category) for _ in range(2)
+        ]
+        TransferFactory(user=user, from_transaction=transactions[0], to_transaction=transactions[1])
+        rebuild_category_monthly_totals(user)
+        rebuild_balance_snapshots(user)
+        return user
+
+    def test_get_expired_guest_users(self):
+        orphan_guest = UserFactoryNoSignal(is_guest=True)
+        self.assertEquals(set(get_expired_guest_users()), {self.expired_guest, orphan_guest})
+
+    def test_reap_expired_guest_users(self):
+        session_key = self.expired_guest.guest_user_session.get().session_id
+        users, rows, seconds = reap_expired_guest_users(batch_size=1)
+        self.assertEquals(users, 1)
+        self.assertGreater(rows, 0)
+        self.assertFalse(User.objects.filter(pk=self.expired_guest.pk).exists())
+        self.assertFalse(Session.objects.filter(pk=session_key).exists())
+        for model in [Account, BalanceSnapshot, Category, CategoryMonthlyTotal, Transaction, Transfer, UserPreferences]:
+            self.assertFalse(model.objects.filter(user_id=self.expired_guest.pk).exists())
+        for user in [self.active_guest, self.pooled_guest, self.user]:
+            self.assertTrue(User.objects.filter(pk=user.pk).exists())
+        self.assertTrue(Transaction.objects.filter(user=self.active_guest).exists())
+
+    def test_reap_in_batches(self):
+        for _ in range(3):
+            UserFactoryNoSignal(is_guest=True)
+        users, rows, seconds = reap_expired_guest_users(batch_size=2, max_batches=1)
+        self.assertEquals(users, 2)
+        users, rows, seconds = reap_expired_guest_users(batch_size=2)
+        self.assertEquals(users, 2)
+        self.assertFalse(get_expired_guest_users().exists())
+
+    def test_reap_once_per_interval(self):
+        self.addCleanup(cache.delete, GUEST_USER_REAPER_LOCK_KEY)
+        users, rows, seconds = reap_expired_guest_users_if_due(60)
+        self.assertEquals(users, 1)
+        UserFactoryNoSignal(is_guest=True)
+        # another worker's reaper within the same interval
+        self.assertIsNone(reap_expired_guest_users_if_due(60))
+        self.assertTrue(get_expired_guest_users().exists())
+
+    def test_command(self):
+        out = StringIO()
+        call_command("reap_guest_users", stdout=out)
+        self.assertIn("1 guest users and", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
@@ -0,0 +1,82 @@
+import datetime
+from decimal import Decimal
+from django.test import TestCase
+from freezegun import freeze_time
+from main.loan_analytics import LOAN_PROJECTION_MAX_MONTHS, get_loan_analytics
+from main.models import Transaction
+from main.tests.factories import LoanFactory, LoanTransactionFactory
+
+
+@freeze_time('2022-05-25')
+class TestLoanAnalytics(TestCase):
+    def setUp(self):
+        self.loan = LoanFactory(initial=-1000, balance=-1000)
+
+    def add(self, amount, date, type='I'):
+        return LoanTransactionFactory(content_object=self.loan, amount=amount, date=date, type=type)
+
+    def test_balance_series(self):
+        self.add(100, datetime.date(2022, 6, 10))
+        self.add(50, datetime.date(2022, 6, 10))
+        self.add(20, datetime.date(2022, 7, 1), 'E')
+        self.add(200, datetime.date(2022, 8, 10))
+        with self.assertNumQueries(1):
+            analytics = get_loan_analytics(self.loan)
+        self.assertEquals(
+            analytics['dates'],
+            [datetime.date(2022, 5, 25), datetime.date(2022, 6, 10), datetime.date(2022, 7, 1), datetime.date(2022, 8, 10)],
+        )
+        self.assertEquals(analytics['balances'], [1000, 850, 870, 670])
+        self.assertEquals(analytics['balance'], -670)
+        self.assertEquals(analytics['paid'], 350)
+
+    def test_amortization_projection(self):
+        self.add(100, datetime.date(2022, 6, 10))
+        self.add(200, datetime.date(2022, 8, 10))
+        analytics = get_loan_analytics(self.loan)
+        self.assertEquals(analytics['average_payment'], 100)
+        self.assertEquals(analytics['remaining_months'], 7)
+        self.assertEquals(analytics['payoff_date'], datetime.date(2023, 3, 10))
+        self.assertEquals(analytics['projection_dates'][0], datetime.date(2022, 9, 10))
+        self.assertEquals(analytics['projection_balances'], [600, 500, 400, 300, 200, 100, 0])
+
+    def test_without_payments(self):
+        analytics = get_loan_analytics(self.loan)
+        self.assertEquals(analytics['dates'], [datetime.date(2022, 5, 25)])
+        self.assertEquals(analytics['balances'], [1000])
+        self.assertIsNone(analytics['average_payment'])
+        self.assertIsNone(analytics['remaining_months'])
+        self.assertEquals(analytics['projection_dates'], [])
+
+    def test_paid_off_loan(self):
+        self.add(1000, datetime.date(2022, 6, 10))
+        analytics = get_loan_analytics(self.loan)
+        self.assertEquals(analytics['remaining_months'], 0)
+        self.assertIsNone(analytics['payoff_date'])
+        self.assertEquals(analytics['projection_balances'], [])
+
+    def test_projection_is_capped(self):
+        self.loan.initial = Decimal(-1000000)
+        self.add(1, datetime.date(2022, 6, 10))
+        analytics = get_loan_analytics(self.loan)
+        self.assertEquals(analytics['remaining_months'], 999999)
+        self.assertEquals(len(analytics['projection_dates']), LOAN_PROJECTION_MAX_MONTHS)
+        self.assertIsNone(analytics['payoff_date'])
+
+    def test_many_payments_in_one_query(self):
+        transaction_obj = self.add(1, datetime.date(2000, 1, 1))
+        Transaction.objects.bulk_create([
+            Transaction(
+                content_type_id=transaction_obj.content_type_id,
+                object_id=self.loan.id,
+                name='payment',
+                amount=Decimal('0.10'),
+                date=datetime.date(2000, 1, 1) + datetime.timedelta(days=day),
+                type='I',
+            )
+            for day in range(1, 3000)
+        ])
+        with self.assertNumQueries(1):
+            analytics = get_loan_analytics(self.loan)
+        self.assertEquals(len(analytics['dates']), 3001)
+        self.assertEquals(analytics['balances'][-1], Decimal('699.10'))
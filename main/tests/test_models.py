@@ -211,6 +211,23 @@ class TestTransaction(TestCase):
         self.assertEquals(transaction_without_installments.due_date, datetime(2000,5,15, tzinfo=UTC))
         self.assertEquals(transaction_with_installments.due_date, datetime(2000,6,15, tzinfo=UTC))
 
+    def test_save_sets_user_and_asset_kind(self):
+        card_transaction = CreditCardTransactionFactory()
+        loan_transaction = LoanTransactionFactory()
+        self.assertEquals(self.object.user, self.object.content_object.user)
+        self.assertEquals(self.object.asset_kind, 'account')
+        self.assertEquals(card_transaction.user, card_transaction.content_object.user)
+        self.assertEquals(card_transaction.asset_kind, 'creditcard')
+        self.assertEquals(loan_transaction.user, loan_transaction.content_object.user)
+        self.assertEquals(loan_transaction.asset_kind, 'loan')
+
+    def test_save_updates_user_when_asset_changes(self):
+        account = AccountFactory()
+        self.object.content_object = account
+        self.object.save()
+        self.object.refresh_from_db()
+        self.assertEquals(self.object.user, account.user)
+
     def test_installment_amount_property(self):
         card_transaction = CreditCardTransactionFactory(installments=5, amount=10, date=datetime(2000,5,1, tzinfo=UTC))
         self.assertEquals(card_transaction.installment_amount, 2)
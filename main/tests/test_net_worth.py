@@ -0,0 +1,120 @@
+import datetime
+from django.test import TestCase
+from freezegun import freeze_time
+from main.models import RateHistory
+from main.net_worth import (
+    get_account_monthly_changes,
+    get_month_end,
+    get_month_index,
+    get_month_label,
+    get_net_worth_stats,
+)
+from main.tests.factories import (
+    AccountFactory,
+    AccountTransactionFactory,
+    CurrencyFactory,
+    UserFactoryNoSignal,
+    UserPreferencesFactory,
+)
+
+
+class TestNetWorth(TestCase):
+    def setUp(self):
+        self.currency1 = CurrencyFactory(rate__rate=1)
+        self.currency2 = CurrencyFactory(rate__rate=2)
+        self.user = UserFactoryNoSignal()
+        UserPreferencesFactory(user=self.user, primary_currency=self.currency1)
+
+    def create_account(self, currency, initial, created, **kwargs):
+        with freeze_time(created):
+            return AccountFactory(user=self.user, currency=currency, balance=initial, **kwargs)
+
+    def create_transaction(self, account, amount, date, type='E'):
+        return AccountTransactionFactory(
+            content_object=account,
+            amount=amount,
+            type=type,
+            date=datetime.datetime(*date, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_month_index_and_label(self):
+        self.assertEquals(get_month_label(get_month_index(2021, 12)), '2021-12')
+        self.assertEquals(get_month_index(2022, 1) - get_month_index(2021, 12), 1)
+
+    @freeze_time('2022-05-25')
+    def test_get_month_end(self):
+        self.assertEquals(get_month_end(get_month_index(2021, 12)), datetime.date(2021, 12, 31))
+        self.assertEquals(get_month_end(get_month_index(2022, 2)), datetime.date(2022, 2, 28))
+        self.assertEquals(get_month_end(get_month_index(2022, 5)), datetime.date(2022, 5, 25))
+
+    def test_get_account_monthly_changes(self):
+        account = self.create_account(self.currency1, 100, '2022-01-10')
+        self.create_transaction(account, 30, (2022, 2, 1), type='I')
+        self.create_transaction(account, 10, (2022, 2, 15))
+        self.create_transaction(account, 5, (2022, 4, 1))
+        changes = get_account_monthly_changes(self.user)
+        self.assertEquals(changes, {
+            account.id: {get_month_index(2022, 2): 20, get_month_index(2022, 4): -5}
+        })
+
+    @freeze_time('2022-05-25')
+    def test_get_net_worth_stats(self):
+        account1 = self.create_account(self.currency1, 100, '2022-01-10')
+        account2 = self.create_account(self.currency1, 50, '2022-03-10')
+        account3 = self.create_account(self.currency2, 20, '2022-02-10')
+        self.create_transaction(account1, 10, (2022, 2, 1))
+        self.create_transaction(account2, 20, (2022, 4, 1), type='I')
+        self.create_transaction(account3, 4, (2022, 6, 1), type='I')
+        stats, total_stats = get_net_worth_stats(self.user)
+        self.assertEquals(stats, {
+            self.currency1: [
+                ('2022-01', 100), ('2022-02', 90), ('2022-03', 140),
+                ('2022-04', 160), ('2022-05', 160), ('2022-06', 160),
+            ],
+            self.currency2: [
+                ('2022-02', 20), ('2022-03', 20), ('2022-04', 20),
+                ('2022-05', 20), ('2022-06', 24),
+            ],
+        })
+        self.assertEquals(total_stats, {
+            self.currency1: [
+                ('2022-01', 100), ('2022-02', 100), ('2022-03', 150),
+                ('2022-04', 170), ('2022-05', 170), ('2022-06', 172),
+            ]
+        })
+
+    @freeze_time('2022-05-25')
+    def test_total_worth_uses_historical_rates(self):
+        self.create_account(self.currency2, 20, '2022-02-10')
+        RateHistory.objects.create(currency=self.currency2, date=datetime.date(2022, 1, 1), rate=4)
+        RateHistory.objects.create(currency=self.currency2, date=datetime.date(2022, 4, 15), rate=2)
+        stats, total_stats = get_net_worth_stats(self.user)
+        self.assertEquals(total_stats, {
+            self.currency1: [('2022-02', 5), ('2022-03', 5), ('2022-04', 10), ('2022-05', 10)]
+        })
+
+    @freeze_time('2022-05-25')
+    def test_get_net_worth_stats_excludes_inactive_currencies(self):
+        self.create_account(self.currency1, 100, '2022-04-10')
+        self.create_account(self.currency1, 10, '2022-04-10', is_active=False)
+        self.create_account(self.currency2, 20, '2022-04-10', is_active=False)
+        stats, total_stats = get_net_worth_stats(self.user)
+        self.assertEquals(stats, {self.currency1: [('2022-04', 110), ('2022-05', 110)]})
+        self.assertEquals(total_stats, {self.currency1: [('2022-04', 110), ('2022-05', 110)]})
+
+    def test_get_net_worth_stats_without_accounts(self):
+        self.assertEquals(get_net_worth_stats(self.user), ({}, {self.currency1: []}))
+
+    @freeze_time('2022-05-25')
+    def test_get_net_worth_stats_number_of_queries(self):
+        for currency in [self.currency1, self.currency2]:
+            for _ in range(3):
+                account = self.create_account(currency, 100, '2021-01-10')
+                for month in range(1, 6):
+                    self.create_transaction(account, 10, (2022, month, 1))
+        self.user.refresh_from_db()
+        get_net_worth_stats(self.user)
+        self.user.refresh_from_db()
+        # accounts, user preferences, primary currency and monthly changes
+        with self.assertNumQueries(4):
+            get_net_worth_stats(self.user)
@@ -0,0 +1,68 @@
+import datetime
+from django.test import TestCase
+from django.urls import reverse
+from main.models import Transaction
+from main.pagination import CursorPage, decode_cursor, encode_cursor, get_cursor_page
+from main.tests.factories import AccountFactory, AccountTransactionFactory, UserFactoryNoSignal
+
+
+class TestCursorPagination(TestCase):
+    def setUp(self):
+        self.user = UserFactoryNoSignal()
+        self.account = AccountFactory(user=self.user)
+        # several transactions share a date to test the (date, created, id) ordering
+        for day in [1, 1, 1, 2, 2, 3, 4, 4, 5, 6, 7]:
+            AccountTransactionFactory(content_object=self.account, date=datetime.date(2022, 1, day))
+        self.qs = Transaction.objects.filter(user=self.user)
+        self.ordered = list(self.qs.order_by("-date", "-created", "-id"))
+
+    def get_pages(self, cursor, attribute):
+        pages = []
+        while cursor is not None:
+            page = get_cursor_page(self.qs, cursor, 3)
+            pages.append(list(page))
+            cursor = getattr(page, attribute)
+        return pages
+
+    def test_cursor_round_trip(self):
+        obj = self.ordered[0]
+        direction, position = decode_cursor(encode_cursor("next", obj))
+        self.assertEquals(direction, "next")
+        self.assertEquals(position, (obj.date, obj.created, obj.id))
+        self.assertEquals(decode_cursor(""), ("first", None))
+        with self.assertRaises(ValueError):
+            decode_cursor("invalid")
+
+    def test_walk_forward(self):
+        pages = self.get_pages(CursorPage.first_cursor, "next_cursor")
+        self.assertEquals([len(page) for page in pages], [3, 3, 3, 2])
+        self.assertEquals(sum(pages, []), self.ordered)
+
+    def test_walk_backward(self):
+        pages = self.get_pages(CursorPage.last_cursor, "previous_cursor")
+        self.assertEquals([len(page) for page in pages], [3, 3, 3, 2])
+        self.assertEquals(sum(reversed(pages), []), self.ordered)
+
+    def test_previous_of_next_page(self):
+        first = get_cursor_page(self.qs, "", 3)
+        second = get_cursor_page(self.qs, first.next_cursor, 3)
+        self.assertTrue(second.has_previous)
+        self.assertEquals(list(get_cursor_page(self.qs, second.previous_cursor, 3)), list(first))
+        self.assertFalse(first.has_previous)
+
+    def test_page_cost_does_not_depend_on_depth(self):
+        page = get_cursor_page(self.qs, "", 3)
+        with self.assertNumQueries(1):
+            get_cursor_page(self.qs, page.next_cursor, 3)
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        url = reverse("main:transactions")
+        response = self.client.get(url)
+        self.assertTrue(response.context["cursor_pagination"])
+        self.assertEquals(list(response.context["transactions"]), self.ordered[:10])
+        response = self.client.get(url, {"cursor": response.context["page_obj"].next_cursor})
+        self.assertEquals(list(response.context["transactions"]), self.ordered[10:])
+        response = self.client.get(url, {"page": 2})
+        self.assertFalse(response.context["cursor_pagination"])
+        self.assertEquals(self.client.get(url, {"cursor": "invalid"}).status_code, 404)
@@ -0,0 +1,151 @@
+import datetime
+from decimal import Decimal
+from django.core import serializers
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import override_settings
+from main.models import Rate, RateHistory
+from main.rates import (
+    RATES_VERSION_KEY,
+    RateHistoryTable,
+    bump_rates_version,
+    convert_amounts,
+    convert_series_as_of,
+    get_conversion_factor,
+    get_rate,
+    get_rate_history,
+    get_rates,
+    get_rates_as_of,
+    round_money,
+)
+from main.tests.factories import CurrencyFactory
+
+
+class TestRateProvider(TestCase):
+    def setUp(self):
+        self.currency1 = CurrencyFactory(rate__rate=1)
+        self.currency2 = CurrencyFactory(rate__rate=2)
+
+    def test_get_rates(self):
+        rates = get_rates()
+        self.assertEquals(rates[self.currency1.id], 1)
+        self.assertEquals(rates[self.currency2.id], 2)
+
+    def test_rates_are_immutable(self):
+        with self.assertRaises(TypeError):
+            get_rates()[self.currency1.id] = 5
+
+    def test_rates_loaded_once(self):
+        get_rates()
+        with self.assertNumQueries(0):
+            get_rate(self.currency1)
+            get_rate(self.currency2.id)
+
+    def test_get_rate_without_rate(self):
+        self.currency1.rate.delete()
+        with self.assertRaises(Rate.DoesNotExist):
+            get_rate(self.currency1)
+
+    def test_rate_save_invalidates_rates(self):
+        get_rates()
+        rate = self.currency1.rate
+        rate.rate = 3
+        rate.save()
+        self.assertEquals(get_rate(self.currency1), 3)
+
+    @override_settings(CURRENCY_RATES_CHECK_INTERVAL=0)
+    def test_version_change_from_other_process_reloads_rates(self):
+        get_rates()
+        Rate.objects.filter(currency=self.currency1).update(rate=7)
+        self.assertEquals(get_rate(self.currency1), 1)
+        cache.set(RATES_VERSION_KEY, "other process version", None)
+        self.assertEquals(get_rate(self.currency1), 7)
+
+    def test_bump_rates_version(self):
+        get_rates()
+        version = cache.get(RATES_VERSION_KEY)
+        Rate.objects.filter(currency=self.currency1).update(rate=7)
+        bump_rates_version()
+        self.assertNotEqual(cache.get(RATES_VERSION_KEY), version)
+        self.assertEquals(get_rate(self.currency1), 7)
+
+
+class TestRateHistory(TestCase):
+    def setUp(self):
+        self.currency1 = CurrencyFactory(rate__rate=1)
+        self.currency2 = CurrencyFactory(rate__rate=4)
+        RateHistory.objects.create(currency=self.currency2, date=datetime.date(2022, 1, 1), rate=2)
+        RateHistory.objects.create(currency=self.currency2, date=datetime.date(2022, 3, 1), rate=3)
+
+    def test_rate_history_table(self):
+        table = RateHistoryTable([
+            (1, datetime.date(2022, 3, 1), 3),
+            (1, datetime.date(2022, 1, 1), 2),
+        ])
+        self.assertEquals(table.get_rate(1, datetime.date(2021, 12, 31)), 2)
+        self.assertEquals(table.get_rate(1, datetime.date(2022, 2, 28)), 2)
+        self.assertEquals(table.get_rate(1, datetime.date(2022, 3, 1)), 3)
+        self.assertEquals(
+            table.get_rates(1, [datetime.date(2022, 1, 15), datetime.date(2022, 4, 1)]), [2, 3]
+        )
+        self.assertNotIn(2, table)
+
+    def test_rate_save_records_history(self):
+        rate = self.currency1.rate
+        rate.rate = 5
+        rate.save()
+        self.assertEquals(
+            list(RateHistory.objects.filter(currency=self.currency1).values_list('date', 'rate')),
+            [(datetime.date.today(), 5)],
+        )
+        self.assertEquals(get_rates_as_of(self.currency1, [datetime.date.today()]), [5])
+
+    def test_loaded_rate_records_no_history(self):
+        rate = self.currency1.rate
+        RateHistory.objects.all().delete()
+        data = serializers.serialize('json', [rate])
+        for deserialized in serializers.deserialize('json', data):
+            deserialized.save()
+        self.assertFalse(RateHistory.objects.exists())
+
+    def test_get_rates_as_of(self):
+        days = [datetime.date(2022, 1, 31), datetime.date(2022, 3, 31), datetime.date.today()]
+        self.assertEquals(get_rates_as_of(self.currency2, days), [2, 3, 4])
+        RateHistory.objects.filter(currency=self.currency1).delete()
+        self.assertEquals(get_rates_as_of(self.currency1.id, days), [1, 1, 1])
+
+    def test_history_loaded_once(self):
+        get_rate_history()
+        with self.assertNumQueries(0):
+            get_rates_as_of(self.currency2, [datetime.date(2022, 1, 31)])
+
+    def test_convert_series_as_of(self):
+        days = [datetime.date(2022, 1, 31), datetime.date(2022, 3, 31)]
+        self.assertEquals(convert_series_as_of([10, 10], days, self.currency1, self.currency2), [20, 30])
+        self.assertEquals(convert_series_as_of([10, 10], days, self.currency2, self.currency1), [5, Decimal('3.33')])
+
+
+class TestConversionKernel(TestCase):
+    def setUp(self):
+        self.currency1 = CurrencyFactory(rate__rate=1)
+        self.currency2 = CurrencyFactory(rate__rate=Decimal('3.1234567891'))
+        self.currency3 = CurrencyFactory(rate__rate=Decimal('0.0000123456'))
+
+    def test_rates_keep_precision(self):
+        Rate.objects.filter(currency=self.currency2).update(rate=Decimal('3.1234567891'))
+        self.assertEquals(Rate.objects.get(currency=self.currency2).rate, Decimal('3.1234567891'))
+
+    def test_round_money(self):
+        self.assertEquals(round_money(Decimal('0.125')), Decimal('0.13'))
+        self.assertEquals(round_money(Decimal('-0.125')), Decimal('-0.13'))
+        self.assertEquals(round_money(Decimal('0.124999')), Decimal('0.12'))
+
+    def test_conversion_factor_is_not_rounded(self):
+        self.assertEquals(get_conversion_factor(self.currency3, self.currency1), 1 / Decimal('0.0000123456'))
+
+    def test_convert_amounts(self):
+        rows = [(Decimal(10), self.currency1), (Decimal(10), self.currency2.id), (Decimal('1000000'), self.currency3)]
+        get_rates()
+        with self.assertNumQueries(0):
+            converted = convert_amounts(rows, self.currency2)
+        self.assertEquals(converted, [Decimal('31.23'), Decimal('10.00'), Decimal('253001619127.46')])
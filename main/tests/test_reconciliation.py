@@ -0,0 +1,89 @@
+import datetime
+from django.core.cache import cache
+from django.test import TestCase
+from unittest.mock import patch
+from main import reconciliation
+from main.models import Account, CreditCard, User
+from main.reconciliation import get_balance_changes, get_balance_drifts, reconcile_balances
+from main.tests.factories import (
+    AccountFactory,
+    AccountTransactionFactory,
+    CategoryFactory,
+    CreditCardFactory,
+    CreditCardTransactionFactory,
+    UserFactoryNoSignal,
+)
+from main.utils import LEDGER_VERSION_KEY, create_transaction
+
+
+class TestBalanceReconciliation(TestCase):
+    def setUp(self):
+        self.user = UserFactoryNoSignal()
+        self.account = AccountFactory(user=self.user, balance=100)
+        self.card = CreditCardFactory(user=self.user, balance=-50)
+        self.category = CategoryFactory(user=self.user, parent=None)
+        create_transaction({
+            'content_object': self.account,
+            'name': 'test',
+            'amount': 30,
+            'date': datetime.date(2022, 1, 1),
+            'category': self.category,
+            'type': 'E',
+        })
+
+    def test_consistent_balances(self):
+        self.assertEquals(get_balance_drifts([self.user.id]), (2, []))
+
+    def test_drift_detection(self):
+        # factories create transactions without changing balances
+        AccountTransactionFactory(content_object=self.account, type='I', amount=20)
+        CreditCardTransactionFactory(content_object=self.card, type='E', amount=5)
+        with self.assertNumQueries(4):
+            checked, drifts = get_balance_drifts([self.user.id])
+        self.assertEquals(checked, 2)
+        self.assertEquals(
+            [(drift['model'], drift['id'], drift['expected'], drift['drift']) for drift in drifts],
+            [(Account, self.account.id, 90, -20), (CreditCard, self.card.id, -55, 5)],
+        )
+
+    def test_repair(self):
+        AccountTransactionFactory(content_object=self.account, type='I', amount=20)
+        other_account = AccountFactory(balance=10)
+        AccountTransactionFactory(content_object=other_account, type='E', amount=10)
+        version = cache.get(LEDGER_VERSION_KEY.format(user_id=self.user.id))
+        checked, drifts, repaired = reconcile_balances(repair=True, chunk_size=1)
+        self.assertEquals((checked, len(drifts), repaired), (3, 2, 2))
+        self.assertNotEquals(cache.get(LEDGER_VERSION_KEY.format(user_id=self.user.id)), version)
+        self.assertEquals(Account.objects.get(pk=self.account.pk).balance, 90)
+        self.assertEquals(Account.objects.get(pk=other_account.pk).balance, 0)
+        self.assertEquals(reconcile_balances()[1], [])
+
+    def test_transaction_saved_during_measurement_is_not_repaired(self):
+        calls = []
+
+        def get_changes_before_transaction(user_ids):
+            changes = get_balance_changes(user_ids)
+            if not calls:
+                # saved after the sums are read and before the balances are
+                calls.append(create_transaction({
+                    'content_object': self.account,
+                    'name': 'test',
+                    'amount': 20,
+                    'date': datetime.date(2022, 1, 2),
+                    'category': self.category,
+                    'type': 'E',
+                }))
+            return changes
+
+        with patch.object(reconciliation, 'get_balance_changes', get_changes_before_transaction):
+            checked, drifts, repaired = reconcile_balances(repair=True)
+        self.assertEquals([(drift['id'], drift['drift']) for drift in drifts], [(self.account.id, -20)])
+        self.assertEquals(repaired, 0)
+        self.assertEquals(Account.objects.get(pk=self.account.pk).balance, 50)
+        self.assertEquals(reconcile_balances()[1], [])
+
+    def test_single_user(self):
+        other_account = AccountFactory(balance=10)
+        AccountTransactionFactory(content_object=other_account, type='E', amount=10)
+        checked, drifts, repaired = reconcile_balances(User.objects.filter(id=self.user.id), repair=True)
+        self.assertEquals((checked, drifts, repaired), (2, [], 0))
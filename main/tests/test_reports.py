@@ -0,0 +1,75 @@
+import datetime
+from decimal import Decimal
+from django.test import TestCase
+from main.models import Transaction
+from main.rates import get_rates
+from main.reports import get_ins_outs_report, get_ins_outs_sums, get_ins_outs_total
+from main.tests.factories import (
+    AccountFactory,
+    AccountTransactionFactory,
+    CurrencyFactory,
+    UserFactoryNoSignal,
+)
+
+
+class TestInsOutsReport(TestCase):
+    def setUp(self):
+        self.user = UserFactoryNoSignal()
+        self.currency1 = CurrencyFactory(rate__rate=1)
+        self.currency2 = CurrencyFactory(rate__rate=2)
+        self.currency3 = CurrencyFactory(rate__rate=3)
+        self.account1 = AccountFactory(user=self.user, currency=self.currency1)
+        self.account2 = AccountFactory(user=self.user, currency=self.currency2)
+        AccountFactory(user=self.user, currency=self.currency3)
+        for account, type, amount in [
+            (self.account1, 'E', 10),
+            (self.account1, 'E', 5),
+            (self.account1, 'I', 40),
+            (self.account2, 'E', Decimal('7.50')),
+            (self.account2, 'I', 1),
+        ]:
+            AccountTransactionFactory(content_object=account, type=type, amount=amount, date=datetime.date(2022, 1, 1))
+        AccountTransactionFactory(type='E', amount=1000)
+
+    def get_queryset(self):
+        return Transaction.objects.filter(account__user=self.user).select_related('category')
+
+    def test_get_ins_outs_sums(self):
+        with self.assertNumQueries(1):
+            sums = get_ins_outs_sums(self.get_queryset())
+        self.assertEquals(sums, {
+            self.currency1.id: {'expense': 15, 'income': 40},
+            self.currency2.id: {'expense': Decimal('7.50'), 'income': 1},
+        })
+
+    def test_report(self):
+        get_rates()
+        with self.assertNumQueries(2):
+            report, total = get_ins_outs_report(self.user, self.get_queryset(), self.currency1)
+        self.assertEquals(report, [
+            {'currency': self.currency1, 'expense': 15, 'income': 40, 'balance': 25},
+            {'currency': self.currency2, 'expense': Decimal('7.50'), 'income': 1, 'balance': Decimal('-6.50')},
+            {'currency': self.currency3, 'expense': 0, 'income': 0, 'balance': 0},
+        ])
+        self.assertEquals(
+            total,
+            {'currency': self.currency1.name, 'expense': Decimal('18.75'), 'income': Decimal('40.50'), 'balance': Decimal('21.75')},
+        )
+
+    def test_report_of_filtered_queryset(self):
+        qs = self.get_queryset().filter(type='E', content_type__model='account', object_id=self.account2.id)
+        report, total = get_ins_outs_report(self.user, qs, self.currency2)
+        self.assertEquals([row['expense'] for row in report], [0, Decimal('7.50'), 0])
+        self.assertEquals(total['expense'], Decimal('7.50'))
+        self.assertEquals(total['income'], 0)
+
+    def test_total_rounds_converted_sums(self):
+        report = [
+            {'currency': self.currency1, 'expense': Decimal('10.00'), 'income': Decimal('20.00')},
+            {'currency': self.currency3, 'expense': Decimal('10.00'), 'income': Decimal('0.01')},
+        ]
+        total = get_ins_outs_total(report, self.currency2)
+        self.assertEquals(
+            total,
+            {'currency': self.currency2.name, 'expense': Decimal('26.67'), 'income': Decimal('40.01'), 'balance': Decimal('13.34')},
+        )
@@ -0,0 +1,123 @@
+import datetime
+from decimal import Decimal
+from django.test import TestCase
+from django.urls import reverse
+from main.models import BalanceSnapshot
+from main.snapshots import get_asset_snapshots, get_balance_at, rebuild_balance_snapshots
+from main.tests.factories import AccountFactory, CategoryFactory, LoanFactory, UserFactoryNoSignal
+from main.utils import create_transaction, edit_transaction, handle_transaction_delete
+
+
+class TestBalanceSnapshots(TestCase):
+    def setUp(self):
+        self.user = UserFactoryNoSignal()
+        self.account = AccountFactory(user=self.user, initial=100, balance=100)
+        self.category = CategoryFactory(user=self.user, parent=None)
+
+    def create(self, amount, day, type='E', asset=None):
+        return create_transaction({
+            'content_object': asset or self.account,
+            'name': 'test',
+            'amount': amount,
+            'date': datetime.date(2022, 1, day),
+            'category': self.category,
+            'type': type,
+        })
+
+    def get_series(self, asset=None):
+        asset = asset or self.account
+        snapshots = get_asset_snapshots(type(asset), asset.pk).order_by('date')
+        return [(day.day, balance) for day, balance in snapshots.values_list('date', 'balance')]
+
+    def test_transactions_update_closing_balances(self):
+        self.create(10, 5)
+        self.create(20, 5, 'I')
+        self.create(30, 9)
+        self.assertEquals(self.get_series(), [(5, 110), (9, 80)])
+
+    def test_backdated_transaction_shifts_later_snapshots(self):
+        self.create(10, 5)
+        self.create(30, 9)
+        self.create(5, 1, 'I')
+        self.create(1, 7)
+        self.assertEquals(self.get_series(), [(1, 105), (5, 95), (7, 94), (9, 64)])
+
+    def test_edit_and_delete(self):
+        transaction_obj = self.create(10, 5)
+        self.create(30, 9)
+        edit_transaction(transaction_obj, {'date': datetime.date(2022, 1, 12), 'amount': 15})
+        self.assertEquals(self.get_series(), [(5, 100), (9, 70), (12, 55)])
+        handle_transaction_delete(transaction_obj)
+        self.assertEquals(self.get_series(), [(5, 100), (9, 70), (12, 70)])
+
+    def test_snapshots_follow_the_asset_balance(self):
+        loan = LoanFactory(user=self.user, initial=-1000, balance=-1000)
+        self.create(100, 3, 'I', loan)
+        self.create(200, 8, 'I', loan)
+        self.assertEquals(self.get_series(loan), [(3, -900), (8, -700)])
+        self.assertEquals(get_balance_at(loan, datetime.date(2022, 1, 8)), loan.balance)
+
+    def test_get_balance_at(self):
+        self.create(10, 5)
+        self.create(30, 9)
+        with self.assertNumQueries(1):
+            self.assertEquals(get_balance_at(self.account, datetime.date(2022, 1, 7)), 90)
+        self.assertEquals(get_balance_at(self.account, datetime.date(2022, 1, 1)), 100)
+        self.assertEquals(get_balance_at(self.account, datetime.date(2022, 2, 1)), 60)
+
+    def test_rebuild_matches_incremental_snapshots(self):
+        other_account = AccountFactory(user=self.user, initial=0, balance=0)
+        self.create(10, 5)
+        self.create(30, 9)
+        transaction_obj = self.create(5, 1, 'I')
+        edit_transaction(transaction_obj, {'date': datetime.date(2022, 1, 7)})
+        self.create(Decimal('2.50'), 3, 'I', other_account)
+        days = [datetime.date(2022, 1, day) for day in range(1, 12)]
+        incremental = [get_balance_at(asset, day) for asset in [self.account, other_account] for day in days]
+        self.assertEquals(rebuild_balance_snapshots(self.user), 4)
+        rebuilt = [get_balance_at(asset, day) for asset in [self.account, other_account] for day in days]
+        self.assertEquals(rebuilt, incremental)
+
+    def test_rebuild_given_assets(self):
+        other_account = AccountFactory(user=self.user, initial=0, balance=0)
+        self.create(10, 5)
+        self.create(10, 5, 'I', other_account)
+        BalanceSnapshot.objects.all().delete()
+        self.assertEquals(rebuild_balance_snapshots(assets=[other_account]), 1)
+        self.assertEquals(self.get_series(), [])
+        self.assertEquals(self.get_series(other_account), [(5, 10)])
+
+
+class TestAccountDetailStats(TestCase):
+    def test_month_stats_use_balance_at_month_end(self):
+        user = UserFactoryNoSignal()
+        account = AccountFactory(user=user, initial=100, balance=100)
+        category = CategoryFactory(user=user, parent=None)
+        for amount, day in [(50, datetime.date(2022, 1, 10)), (100, datetime.date(2022, 2, 10))]:
+            create_transaction({
+                'content_object': account,
+                'name': 'test',
+                'amount': amount,
+                'date': day,
+                'category': category,
+                'type': 'I',
+            })
+        self.client.force_login(user)
+        response = self.client.get(
+            reverse('main:account_month_archive', kwargs={'pk': account.id, 'year': 2022, 'month': 1})
+        )
+        self.assertEquals(response.context['stats']['rate'], '50.00%')
+
+    def test_balance_edit_updates_snapshots(self):
+        user = UserFactoryNoSignal()
+        account = AccountFactory(user=user, initial=100, balance=100)
+        for category_type in ['E', 'I']:
+            CategoryFactory(name='Balance Adjustment', is_protected=True, type=category_type, parent=None, user=user)
+        self.client.force_login(user)
+        self.client.post(
+            reverse('main:edit_account', kwargs={'pk': account.id}),
+            {'name': account.name, 'balance': 500, 'currency': account.currency.id},
+        )
+        account.refresh_from_db()
+        self.assertEquals(account.balance, 500)
+        self.assertEquals(get_balance_at(account, datetime.date.today()), 500)
@@ -0,0 +1,130 @@
+import datetime
+from decimal import Decimal
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from main.models import Account, CategoryMonthlyTotal, CreditCard, Transaction, TransactionName
+from main.tests.factories import AccountFactory, CategoryFactory, CreditCardFactory, UserFactoryNoSignal
+from main.transaction_import import (
+    TransactionImportError,
+    import_transactions,
+    parse_csv_rows,
+    parse_ofx_rows,
+)
+
+CSV = """date,name,amount,type,category,asset,asset_type,installments
+2022-01-05,Coffee,-3.50,,Food,Bank,,
+2022-01-06,Salary,1000,,Salary,Bank,,
+2022-01-20,Phone,300,E,Food,Visa,creditcard,3
+2022-01-21,Tea,2,E,Food,,,
+"""
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20220105120000
+<TRNAMT>-12.30
+<NAME>Groceries
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20220106</DTPOSTED><TRNAMT>50.00</TRNAMT><MEMO>Refund</MEMO></STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class TestTransactionImport(TestCase):
+    def setUp(self):
+        self.user = UserFactoryNoSignal()
+        self.account = AccountFactory(user=self.user, name='Bank', balance=100)
+        self.wallet = AccountFactory(user=self.user, name='Wallet', balance=10)
+        self.card = CreditCardFactory(user=self.user, name='Visa', balance=0, payment_day=10)
+        self.food = CategoryFactory(user=self.user, name='Food', type='E', parent=None)
+        self.salary = CategoryFactory(user=self.user, name='Salary', type='I', parent=None)
+
+    def test_parse_ofx_rows(self):
+        self.assertEquals(list(parse_ofx_rows(OFX.splitlines())), [
+            {'date': '20220105', 'name': 'Groceries', 'amount': '-12.30'},
+            {'date': '20220106', 'name': 'Refund', 'amount': '50.00'},
+        ])
+
+    def test_parse_csv_rows_requires_columns(self):
+        with self.assertRaises(TransactionImportError):
+            list(parse_csv_rows(["date,amount", "2022-01-01,1"]))
+
+    def test_parse_malformed_csv(self):
+        with self.assertRaisesMessage(TransactionImportError, "Invalid CSV file: new-line character seen"):
+            list(parse_csv_rows(["date,name,amount", "2022-01-01,Tea,1", "2022-01-02,Co\rffee,-1"]))
+
+    def test_import_csv(self):
+        count = import_transactions(self.user, CSV.splitlines(), asset=self.wallet, chunk_size=3)
+        self.assertEquals(count, 4)
+        coffee, salary, phone, tea = Transaction.objects.filter(user=self.user).order_by('date')
+        self.assertEquals((coffee.type, coffee.amount, coffee.category, coffee.content_object), ('E', Decimal('3.50'), self.food, self.account))
+        self.assertEquals((salary.type, salary.category), ('I', self.salary))
+        self.assertEquals((tea.content_object, tea.asset_kind, tea.user), (self.wallet, 'account', self.user))
+        self.assertEquals(Account.objects.get(pk=self.account.pk).balance, Decimal('1096.50'))
+        self.assertEquals(Account.objects.get(pk=self.wallet.pk).balance, 8)
+        self.assertEquals(CreditCard.objects.get(pk=self.card.pk).balance, -300)
+        self.assertTrue(CategoryMonthlyTotal.objects.filter(user=self.user).exists())
+        self.assertTrue(TransactionName.objects.filter(user=self.user, name='Coffee').exists())
+
+    def test_due_dates_match_transaction_save(self):
+        import_transactions(self.user, CSV.splitlines(), asset=self.wallet)
+        phone = Transaction.objects.get(name='Phone')
+        saved = Transaction.objects.create(
+            content_object=self.card, name='Phone', amount=300, date=datetime.date(2022, 1, 20), type='E', installments=3
+        )
+        self.assertEquals(phone.due_date, saved.due_date)
+
+    def test_import_ofx(self):
+        count = import_transactions(self.user, OFX.splitlines(), 'ofx', asset=self.account)
+        self.assertEquals(count, 2)
+        self.assertEquals(Account.objects.get(pk=self.account.pk).balance, Decimal('137.70'))
+        self.assertEquals(Transaction.objects.get(name='Refund').date, datetime.date(2022, 1, 6))
+
+    def test_invalid_row_imports_nothing(self):
+        lines = CSV.splitlines() + ["2022-01-22,Bus,-2,,Travel,Bank,,"]
+        with self.assertRaisesMessage(TransactionImportError, "Row 5: unknown category Travel."):
+            import_transactions(self.user, lines, asset=self.wallet, chunk_size=2)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEquals(Account.objects.get(pk=self.account.pk).balance, 100)
+
+    def test_ambiguous_category(self):
+        for parent_name in ['Home', 'Work']:
+            parent = CategoryFactory(user=self.user, name=parent_name, type='E', parent=None)
+            CategoryFactory(user=self.user, name='Lunch', type='E', parent=parent)
+        lines = ["date,name,amount,category", "2022-01-22,Soup,-2,Lunch"]
+        with self.assertRaisesMessage(TransactionImportError, "Row 1: ambiguous category Lunch, give it as parent/child."):
+            import_transactions(self.user, lines, asset=self.wallet)
+        import_transactions(self.user, lines[:1] + ["2022-01-22,Soup,-2,Work / Lunch", "2022-01-23,Salad,-3,food"], asset=self.wallet)
+        soup, salad = Transaction.objects.filter(user=self.user).order_by('date')
+        self.assertEquals((soup.category.name, soup.category.parent.name), ('Lunch', 'Work'))
+        self.assertEquals(salad.category, self.food)
+
+    def test_query_count_does_not_depend_on_row_count(self):
+        import_transactions(self.user, CSV.splitlines(), asset=self.wallet)
+        rows = ["date,name,amount,asset"] + [f"2022-02-{day:02},Row {day},-1,Bank" for day in range(1, 25)]
+        with self.assertNumQueries(23):
+            import_transactions(self.user, rows, chunk_size=1000)
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('statement.ofx', OFX.encode())
+        response = self.client.post(reverse('main:import_transactions'), {'file': upload, 'account': self.account.id})
+        self.assertRedirects(response, reverse('main:transactions'))
+        self.assertEquals(Transaction.objects.filter(user=self.user).count(), 2)
+
+    def test_view_error(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('statement.csv', b"date,name,amount\n2022-01-01,Coffee,-1\n")
+        response = self.client.post(reverse('main:import_transactions'), {'file': upload})
+        self.assertEquals(response.status_code, 200)
+        self.assertFormError(response, 'form', 'file', 'Row 1: no asset given.')
+
+    def test_view_malformed_csv(self):
+        self.client.force_login(self.user)
+        content = f'date,name,amount\n2022-01-01,"{"x" * 200000}",-1\n'
+        upload = SimpleUploadedFile('statement.csv', content.encode())
+        response = self.client.post(reverse('main:import_transactions'), {'file': upload, 'account': self.account.id})
+        self.assertEquals(response.status_code, 200)
+        self.assertFormError(response, 'form', 'file', 'Invalid CSV file: field larger than field limit (131072)')
@@ -1,10 +1,16 @@
 import decimal
 import datetime
 import factory
-from django.db.models import signals
+from django.db.models import QuerySet, signals
 from unittest.mock import Mock, MagicMock, patch
 from django.test.testcases import TestCase
+from main.forms import TransferForm
 from main.utils import (
+    get_transaction_name_suggestions,
+    rebuild_transaction_names,
+    update_transaction_name_usage,
+    get_ledger_version,
+    get_form_choices,
     create_categories,
     create_transaction,
     create_transfer,
@@ -18,7 +24,6 @@ from main.utils import (
     get_sorted_payment_plan,
     convert_payment_plan_dates,
     get_credit_card_payment_plan,
-    add_installments_to_payment_plan,
     get_transaction_installment_due_date,
     get_loan_data,
     get_loan_balance_data,
@@ -26,27 +31,21 @@ from main.utils import (
     get_latest_transfers,
     get_payment_transaction_data,
     get_loan_progress,
-    get_multi_currency_category_detail_stats,
     get_stats,
-    get_payment_stats,
     get_worth_stats,
     get_monthly_asset_balance_change,
-    get_monthly_asset_balance,
-    get_monthly_currency_balance,
     get_user_currencies,
     get_worth_stats,
     handle_asset_delete,
     handle_debt_payment,
     handle_transfer_delete,
     handle_transfer_edit,
-    sort_balance_data,
     is_owner,
     validate_main_category_uniqueness,
     convert_str_to_date,
     convert_date_to_str,
     get_next_month,
     get_valid_date,
-    fill_missing_monthly_data,
     convert_money,
     get_net_worth_by_currency,
     get_user_net_worths,
@@ -62,22 +61,27 @@ from main.utils import (
     get_from_transaction,
     get_to_transaction,
     edit_transaction,
-    get_currency_ins_outs,
-    get_ins_outs_report,
-    get_report_total,
-    get_transactions_currencies,
     get_multi_currency_category_stats,
     get_multi_currency_category_json_stats,
     get_multi_currency_main_category_stats,
-    get_category_detail_stats,
-    convert_category_stats,
-    add_category_stats,
     create_guest_user,
     get_session_from_db,
     setup_guest_user,
     create_guest_user_data,
     create_guest_user_accounts,
-    get_total_worth_stats,
+    build_guest_user_snapshot,
+    clone_guest_user_data,
+    get_guest_user_snapshot,
+    GUEST_USER_SNAPSHOT_KEY,
+    fill_guest_user_pool,
+    claim_pooled_guest_user,
+    get_guest_user_pool_metrics,
+    update_category_monthly_total,
+    edit_category_monthly_total,
+    withdraw_category_monthly_total,
+    rebuild_category_monthly_totals,
+    get_monthly_total_main_category_stats,
+    get_monthly_total_category_stats,
 )
 from main.tests.factories import (
     CategoryFactory,
@@ -99,7 +103,10 @@ from main.tests.factories import (
 import datetime
 from pytz import UTC
 from main.categories import income_categories, expense_categories
-from main.models import Category, Transaction, Account, User, UserPreferences, Transfer, Currency, GuestUserSession
+from main.models import Category, Transaction, Account, User, UserPreferences, Transfer, Currency, GuestUserSession, CategoryMonthlyTotal, Loan, CreditCard, PooledGuestUser, TransactionName, BalanceSnapshot
+from main import guest_user_data
+from main.snapshots import get_balance_at, rebuild_balance_snapshots
+from django.core.cache import cache
 from freezegun import freeze_time
 from django.contrib.sessions.backends.db import SessionStore
 from django.contrib.sessions.models import Session
@@ -159,6 +166,28 @@ class TestUtilityFunctions(TestCase):
                     Category.objects.filter(user=self.user, parent__name=key).exists()
                 )
 
+    def test_create_categories_builds_valid_trees(self):
+        CategoryFactory(user=self.user, parent=None)
+        create_categories(expense_categories, self.user)
+        fields = ('id', 'parent_id', 'tree_id', 'lft', 'rght', 'level')
+        created = list(Category.objects.filter(user=self.user).order_by('id').values_list(*fields))
+        tree_ids = {row[2] for row in created}
+        for tree_id in tree_ids:
+            Category._tree_manager.partial_rebuild(tree_id)
+        rebuilt = list(Category.objects.filter(user=self.user).order_by('id').values_list(*fields))
+        self.assertEquals(created, rebuilt)
+        self.assertEquals(len(tree_ids), len(expense_categories) + 1)
+        housing = Category.objects.get(user=self.user, name='Housing')
+        self.assertEquals(
+            [category.name for category in housing.get_children()],
+            sorted(expense_categories['Housing']['children'])
+        )
+
+    def test_create_categories_number_of_queries(self):
+        # next tree id and one insert for each tree level
+        with self.assertNumQueries(3):
+            create_categories(expense_categories, self.user)
+
     def test_validate_main_category_uniqueness(self):
         CategoryFactory(name="duplicate_name", user=self.user, type="E", parent=None)
         self.assertTrue(
@@ -244,7 +273,7 @@ class TestUtilityFunctions(TestCase):
         UserFactory()
         self.assertTrue(UserPreferences.objects.exists())
 
-    @patch('main.utils.Account')
+    @patch('main.assets.Account')
     def test_get_account_data(self, mock):
         qs = AccountFactory.build_batch(5)
         mock.objects.filter.return_value.select_related.return_value = qs
@@ -254,17 +283,17 @@ class TestUtilityFunctions(TestCase):
         for obj in qs:
             self.assertEquals(data[obj.id], obj.currency.code)
 
-    @patch('main.utils.Account')
+    @patch('main.assets.Account')
     def test_get_account_balance_data(self, mock):
         qs = AccountFactory.build_batch(5)
-        mock.objects.filter.return_value = qs
+        mock.objects.filter.return_value.select_related.return_value = qs
         user = UserFactory.build()
         data = get_account_balance_data(user)
         self.assertTrue(mock.objects.filter.called)
         for obj in qs:
             self.assertEquals(data[obj.id], obj.balance)
 
-    @patch('main.utils.Loan')
+    @patch('main.assets.Loan')
     def test_get_loan_data(self, mock):
         qs = LoanFactory.build_batch(5)
         mock.objects.filter.return_value.select_related.return_value = qs
@@ -274,7 +303,7 @@ class TestUtilityFunctions(TestCase):
         for obj in qs:
             self.assertEquals(data[obj.id], obj.currency.code)
     
-    @patch('main.utils.CreditCard')
+    @patch('main.assets.CreditCard')
     def test_get_credit_card_data(self, mock):
         qs = CreditCardFactory.build_batch(5)
         mock.objects.filter.return_value.select_related.return_value = qs
@@ -284,20 +313,20 @@ class TestUtilityFunctions(TestCase):
         for obj in qs:
             self.assertEquals(data[obj.id], obj.currency.code)
 
-    @patch('main.utils.Loan')
+    @patch('main.assets.Loan')
     def test_get_loan_balance_data(self, mock):
         qs = LoanFactory.build_batch(5)
-        mock.objects.filter.return_value = qs
+        mock.objects.filter.return_value.select_related.return_value = qs
         user = UserFactory.build()
         data = get_loan_balance_data(user)
         self.assertTrue(mock.called_once)
         for obj in qs:
             self.assertEquals(data[obj.id], obj.balance)
 
-    @patch('main.utils.CreditCard')
+    @patch('main.assets.CreditCard')
     def test_get_credit_card_balance_data(self, mock):
         qs = CreditCardFactory.build_batch(5)
-        mock.objects.filter.return_value = qs
+        mock.objects.filter.return_value.select_related.return_value = qs
         user = UserFactory.build()
         data = get_credit_card_balance_data(user)
         self.assertTrue(mock.called_once)
@@ -311,43 +340,10 @@ class TestUtilityFunctions(TestCase):
         progress = get_loan_progress(mock)
         self.assertEquals(progress, 40)
 
-    @freeze_time('2022-05-25')
-    def test_get_payment_stats(self):
-        loan = LoanFactory(initial=-50000)
-        for i in range(1,6):
-            LoanTransactionFactory(
-                content_object=loan,
-                date=datetime.datetime.now()+datetime.timedelta(days=30*i),
-                amount=100*i
-            )
-        data = get_payment_stats(loan)
-        self.assertIn('2022-05-25', data)
-
     def test_get_worth_stats(self):
         response = get_worth_stats(self.user)
         self.assertIsInstance(response, dict)
     
-    def test_get_total_worth_stats(self):
-        currency1 = CurrencyFactory(code='USD', rate__rate=1)
-        currency2 = CurrencyFactory(code='TRY', rate__rate=2)
-        user = UserFactoryNoSignal()
-        profile = UserPreferencesFactory(user=user, primary_currency=currency1)
-        stats = {
-            currency1: [
-                ('2000-01', 10), ('2000-02', 20)
-            ],
-            currency2: [
-                ('2000-01', 10), ('2000-02', 20)
-            ]
-        }
-        expected_total_stats = {
-            currency1: [
-                ('2000-01', 15), ('2000-02', 30)
-            ],
-        }
-        result = get_total_worth_stats(user, stats)
-        self.assertEquals(result, expected_total_stats)
-
     def test_get_mothly_asset_balance_change(self):
         account = AccountFactory()
         dates = [
@@ -361,48 +357,6 @@ class TestUtilityFunctions(TestCase):
         monthly_totals = get_monthly_asset_balance_change(account)
         self.assertEquals(len(monthly_totals), 3)
 
-    @freeze_time('2022-05-25')
-    def test_get_monthly_asset_balance(self):
-        account = AccountFactory(balance=decimal.Decimal(10000))
-        dates = [
-            datetime.date(2022, 6, 10),
-            datetime.date(2022, 7, 10),
-        ]
-        for date in dates:
-            AccountTransactionFactory.create(content_object=account, date=date, amount=2000, type='I')
-            AccountTransactionFactory.create(content_object=account, date=date, amount=1000, type='E')
-        monthly_balances = get_monthly_asset_balance(account)
-        expected = {
-            '2022-05': 10000,
-            '2022-06': 11000,
-            '2022-07': 12000,
-        }
-        self.assertEquals(monthly_balances, expected)
-
-    @freeze_time('2022-05-25')
-    def test_get_monthly_currency_balance(self):
-        currency = CurrencyFactory()
-        currency_account_1 = AccountFactory(user=self.user, balance=decimal.Decimal(10000), currency=currency)
-        currency_account_2 = AccountFactory(user=self.user, balance=decimal.Decimal(5000), currency=currency)
-        non_currency_account = AccountFactory(user=self.user, balance=decimal.Decimal(20000))
-        non_user_account = AccountFactory(currency=currency, balance=decimal.Decimal(20000))
-        dates = [
-            datetime.date(2022, 6, 10),
-            datetime.date(2022, 7, 10),
-        ]
-        accounts = [currency_account_1, currency_account_2, non_currency_account, non_user_account]
-        for date in dates:
-            for account in accounts:
-                AccountTransactionFactory.create(content_object=account, date=date, amount=2000, type='I')
-                AccountTransactionFactory.create(content_object=account, date=date, amount=1000, type='E')
-        monthly_balances = get_monthly_currency_balance(user=self.user, currency=currency)
-        expected = [
-            ('2022-05', 15000),
-            ('2022-06', 17000),
-            ('2022-07', 19000),
-        ]
-        self.assertEquals(monthly_balances, expected)
-                
     def test_get_user_currencies(self):
         for _ in range(3):
             currency = CurrencyFactory()
@@ -420,12 +374,6 @@ class TestUtilityFunctions(TestCase):
         for currency in currencies:
             self.assertIn(currency, stats)
 
-    def test_sort_balance_data(self):
-        data = {'2022-06':5, '2022-01':2, '2022-02':1}
-        sorted_data = sort_balance_data(data)
-        expected = [('2022-01', 2), ('2022-02', 1), ('2022-06', 5)]
-        self.assertEquals(sorted_data, expected)
-
     def test_convert_srt_to_date(self):
         date = convert_str_to_date('2022-02')
         expected = datetime.datetime(2022,2,1)
@@ -450,14 +398,6 @@ class TestUtilityFunctions(TestCase):
         self.assertEquals(date2, datetime.datetime(2002, 2, 28, tzinfo=UTC))
         self.assertEquals(date3, datetime.datetime(2004, 2, 29, tzinfo=UTC))
 
-    @patch("main.utils.date")
-    def test_fill_missing_monthly_data(self, mock):
-        mock.today.return_value = datetime.date(2022, 6, 1)
-        data = {'2022-02':1, '2022-01':5, '2022-04':9}
-        result = fill_missing_monthly_data(data)
-        expected = {'2022-02':1, '2022-01':5, '2022-03':1, '2022-04':9, '2022-05':9, '2022-06':9,}
-        self.assertEquals(result, expected)
-
     def test_get_conversion_rate(self):
         from_currency = CurrencyFactory(code='USD', rate__rate=1)
         to_currency = CurrencyFactory(code='TRY', rate__rate=18)
@@ -844,58 +784,6 @@ class TestUtilityFunctions(TestCase):
         self.assertEquals(mock.call_count, 2)
         self.assertEquals(object.date, datetime.date(2001,1,1))
 
-    def test_get_currency_ins_outs(self):
-        currency = CurrencyFactory()
-        account = AccountFactory(currency=currency, user=self.user)
-        AccountTransactionFactory(content_object=account, type='E', amount=10)
-        AccountTransactionFactory(content_object=account, type='I', amount=20)
-        qs = Transaction.objects.all()
-        data = get_currency_ins_outs(currency, qs, self.user)
-        expected = {
-            'currency': currency,
-            'expense': 10,
-            'income': 20,
-            'balance': 10
-        }
-        self.assertEquals(data, expected)
-
-    @patch('main.utils.Currency.objects.filter')
-    @patch('main.utils.get_report_total')
-    def test_get_ins_outs_report(self, mock_total, mock_Currency):
-        currency1 = Mock()
-        currency2 = Mock()
-        mock_Currency.return_value.prefetch_related.return_value.annotate.return_value.annotate.return_value = [currency1, currency2]
-        mock_total.return_value = 'total'
-        get_ins_outs_report('user', 'qs', 'target_currency')
-        self.assertTrue(mock_Currency.called)
-        self.assertTrue(mock_total.called)
-
-    def test_get_report_total(self):
-        currency1 = Mock()
-        currency1.rate.rate = 1
-        currency1.expense = 10
-        currency1.income = 20
-        currency1.balance = 10
-        currency2 = Mock()
-        currency2.rate.rate = 2
-        currency2.expense = 10
-        currency2.income = 20
-        currency2.balance = 10
-        target_currency = Mock()
-        target_currency.rate.rate = 4
-        target_currency.name = 'target_currency'
-        qs = (currency1, currency2)
-        result = get_report_total(qs, target_currency)
-        expected = {'currency': 'target_currency', 'expense': 60.0, 'income': 120.0, 'balance': 60.0}
-        self.assertEquals(result, expected)
-
-
-    def test_get_transactions_currencies(self):
-        AccountTransactionFactory.create_batch(2)
-        qs = Transaction.objects.all()
-        currencies = get_transactions_currencies(qs)
-        self.assertEquals(len(currencies), 2)
-
     def test_get_multi_currency_category_stats(self):
         currency = CurrencyFactory(rate__rate=1)
         target_currency = CurrencyFactory(rate__rate=2)
@@ -942,87 +830,221 @@ class TestUtilityFunctions(TestCase):
         self.assertEqual(stats['data'], [20,40])
         self.assertEqual(stats['labels'], [parent_category.name, child_category.name])
 
-    def test_get_category_detail_stats(self):
-        parent_category = CategoryFactory(parent=None, name='parent')
-        category1 = CategoryFactory(parent=parent_category, name='cat1')
-        category2 = CategoryFactory(parent=parent_category, name='cat2')
-        category3 = CategoryFactory(parent=parent_category, name='cat3') #category with no transactions
-        AccountTransactionFactory(name='qs', category=parent_category, amount=1)
-        AccountTransactionFactory(name='qs', category=parent_category, amount=1)
-        AccountTransactionFactory(category=parent_category, amount=1) #transaction not in the qs
-        AccountTransactionFactory(name='qs', category=category1, amount=2)
-        AccountTransactionFactory(name='qs', category=category1, amount=2)
-        AccountTransactionFactory(category=category1, amount=2) #transaction not in the qs
-        AccountTransactionFactory(name='qs', category=category2, amount=4)
-        AccountTransactionFactory(name='qs', category=category2, amount=4)
-        AccountTransactionFactory(category=category2, amount=4) #transaction not in the qs
-        qs = Transaction.objects.filter(name='qs')
-        result = get_category_detail_stats(qs, parent_category)
-        expected = {
-            'parent': {'sum': 2, 'id':parent_category.id},
-            'cat1': {'sum': 4, 'id':category1.id},
-            'cat2': {'sum': 8, 'id':category2.id},
+    def test_edit_category_monthly_total(self):
+        account = AccountFactory(user=self.user)
+        category = CategoryFactory(user=self.user, parent=None)
+        transaction1 = AccountTransactionFactory(content_object=account, category=category, amount=10, date=datetime.date(2001, 1, 1))
+        transaction2 = AccountTransactionFactory(content_object=account, category=category, amount=5, date=datetime.date(2001, 1, 20))
+        edit_category_monthly_total(transaction1)
+        edit_category_monthly_total(transaction2)
+        total = CategoryMonthlyTotal.objects.get()
+        self.assertEquals(total.total, 15)
+        self.assertEquals(total.count, 2)
+        self.assertEquals((total.year, total.month), (2001, 1))
+        self.assertEquals(total.currency, account.currency)
+        withdraw_category_monthly_total(transaction1)
+        total.refresh_from_db()
+        self.assertEquals(total.total, 5)
+        self.assertEquals(total.count, 1)
+
+    def test_edit_category_monthly_total_ignores_other_assets(self):
+        edit_category_monthly_total(LoanTransactionFactory())
+        self.assertFalse(CategoryMonthlyTotal.objects.exists())
+
+    def test_category_monthly_total_follows_transaction_changes(self):
+        account = AccountFactory(user=self.user)
+        category = CategoryFactory(user=self.user, parent=None)
+        data = {
+            'content_object': account,
+            'name': 'test',
+            'amount': 10,
+            'date': datetime.date(2001, 1, 1),
+            'category': category,
+            'type': 'E',
         }
-        self.assertEquals(result, expected)
+        transaction_obj = create_transaction(data)
+        self.assertEquals(CategoryMonthlyTotal.objects.get(year=2001, month=1).total, 10)
+        edit_transaction(transaction_obj, {'amount': 20, 'date': datetime.date(2001, 2, 1)})
+        self.assertFalse(CategoryMonthlyTotal.objects.filter(year=2001, month=1).exists())
+        self.assertEquals(CategoryMonthlyTotal.objects.get(year=2001, month=2).total, 20)
+        handle_transaction_delete(transaction_obj)
+        self.assertFalse(CategoryMonthlyTotal.objects.exists())
+
+    def test_category_monthly_total_created_concurrently(self):
+        account = AccountFactory(user=self.user)
+        category = CategoryFactory(user=self.user, parent=None)
+        transaction_obj = create_transaction({
+            'content_object': account,
+            'name': 'test',
+            'amount': 10,
+            'date': datetime.date(2001, 1, 1),
+            'category': category,
+            'type': 'E',
+        })
+        update = QuerySet.update
+        calls = []
 
-    @patch('main.utils.convert_money')
-    def test_convert_category_stats(self, mock):
-        mock.return_value = 20
-        stats = {'category': {'sum':10, 'id':1}}
-        convert_category_stats(stats, 'from_currency', 'to_currency')
-        self.assertEquals(stats['category']['sum'], 20)
-
-    def test_add_category_stats(self):
-        main_stats = {
-            'category1': {'sum':10, id:1},
-            'category3': {'sum':20, id:3},
-        }
-        added_stats = {
-            'category1': {'sum':10, id:1},
-            'category2': {'sum':30, id:2}
-        }
-        add_category_stats(main_stats, added_stats)
-        expected_stats = {
-            'category1': {'sum':20, id:1},
-            'category2': {'sum':30, id:2},
-            'category3': {'sum':20, id:3}
+        def update_after_concurrent_create(queryset, **kwargs):
+            # the first update runs before the other request's total is committed
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with patch.object(QuerySet, 'update', update_after_concurrent_create):
+            update_category_monthly_total(transaction_obj, 1)
+        total = CategoryMonthlyTotal.objects.get()
+        self.assertEquals((total.total, total.count), (20, 2))
+
+    def test_rebuild_category_monthly_totals(self):
+        account = AccountFactory(user=self.user)
+        category = CategoryFactory(user=self.user, parent=None)
+        AccountTransactionFactory(content_object=account, category=category, amount=10, date=datetime.date(2001, 1, 1))
+        AccountTransactionFactory(content_object=account, category=category, amount=5, date=datetime.date(2001, 1, 2))
+        AccountTransactionFactory(content_object=account, category=category, amount=7, date=datetime.date(2001, 2, 1))
+        AccountTransactionFactory(content_object=account, category=category, amount=3, type='I', date=datetime.date(2001, 2, 1))
+        AccountTransactionFactory(date=datetime.date(2001, 1, 1))  # transaction of another user
+        count = rebuild_category_monthly_totals(self.user)
+        self.assertEquals(count, 3)
+        january = CategoryMonthlyTotal.objects.get(user=self.user, year=2001, month=1)
+        self.assertEquals((january.total, january.count), (15, 2))
+        self.assertEquals(CategoryMonthlyTotal.objects.get(user=self.user, month=2, type='I').total, 3)
+        self.assertEquals(rebuild_category_monthly_totals(self.user), 3)
+        self.assertEquals(CategoryMonthlyTotal.objects.filter(user=self.user).count(), 3)
+
+    def test_transaction_name_usage_follows_transaction_changes(self):
+        account = AccountFactory(user=self.user)
+        data = {
+            'content_object': account,
+            'name': 'Coffee',
+            'amount': 10,
+            'date': datetime.date(2001, 1, 1),
+            'category': CategoryFactory(user=self.user, parent=None),
+            'type': 'E',
         }
-        self.assertEquals(main_stats, expected_stats)
+        transaction1 = create_transaction(data)
+        create_transaction({**data, 'date': datetime.date(2001, 3, 1)})
+        name = TransactionName.objects.get(user=self.user)
+        self.assertEquals((name.name, name.search_name, name.count), ('Coffee', 'coffee', 2))
+        self.assertEquals(name.last_used, datetime.date(2001, 3, 1))
+        edit_transaction(transaction1, {'name': 'Tea'})
+        self.assertEquals(TransactionName.objects.get(user=self.user, name='Coffee').count, 1)
+        self.assertEquals(TransactionName.objects.get(user=self.user, name='Tea').count, 1)
+        handle_transaction_delete(transaction1)
+        self.assertFalse(TransactionName.objects.filter(name='Tea').exists())
+
+    def test_transaction_name_created_concurrently(self):
+        transaction_obj = create_transaction({
+            'content_object': AccountFactory(user=self.user),
+            'name': 'Coffee',
+            'amount': 10,
+            'date': datetime.date(2001, 1, 1),
+            'category': CategoryFactory(user=self.user, parent=None),
+            'type': 'E',
+        })
+        update = QuerySet.update
+        calls = []
 
-    def test_get_multi_currency_category_detail_stats(self):
-        parent_category = CategoryFactory(parent=None, name='parent')
-        category1 = CategoryFactory(parent=parent_category, name='cat1')
-        category2 = CategoryFactory(parent=parent_category, name='cat2')
-        currency1 = CurrencyFactory(rate__rate=1)
-        currency2 = CurrencyFactory(rate__rate=2)
-        account1 = AccountFactory(currency=currency1)
-        account2 = AccountFactory(currency=currency2)
-        AccountTransactionFactory(content_object=account1, category=parent_category, amount=1)
-        AccountTransactionFactory(content_object=account2, category=parent_category, amount=5)
-        AccountTransactionFactory(content_object=account1, category=category1, amount=2)
-        AccountTransactionFactory(content_object=account2, category=category1, amount=5)
-        AccountTransactionFactory(content_object=account1, category=category2, amount=3)
-        AccountTransactionFactory(content_object=account2, category=category2, amount=5)
-        qs = Transaction.objects.all()
-        result = get_multi_currency_category_detail_stats(qs, parent_category, currency2)
+        def update_after_concurrent_create(queryset, **kwargs):
+            # the first update runs before the other request's name is committed
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with patch.object(QuerySet, 'update', update_after_concurrent_create):
+            update_transaction_name_usage(transaction_obj, 1)
+        self.assertEquals(TransactionName.objects.get(user=self.user).count, 2)
+
+    def test_rebuild_transaction_names(self):
+        account = AccountFactory(user=self.user)
+        card = CreditCardFactory(user=self.user)
+        AccountTransactionFactory(content_object=account, name='Coffee', type='E', date=datetime.date(2001, 1, 1))
+        AccountTransactionFactory(content_object=account, name='Coffee', type='E', date=datetime.date(2001, 2, 1))
+        CreditCardTransactionFactory(content_object=card, name='Coffee', type='E', date=datetime.date(2001, 3, 1))
+        LoanTransactionFactory(content_object=LoanFactory(user=self.user), name='Loan', type='E')
+        AccountTransactionFactory(name='Coffee', type='E')  # transaction of another user
+        self.assertEquals(rebuild_transaction_names(self.user), 1)
+        name = TransactionName.objects.get(user=self.user)
+        self.assertEquals((name.count, name.last_used), (3, datetime.date(2001, 3, 1)))
+
+    def test_get_transaction_name_suggestions(self):
+        for name, count in [('Market', 1), ('Supermarket', 5), ('Marketplace', 3), ('Rent', 9)]:
+            TransactionName.objects.create(user=self.user, name=name, type='E', count=count)
+        TransactionName.objects.create(user=self.user, name='Market income', type='I', count=9)
+        self.assertEquals(
+            get_transaction_name_suggestions(self.user, 'MARK', 'E'),
+            ['Marketplace', 'Market', 'Supermarket'],
+        )
+        self.assertEquals(get_transaction_name_suggestions(self.user, 'mark', 'E', limit=1), ['Marketplace'])
+        with self.assertNumQueries(1):
+            get_transaction_name_suggestions(self.user, 're', 'E', limit=1)
+
+    def test_get_monthly_total_main_category_stats(self):
+        currency = CurrencyFactory(rate__rate=1)
+        target_currency = CurrencyFactory(rate__rate=2)
+        account1 = AccountFactory(user=self.user, currency=currency)
+        account2 = AccountFactory(user=self.user, currency=target_currency)
+        category = CategoryFactory(user=self.user, type='E', parent=None)
+        child_category = CategoryFactory(user=self.user, type='E', parent=category)
+        transfer_category = CategoryFactory(user=self.user, type='E', parent=None, is_transfer=True)
+        AccountTransactionFactory(content_object=account1, amount=10, type='E', category=category, date=datetime.date(2001, 1, 1))
+        AccountTransactionFactory(content_object=account2, amount=15, type='E', category=child_category, date=datetime.date(2001, 1, 5))
+        AccountTransactionFactory(content_object=account2, amount=15, type='E', category=child_category, date=datetime.date(2002, 1, 5))
+        AccountTransactionFactory(content_object=account2, amount=15, type='E', category=transfer_category, date=datetime.date(2001, 1, 5))
+        rebuild_category_monthly_totals(self.user)
+        stats = get_monthly_total_main_category_stats(self.user, 'E', {'year': 2001}, target_currency=target_currency)
+        self.assertEquals(stats, {category.name: {'sum': 35, 'id': category.id}})
+        stats = get_monthly_total_main_category_stats(self.user, 'E', {}, target_currency=target_currency)
+        self.assertEquals(stats[category.name]['sum'], 50)
+
+    def test_get_monthly_total_category_stats(self):
+        currency = CurrencyFactory(rate__rate=1)
+        target_currency = CurrencyFactory(rate__rate=2)
+        account1 = AccountFactory(user=self.user, currency=currency)
+        account2 = AccountFactory(user=self.user, currency=target_currency)
+        parent_category = CategoryFactory(user=self.user, type='E', parent=None)
+        other_category = CategoryFactory(user=self.user, type='E', parent=None)
+        child_category = CategoryFactory(user=self.user, type='E', parent=parent_category)
+        AccountTransactionFactory(content_object=account1, amount=10, type='E', category=parent_category, date=datetime.date(2001, 3, 1))
+        AccountTransactionFactory(content_object=account2, amount=15, type='E', category=child_category, date=datetime.date(2001, 3, 1))
+        AccountTransactionFactory(content_object=account2, amount=25, type='E', category=child_category, date=datetime.date(2001, 3, 2))
+        AccountTransactionFactory(content_object=account2, amount=15, type='E', category=other_category, date=datetime.date(2001, 3, 1))
+        AccountTransactionFactory(content_object=account2, amount=15, type='E', category=child_category, date=datetime.date(2001, 4, 1))
+        rebuild_category_monthly_totals(self.user)
+        stats = get_monthly_total_category_stats(parent_category, self.user, {'year': 2001, 'month': 3}, target_currency=target_currency)
         expected = {
-            'parent': {'sum': 7, 'id':parent_category.id},
-            'cat1': {'sum': 9, 'id':category1.id},
-            'cat2': {'sum': 11, 'id':category2.id},
+            parent_category.name: {'sum': 20, 'id': parent_category.id},
+            child_category.name: {'sum': 40, 'id': child_category.id},
         }
-        self.assertEquals(result, expected)
-
-    @patch('main.utils.get_sorted_payment_plan')
-    @patch('main.utils.add_installments_to_payment_plan')
-    def test_get_credit_card_payment_plan(self, mock1, mock2):
-        mock1.return_value = None
-        mock2.return_value = {}
-        card = Mock()
-        card.transactions.filter.return_value = ["transaction1", "transaction2"]
-        payment_plan = get_credit_card_payment_plan(card)
-        self.assertIsInstance(payment_plan, dict)
-        self.assertTrue(mock1.called)
-        self.assertTrue(mock2.called)
+        self.assertEquals(stats, expected)
+
+    @freeze_time("2003-03-20")
+    def test_get_credit_card_payment_plan(self):
+        card = CreditCardFactory(payment_day=31)
+        for day, installments, amount in [
+            (1, None, 10), (25, None, 10), (25, None, 10), (5, 3, 100), (5, 3, 100),
+            (10, 12, 50), (28, 2, 7), (15, 36, 1000), (1, None, 3),
+        ]:
+            for months_ago in [0, 1, 4]:
+                CreditCardTransactionFactory(
+                    content_object=card, installments=installments, amount=amount,
+                    date=datetime.date(2003, 3, day) - datetime.timedelta(days=30 * months_ago),
+                )
+        CreditCardTransactionFactory(content_object=card, installments=6, amount=60, type='I')
+        expected = {}
+        for expense in card.transactions.filter(due_date__gt=datetime.date.today(), type='E'):
+            current_date = expense.due_date
+            if not expense.installments:
+                expected[current_date] = expected.get(current_date, 0) + expense.amount
+                continue
+            # installments are paid on every payment date from the last one back to the next one
+            while current_date >= card.next_payment_date:
+                expected[current_date] = expected.get(current_date, 0) + expense.installment_amount
+                current_date = card.get_previous_payment_date(current_date)
+        expected = get_sorted_payment_plan(expected)
+        convert_payment_plan_dates(expected)
+        with self.assertNumQueries(1):
+            payment_plan = get_credit_card_payment_plan(card)
+        self.assertEquals(payment_plan, expected)
+        self.assertEquals(payment_plan[0][0], '2003-03-31')
+        self.assertEquals(payment_plan[1][0], '2003-04-30')
 
     def test_get_transaction_installment_due_date(self):
         card = CreditCardFactory(payment_day=5)
@@ -1031,15 +1053,6 @@ class TestUtilityFunctions(TestCase):
         date = get_transaction_installment_due_date(transaction_date, installments, card)
         self.assertEquals(date, datetime.datetime(2000, 5, 5, tzinfo=UTC))
 
-    @freeze_time("2003-03-03")
-    def test_add_installments_to_payment_plan(self):
-        installments = 4
-        card = CreditCardFactory(payment_day = 5) 
-        expense = CreditCardTransactionFactory(installments=installments, date=datetime.datetime(2003, 3, 3), amount=12, content_object=card)
-        payment_plan = {}
-        result = add_installments_to_payment_plan(expense, payment_plan, card)
-        self.assertEquals(len(result), installments)
-
     def test_get_sorted_payment_plan(self):
         payment_plan = {datetime.date(2003, 3, 3): 5, datetime.date(2003, 3, 5): 15, datetime.date(2003, 2, 3): 25}
         sorted_paymet_plan = get_sorted_payment_plan(payment_plan)
@@ -1088,7 +1101,7 @@ class TestUtilityFunctions(TestCase):
     @patch('main.utils.create_guest_user')
     @patch('main.utils.get_session_from_db')
     @patch('main.utils.login')
-    @patch('main.utils.create_guest_user_data')
+    @patch('main.utils.clone_guest_user_data')
     def test_setup_guest_user(self, data_mock, login_mock, session_mock, user_mock):
         user = UserFactoryNoSignal()
         session = SessionFactory()
@@ -1132,3 +1145,149 @@ class TestUtilityFunctions(TestCase):
         for key, value in user_accounts.items():
             self.assertEquals(value.user, user)
             self.assertEquals(value.created.date().__str__(), "2000-01-22")
+
+    def get_guest_user_data_summary(self, user):
+        assets = [
+            (asset.name, asset.balance, asset.created.date())
+            for model in [Account, Loan, CreditCard]
+            for asset in model.objects.filter(user=user).order_by('name')
+        ]
+        transactions = sorted(
+            (tr.content_object.name, tr.category.name, tr.name, tr.amount, tr.date, tr.type, tr.due_date)
+            for tr in Transaction.objects.filter(user=user)
+        )
+        transfers = sorted(
+            (transfer.from_transaction.content_object.name, transfer.to_transaction.content_object.name, transfer.date)
+            for transfer in Transfer.objects.filter(user=user)
+        )
+        return assets, transactions, transfers
+
+    @freeze_time("2000-05-01")
+    def test_clone_guest_user_data(self):
+        CurrencyFactory(id=5, code='USD')
+        CurrencyFactory(code='JPY')
+        user = UserFactory()
+        create_guest_user_data(user)
+        guest_user = UserFactory()
+        snapshot = build_guest_user_snapshot()
+        self.assertEquals(Transaction.objects.exclude(user__in=[user, guest_user]).count(), 0)
+        clone_guest_user_data(guest_user, snapshot)
+        self.assertEquals(
+            self.get_guest_user_data_summary(user), self.get_guest_user_data_summary(guest_user)
+        )
+        self.assertEquals(
+            CategoryMonthlyTotal.objects.filter(user=user).count(),
+            CategoryMonthlyTotal.objects.filter(user=guest_user).count()
+        )
+        bank_account = Account.objects.get(user=guest_user, name=guest_user_data.bank_account['name'])
+        self.assertGreater(BalanceSnapshot.objects.filter(user=guest_user).count(), 0)
+        self.assertEquals(get_balance_at(bank_account, datetime.date.today()), bank_account.balance)
+
+    def test_cloned_summaries_match_rebuilt_ones(self):
+        CurrencyFactory(id=5, code='USD')
+        CurrencyFactory(code='JPY')
+        guest_user = UserFactory()
+        clone_guest_user_data(guest_user, build_guest_user_snapshot())
+        summaries = [
+            (CategoryMonthlyTotal, ['category', 'currency', 'year', 'month', 'type', 'total', 'count']),
+            (TransactionName, ['type', 'name', 'search_name', 'count', 'last_used']),
+            (BalanceSnapshot, ['content_type', 'object_id', 'date', 'balance']),
+        ]
+        cloned = [sorted(model.objects.filter(user=guest_user).values_list(*fields)) for model, fields in summaries]
+        rebuild_category_monthly_totals(guest_user)
+        rebuild_transaction_names(guest_user)
+        rebuild_balance_snapshots(guest_user)
+        rebuilt = [sorted(model.objects.filter(user=guest_user).values_list(*fields)) for model, fields in summaries]
+        self.assertTrue(all(cloned))
+        self.assertEquals(cloned, rebuilt)
+
+    def test_clone_guest_user_data_shifts_dates(self):
+        CurrencyFactory(id=5, code='USD')
+        CurrencyFactory(code='JPY')
+        with freeze_time("2000-05-01"):
+            snapshot = build_guest_user_snapshot()
+        with freeze_time("2000-06-11"):
+            user = UserFactory()
+            create_guest_user_data(user)
+            guest_user = UserFactory()
+            clone_guest_user_data(guest_user, snapshot)
+        self.assertEquals(
+            self.get_guest_user_data_summary(user), self.get_guest_user_data_summary(guest_user)
+        )
+
+    def test_fill_guest_user_pool(self):
+        CurrencyFactory(id=5, code='USD')
+        CurrencyFactory(code='JPY')
+        self.assertEquals(fill_guest_user_pool(2), 2)
+        self.assertEquals(fill_guest_user_pool(2), 0)
+        self.assertEquals(PooledGuestUser.objects.count(), 2)
+        for pooled_guest_user in PooledGuestUser.objects.all():
+            self.assertTrue(pooled_guest_user.user.is_guest)
+            self.assertTrue(Transaction.objects.filter(user=pooled_guest_user.user).exists())
+
+    @patch('main.utils.build_guest_user_snapshot')
+    def test_fill_guest_user_pool_refreshes_stale_snapshot(self, build_mock):
+        self.addCleanup(cache.delete, GUEST_USER_SNAPSHOT_KEY)
+        cache.set(GUEST_USER_SNAPSHOT_KEY, {'date': datetime.date(2000, 5, 1)}, None)
+        build_mock.return_value = {'date': datetime.date.today()}
+        fill_guest_user_pool(0)
+        fill_guest_user_pool(0)
+        self.assertEquals(build_mock.call_count, 1)
+        self.assertEquals(get_guest_user_snapshot(), build_mock.return_value)
+
+    @patch('main.utils.refresh_guest_user_snapshot')
+    def test_fill_guest_user_pool_replaces_stale_users(self, refresh_mock):
+        stale_user = UserFactoryNoSignal(is_guest=True)
+        PooledGuestUser.objects.create(user=stale_user, created=datetime.date(2000, 1, 1))
+        with patch('main.utils.create_pooled_guest_user') as create_mock:
+            self.assertEquals(fill_guest_user_pool(1), 1)
+            self.assertTrue(create_mock.called)
+        self.assertFalse(User.objects.filter(pk=stale_user.pk).exists())
+
+    def test_claim_pooled_guest_user(self):
+        user = UserFactoryNoSignal(is_guest=True)
+        PooledGuestUser.objects.create(user=user)
+        PooledGuestUser.objects.create(user=UserFactoryNoSignal(is_guest=True), created=datetime.date(2000, 1, 1))
+        self.assertEquals(claim_pooled_guest_user(), user)
+        self.assertIsNone(claim_pooled_guest_user())
+
+    @patch('main.utils.clone_guest_user_data')
+    @patch('main.utils.get_session_from_db')
+    @patch('main.utils.login')
+    def test_setup_guest_user_claims_pooled_user(self, login_mock, session_mock, clone_mock):
+        cache.clear()
+        session_mock.return_value = SessionFactory()
+        user = UserFactoryNoSignal(is_guest=True)
+        PooledGuestUser.objects.create(user=user)
+        self.assertEquals(setup_guest_user(Mock()), user)
+        self.assertFalse(clone_mock.called)
+        self.assertEquals(GuestUserSession.objects.get().user, user)
+        metrics = get_guest_user_pool_metrics()
+        self.assertEquals((metrics['depth'], metrics['claims'], metrics['misses']), (0, 1, 0))
+        self.assertIsNotNone(metrics['average_claim_ms'])
+        cache.clear()
+
+    @patch('main.utils.build_guest_user_snapshot')
+    def test_get_guest_user_snapshot_is_cached(self, build_mock):
+        cache.delete(GUEST_USER_SNAPSHOT_KEY)
+        build_mock.return_value = {'date': datetime.date(2000, 5, 1)}
+        get_guest_user_snapshot()
+        self.assertEquals(get_guest_user_snapshot(), build_mock.return_value)
+        self.assertEquals(build_mock.call_count, 1)
+        cache.delete(GUEST_USER_SNAPSHOT_KEY)
+
+    def test_ledger_version_changes_on_ledger_writes(self):
+        account = AccountFactory()
+        version = get_ledger_version(account.user)
+        self.assertEquals(get_ledger_version(account.user_id), version)
+        AccountTransactionFactory(content_object=account)
+        self.assertNotEqual(get_ledger_version(account.user), version)
+        version = get_ledger_version(account.user)
+        account.save()
+        self.assertNotEqual(get_ledger_version(account.user), version)
+
+    def test_get_form_choices(self):
+        account = AccountFactory()
+        choices = get_form_choices(TransferForm(user=account.user))
+        self.assertEquals(choices['from_account'], [('', '---------'), (str(account.id), account.name)])
+        self.assertEquals(set(choices), {'from_account', 'to_account'})
@@ -22,6 +22,7 @@ from django.db.models import signals
 from django.test import TestCase, TransactionTestCase
 from django.http import HttpRequest, JsonResponse
 from main import views
+from main.utils import rebuild_transaction_names
 from django.db import models
 from datetime import date
 
@@ -41,6 +42,22 @@ class TestIndex(BaseViewTestMixin, TestCase):
         self.assertRedirects(response, reverse('main:main'), 302, 200)
 
 
+class TestGuestUserPoolMetricsView(TestCase):
+    def setUp(self):
+        self.test_url = reverse('main:guest_user_pool_metrics')
+
+    def test_staff_user_gets_metrics(self):
+        self.client.force_login(UserFactoryNoSignal(is_staff=True))
+        response = self.client.get(self.test_url)
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json()['data']['depth'], 0)
+
+    def test_non_staff_user_is_redirected(self):
+        self.client.force_login(UserFactoryNoSignal())
+        response = self.client.get(self.test_url)
+        self.assertEquals(response.status_code, 302)
+
+
 class TestCreateAccountView(TestCreateViewMixin, TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -776,6 +793,22 @@ class TestMainView(BaseViewTestMixin, TestCase):
             ordered=True
         )
         
+    def test_dashboard_is_cached(self):
+        AccountTransactionFactory.create_batch(3, content_object__user=self.user)
+        self.client.get(self.test_url)
+        # session and user queries of the auth middleware
+        with self.assertNumQueries(2):
+            response = self.client.get(self.test_url)
+        self.assertEquals(len(response.context['transactions']), 3)
+
+    def test_dashboard_cache_is_invalidated(self):
+        account = AccountFactory(user=self.user)
+        self.client.get(self.test_url)
+        AccountTransactionFactory(content_object=account)
+        response = self.client.get(self.test_url)
+        self.assertEquals(len(response.context['transactions']), 1)
+        self.assertContains(response, account.name)
+
     def test_form_instances(self):
         response = self.client.get(self.test_url)
         self.assertIsInstance(response.context['expense_form'], ExpenseInputForm)
@@ -1124,6 +1157,8 @@ class TestTransactionNameAutocomplete(BaseViewTestMixin, TestCase):
             AccountTransactionFactory(name=f'match{i}', type='I')
         for Accounti in range(5):
             AccountTransactionFactory(name=f'fail{i}', type='I')
+        # factories don't maintain the transaction name index
+        rebuild_transaction_names()
         data_set = [
             {'name': 'mat', 'type': 'I', 'count':7},
             {'name': 'mat', 'type': 'E', 'count':6},
@@ -1721,6 +1756,14 @@ class TestPayLoanView(BaseViewTestMixin, TestCase):
             self.assertEquals(response.status_code, 200)
             self.assertEquals(before_transaction_qty, after_transaction_qty)
 
+    def test_assets_are_loaded_once(self):
+        LoanFactory.create_batch(3, user=self.user)
+        AccountFactory.create_batch(3, user=self.user)
+        self.client.force_login(self.user)
+        # session and user queries of the auth middleware, accounts and loans
+        with self.assertNumQueries(4):
+            self.client.get(self.test_url)
+
 
 class TestCategoriesView(BaseViewTestMixin, TestCase):
 
@@ -0,0 +1,240 @@
+'''
+Bulk transaction import from CSV and OFX files. Files are parsed as a stream of rows which
+are mapped to the user's categories and assets, written with bulk_create in chunks and
+applied to asset balances with one UPDATE per asset and chunk. Category totals, transaction
+names, balance snapshots of the imported assets and the dashboard are rebuilt once at the
+end instead of per transaction.
+'''
+import csv
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from .balances import BalanceLedger, get_balance_delta
+from .category_tree import get_category_tree
+from .models import Account, CreditCard, Loan, Transaction
+from .snapshots import rebuild_balance_snapshots
+from .utils import (
+    bump_ledger_version,
+    get_transaction_installment_due_date,
+    rebuild_category_monthly_totals,
+    rebuild_transaction_names,
+)
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_ASSET_MODELS = {"account": Account, "creditcard": CreditCard, "loan": Loan}
+OFX_TAG_PATTERN = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+class TransactionImportError(ValueError):
+    pass
+
+
+def parse_csv_rows(lines):
+    """
+    Takes an iterable of CSV lines with a header row and yields a dictionary per row.
+    Raises TransactionImportError for malformed files.
+    """
+    reader = csv.DictReader(lines)
+    try:
+        if reader.fieldnames is None or not {"date", "name", "amount"} <= {name.strip().lower() for name in reader.fieldnames}:
+            raise TransactionImportError("CSV files must have date, name and amount columns.")
+        for row in reader:
+            yield {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+    except csv.Error as e:
+        raise TransactionImportError(f"Invalid CSV file: {e}")
+
+
+def parse_ofx_rows(lines):
+    """
+    Takes an iterable of OFX (SGML or XML) lines and yields a dictionary per statement
+    transaction. Amounts are signed, so expenses are negative.
+    """
+    fields = None
+    for line in lines:
+        for closing, tag, value in OFX_TAG_PATTERN.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if closing and fields is not None:
+                    yield {
+                        "date": fields.get("DTPOSTED", "")[:8],
+                        "name": fields.get("NAME") or fields.get("MEMO", ""),
+                        "amount": fields.get("TRNAMT", ""),
+                    }
+                fields = None if closing else {}
+            elif fields is not None and not closing:
+                fields[tag] = value.strip()
+
+
+def parse_date(value):
+    # OFX dates are YYYYMMDD, CSV dates ISO 8601
+    if len(value) == 8 and value.isdigit():
+        value = f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return datetime.date.fromisoformat(value)
+
+
+class TransactionImporter:
+    """
+    Imports rows of transactions of a user. Rows without an asset go to the default asset.
+    Assets, categories and credit card due dates are looked up from memory. Categories are
+    given by name or, if the name isn't unique, by their "Parent/Child" path.
+    """
+
+    def __init__(self, user, asset=None, chunk_size=IMPORT_CHUNK_SIZE):
+        self.user = user
+        self.asset = asset
+        self.chunk_size = chunk_size
+        self.assets = {
+            (kind, asset.name.lower()): asset
+            for kind, model in IMPORT_ASSET_MODELS.items()
+            for asset in model.objects.filter(user=user, is_active=True)
+        }
+        self.categories = self.get_categories(get_category_tree(user))
+        self.content_type_ids = {
+            kind: ContentType.objects.get_for_model(model).id for kind, model in IMPORT_ASSET_MODELS.items()
+        }
+        self.due_dates = {}
+        self.imported_assets = {}
+
+    def get_categories(self, tree):
+        """
+        Returns a dictionary in which keys are (type, name) and (type, "parent/child" path)
+        pairs of the user's categories and values are their ids. Names shared by categories
+        of different parents map to None, those categories must be given by path.
+        """
+        categories = {}
+        for category_id, category in tree.categories.items():
+            if category["user_id"] != self.user.id or category["is_protected"]:
+                continue
+            names = []
+            parent_id = category_id
+            while parent_id in tree:
+                names.append(tree.categories[parent_id]["name"].lower())
+                parent_id = tree.categories[parent_id]["parent_id"]
+            for name in {names[0], "/".join(reversed(names))}:
+                key = (category["type"], name)
+                categories[key] = None if key in categories else category_id
+        return categories
+
+    def get_asset(self, row):
+        kind = row.get("asset_type", "").lower().replace(" ", "") or "account"
+        name = row.get("asset", "").lower()
+        if not name:
+            if self.asset is None:
+                raise ValueError("no asset given")
+            return self.asset
+        if (kind, name) not in self.assets:
+            raise ValueError(f"unknown {kind} {row['asset']}")
+        return self.assets[(kind, name)]
+
+    def get_category_id(self, row, type):
+        name = "/".join(part.strip() for part in row.get("category", "").lower().split("/"))
+        if not name:
+            return None
+        if (type, name) not in self.categories:
+            raise ValueError(f"unknown category {row['category']}")
+        if self.categories[(type, name)] is None:
+            raise ValueError(f"ambiguous category {row['category']}, give it as parent/child")
+        return self.categories[(type, name)]
+
+    def build_transaction(self, row):
+        amount = Decimal(row["amount"])
+        type = row.get("type", "").upper() or ("E" if amount < 0 else "I")
+        if type not in ("E", "I"):
+            raise ValueError(f"invalid type {row['type']}")
+        installments = int(row["installments"]) if row.get("installments") else None
+        if installments is not None and not 2 <= installments <= 36:
+            raise ValueError("installments must be between 2 and 36")
+        asset = self.get_asset(row)
+        # set the generic relation ids and derived fields directly, Transaction.save isn't called
+        transaction_obj = Transaction(
+            content_type_id=self.content_type_ids[asset._meta.model_name],
+            object_id=asset.id,
+            user_id=self.user.id,
+            asset_kind=asset._meta.model_name,
+            name=row["name"][:128],
+            amount=abs(amount),
+            date=parse_date(row["date"]),
+            type=type,
+            category_id=self.get_category_id(row, type),
+            installments=installments,
+        )
+        if not transaction_obj.name:
+            raise ValueError("name is empty")
+        return transaction_obj, asset
+
+    def build_transactions(self, rows, first_row_number):
+        """
+        Returns a list of (transaction, asset) pairs built from rows.
+        """
+        transactions = []
+        for number, row in enumerate(rows, first_row_number):
+            try:
+                transactions.append(self.build_transaction(row))
+            except (KeyError, ValueError, InvalidOperation) as e:
+                raise TransactionImportError(f"Row {number}: {e or 'invalid value'}.")
+        return transactions
+
+    def set_due_dates(self, transactions):
+        """
+        Sets due dates of credit card transactions. Rows share a few distinct (card, date,
+        installments) keys, so each due date is computed once per import.
+        """
+        for transaction_obj, card in transactions:
+            if transaction_obj.asset_kind != "creditcard":
+                continue
+            key = (card.id, transaction_obj.date, transaction_obj.installments)
+            if key not in self.due_dates:
+                if transaction_obj.installments:
+                    self.due_dates[key] = get_transaction_installment_due_date(
+                        transaction_obj.date, transaction_obj.installments, card
+                    )
+                else:
+                    self.due_dates[key] = card.get_next_payment_date(transaction_obj.date)
+            transaction_obj.due_date = self.due_dates[key]
+
+    def import_chunk(self, transactions):
+        self.set_due_dates(transactions)
+        Transaction.objects.bulk_create([transaction_obj for transaction_obj, asset in transactions])
+        ledger = BalanceLedger()
+        for transaction_obj, asset in transactions:
+            ledger.add(type(asset), asset.id, get_balance_delta(transaction_obj), asset)
+            self.imported_assets[(asset._meta.label, asset.id)] = asset
+        ledger.apply()
+
+    def import_rows(self, rows):
+        """
+        Imports an iterable of row dictionaries in one database transaction and returns
+        the number of imported transactions. Raises TransactionImportError for invalid
+        rows, in which case nothing is imported.
+        """
+        rows = iter(rows)
+        count = 0
+        with transaction.atomic():
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self.import_chunk(self.build_transactions(chunk, count + 1))
+                count += len(chunk)
+            if count:
+                rebuild_category_monthly_totals(self.user)
+                rebuild_transaction_names(self.user)
+                rebuild_balance_snapshots(assets=list(self.imported_assets.values()))
+                bump_ledger_version(self.user)
+        return count
+
+
+def get_file_format(filename):
+    return "ofx" if filename.lower().endswith((".ofx", ".qfx")) else "csv"
+
+
+def import_transactions(user, lines, file_format="csv", asset=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Takes a user, an iterable of text lines of a CSV or OFX file and an optional default
+    asset. Imports the transactions and returns their number.
+    """
+    rows = parse_ofx_rows(lines) if file_format == "ofx" else parse_csv_rows(lines)
+    return TransactionImporter(user, asset, chunk_size).import_rows(rows)
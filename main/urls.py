@@ -6,6 +6,7 @@ app_name = "main"
 urlpatterns = [
     path("", views.index, name="index"),
     path("test_drive", views.test_drive, name="test_drive"),
+    path("metrics/guest_user_pool", views.guest_user_pool_metrics, name="guest_user_pool_metrics"),
     path("main", views.main, name="main"),
     path("login", views.LoginView.as_view(), name="login"),
     path("logout", views.logout_view, name="logout"),
@@ -173,6 +174,11 @@ urlpatterns = [
         views.TransactionsDayArchiveView.as_view(),
         name='transactions_day_archive'
     ),
+    path(
+        "transactions/import",
+        views.ImportTransactionsView.as_view(),
+        name="import_transactions",
+    ),
     path(
         "transactions/<int:pk>/edit",
         views.EditTransactionView.as_view(),
@@ -1,11 +1,14 @@
 from decimal import Decimal
 from django.dispatch import receiver
 from django.shortcuts import get_object_or_404
-from django.db import transaction
-from django.db.models import Q, Sum, F
-from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
-from django.db.models.signals import post_save
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum, F, Count, Max, Value
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear, Greatest
+from django.db.models.signals import post_delete, post_save
 from django.core.paginator import Paginator
+from django.forms import ModelChoiceField
+from django.core.cache import cache
+from django.conf import settings
 from django.contrib.sessions.models import Session
 from .models import (
     Currency,
@@ -16,14 +19,24 @@ from .models import (
     Category,
     Transaction,
     Loan,
-    Rate,
     CreditCard,
     GuestUserSession,
+    CategoryMonthlyTotal,
+    PooledGuestUser,
+    TransactionName,
 )
 from .categories import expense_categories, income_categories
+from .forms import ExpenseInputForm, IncomeInputForm, TransferForm
+from .rates import convert_amounts, get_conversion_factor, round_money
+from .assets import AssetSnapshot
+from .balances import batch_balance_updates, change_asset_balance, get_balance_delta, lock_asset_balance
+from .snapshots import apply_balance_snapshot_delta, create_balance_snapshots
+from .category_tree import get_category_tree, invalidate_category_tree
+from . import net_worth
 from datetime import date, timedelta, datetime
 from dateutil.relativedelta import relativedelta
-from freezegun import freeze_time
+from calendar import monthrange
+import time
 import uuid
 import random
 import string
@@ -34,15 +47,10 @@ from pytz import UTC
 
 
 def get_latest_transactions(user, qty):
-    account_ids = Account.objects.filter(user=user).values_list("id", flat=True)
-    card_ids = CreditCard.objects.filter(user=user).values_list("id", flat=True)
     transactions = (
-        Transaction.objects.filter(
-            Q(content_type__model="account") & Q(object_id__in=account_ids) | 
-            Q(content_type__model="creditcard") & Q(object_id__in=card_ids)
-        )
+        Transaction.objects.filter(user=user, asset_kind__in=["account", "creditcard"])
         .exclude(category__is_transfer=True)
-        .exclude(Q(content_type__model="creditcard") & Q(category__name='Pay Card'))
+        .exclude(Q(asset_kind="creditcard") & Q(category__name='Pay Card'))
         .exclude(Q(category__is_protected=True) & Q(category__name='Balance Adjustment'))
         .order_by("-date", "-created")[:qty]
     )
@@ -63,98 +71,178 @@ def get_latest_transfers(user, qty):
     return transfers
 
 
-def create_categories(categories, user, parent=None):
-    for key, value in categories.items():
-        category = Category.objects.create(
-            name=key,
+LEDGER_VERSION_KEY = "main:ledger_version:{user_id}"
+DASHBOARD_SNAPSHOT_KEY = "main:dashboard:{user_id}:{version}"
+DASHBOARD_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+DASHBOARD_FORMS = {
+    "expense_form": lambda user, assets: ExpenseInputForm(user),
+    "income_form": lambda user, assets: IncomeInputForm(user),
+    "transfer_form": lambda user, assets: TransferForm(user=user, assets=assets),
+}
+
+
+def get_ledger_version(user):
+    """
+    Returns the ledger version of a user. The version changes whenever transactions,
+    transfers, assets or categories of the user change.
+    """
+    key = LEDGER_VERSION_KEY.format(user_id=getattr(user, "id", user))
+    return cache.get_or_set(key, uuid.uuid4().hex, None)
+
+
+def bump_ledger_version(user):
+    """
+    Changes the ledger version of a user so that cached dashboards of the user are not 
+    used anymore. The version is changed again on commit because a dashboard may have 
+    been cached from uncommitted data in the meantime.
+    """
+    key = LEDGER_VERSION_KEY.format(user_id=getattr(user, "id", user))
+    cache.set(key, uuid.uuid4().hex, None)
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+def get_form_choices(form):
+    """
+    Returns choices of model choice fields of a form as lists of (value, label) tuples.
+    """
+    return {
+        name: [(str(value), label) for value, label in field.choices]
+        for name, field in form.fields.items()
+        if isinstance(field, ModelChoiceField)
+    }
+
+
+def set_form_choices(form, choices):
+    """
+    Sets choices returned by get_form_choices to a form so that rendering the form doesn't
+    query the choice querysets.
+    """
+    for name, field_choices in choices.items():
+        form.fields[name].choices = field_choices
+
+
+def build_dashboard_snapshot(user):
+    """
+    Returns a dictionary of evaluated data shown on the main page of a user.
+    """
+    transactions = (
+        get_latest_transactions(user, 5)
+        .select_related("category")
+        .prefetch_related("content_object__currency")
+    )
+    assets = AssetSnapshot(user)
+    return {
+        "transactions": list(transactions),
+        "transfers": list(get_latest_transfers(user, 5)),
+        "account_data": get_account_data(user, assets),
+        "account_balance_data": get_account_balance_data(user, assets),
+        "has_card": bool(assets.cards),
+        "has_loan": bool(assets.loans),
+        "form_choices": {name: get_form_choices(form(user, assets)) for name, form in DASHBOARD_FORMS.items()},
+    }
+
+
+def get_dashboard_snapshot(user):
+    """
+    Returns the cached dashboard snapshot of a user for the current ledger version.
+    """
+    key = DASHBOARD_SNAPSHOT_KEY.format(user_id=user.id, version=get_ledger_version(user))
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_dashboard_snapshot(user)
+        cache.set(key, snapshot, DASHBOARD_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def build_category_nodes(categories, user, tree_id, level, lft):
+    """
+    Builds unsaved categories of a (sub)tree with precomputed MPTT fields. Siblings are
+    ordered by name as in MPTTMeta.order_insertion_by. Returns a list of
+    (category, children nodes) tuples and the next free lft value of the tree.
+    """
+    nodes = []
+    for name in sorted(categories or {}):
+        value = categories[name]
+        category = Category(
+            name=name,
             user=user,
             type=value["type"],
             is_transfer=value.get("is_transfer", False),
             is_protected=value.get("is_protected", False),
+            tree_id=tree_id,
+            level=level,
+            lft=lft,
         )
-        if parent:
-            parent.refresh_from_db()
-            category.parent = parent
-        category.save()
-        if value["children"]:
-            create_categories(categories=value["children"], user=user, parent=category)
+        children, rght = build_category_nodes(value["children"], user, tree_id, level + 1, lft + 1)
+        category.rght = rght
+        nodes.append((category, children))
+        lft = rght + 1
+    return nodes, lft
 
 
-def get_account_data(user):
+def create_categories(categories, user):
+    """
+    Creates the given category trees of a user with one bulk insert per tree level.
+    Each main category gets a new tree id.
+    """
+    next_tree_id = Category._tree_manager._get_next_tree_id()
+    nodes = []
+    for tree_id, name in enumerate(sorted(categories), start=next_tree_id):
+        root_nodes, lft = build_category_nodes({name: categories[name]}, user, tree_id, 0, 1)
+        nodes.extend(root_nodes)
+    while nodes:
+        Category.objects.bulk_create([category for category, children in nodes])
+        child_nodes = []
+        for category, children in nodes:
+            for child, grandchildren in children:
+                child.parent_id = category.pk
+            child_nodes.extend(children)
+        nodes = child_nodes
+    invalidate_category_tree(user)
+
+
+def get_account_data(user, assets=None):
     """
     Returns all accounts of a user and currencies of those accounts.
     """
-    accounts = Account.objects.filter(user=user, is_active=True).select_related(
-        "currency"
-    )
-    data = {}
-    for account in accounts:
-        data[account.id] = account.currency.code
-    return data
+    assets = assets or AssetSnapshot(user)
+    return assets.get_currency_data(assets.accounts)
 
-def get_account_balance_data(user):
+def get_account_balance_data(user, assets=None):
     """
     Returns all accounts of a user and balances accounts.
     """
-    accounts = Account.objects.filter(user=user, is_active=True)
-    data = {}
-    for account in accounts:
-        data[account.id] = account.balance
-    return data
+    assets = assets or AssetSnapshot(user)
+    return assets.get_balance_data(assets.accounts)
 
 
-def get_loan_data(user):
+def get_loan_data(user, assets=None):
     """
     Returns all loans of a user and currencies of those loans.
     """
-    loans = Loan.objects.filter(user=user, is_active=True).select_related("currency")
-    data = {}
-    for loan in loans:
-        data[loan.id] = loan.currency.code
-    return data
+    assets = assets or AssetSnapshot(user)
+    return assets.get_currency_data(assets.loans)
 
-def get_credit_card_data(user):
+def get_credit_card_data(user, assets=None):
     """
     Returns all credit cards of a user and currencies of those loans.
     """
-    cards = CreditCard.objects.filter(user=user, is_active=True).select_related("currency")
-    data = {}
-    for card in cards:
-        data[card.id] = card.currency.code
-    return data
+    assets = assets or AssetSnapshot(user)
+    return assets.get_currency_data(assets.cards)
 
-def get_loan_balance_data(user):
+def get_loan_balance_data(user, assets=None):
     """
     Returns all loans of a user and balances of those loans.
     """
-    loans = Loan.objects.filter(user=user, is_active=True)
-    data = {}
-    for loan in loans:
-        data[loan.id] = loan.balance
-    return data
+    assets = assets or AssetSnapshot(user)
+    return assets.get_balance_data(assets.loans)
 
-def get_credit_card_balance_data(user):
+def get_credit_card_balance_data(user, assets=None):
     """
     Returns all credit cards of a user and balances of those cards.
     """
-    cards = CreditCard.objects.filter(user=user, is_active=True)
-    data = {}
-    for card in cards:
-        data[card.id] = card.balance
-    return data
-
-def add_installments_to_payment_plan(expense, payment_plan, card):
-    """
-    Given a transaction, a payment plan and a card, add all installment payments to payment plan.
-    """
-    current_date = expense.due_date
-    if expense.installments:
-        while current_date >= card.next_payment_date:
-            payment_plan[current_date] = payment_plan.get(current_date, 0) + expense.installment_amount
-            current_date = card.get_previous_payment_date(current_date)
-    else:
-        payment_plan[current_date] = payment_plan.get(current_date, 0) + expense.amount
-    return payment_plan
+    assets = assets or AssetSnapshot(user)
+    return assets.get_balance_data(assets.cards)
 
 def get_sorted_payment_plan(payment_plan):
     """
@@ -174,14 +262,58 @@ def convert_payment_plan_dates(payment_plan):
         item[0] = item[0].strftime("%Y-%m-%d")
 
 
+def get_month_payment_date(card, month_index):
+    """
+    Given a card and a month index (year * 12 + month - 1), returns the payment date of the card
+    in that month. Same as card.get_next_payment_date for the first day of the month.
+    """
+    year, month = divmod(month_index, 12)
+    day = min(card.payment_day, monthrange(year, month + 1)[1])
+    return datetime(year, month + 1, day, tzinfo=UTC)
+
 def get_credit_card_payment_plan(card):
     """
-    Given a card, returns a monthly payment plan dictionary.
+    Given a card, returns a monthly payment plan as a sorted list of [date, amount] lists.
+    Open expenses are fetched with one grouped query. Installments paid before the due date
+    are spread over month indexes with a difference array, so the plan is built in
+    O(expenses + months).
     """
+    next_payment_date = card.next_payment_date
+    first_month = next_payment_date.year * 12 + next_payment_date.month - 1
+    expenses = (
+        card.transactions.filter(due_date__gt=date.today(), type='E')
+        .values('due_date', 'installments', 'amount')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
     payment_plan = {}
-    incomplete_expenses = card.transactions.filter(due_date__gt=date.today(), type='E')
-    for expense in incomplete_expenses:
-        add_installments_to_payment_plan(expense, payment_plan, card)
+    amount_changes = {}
+    installment_changes = {}
+    last_month = first_month
+    for expense in expenses:
+        due_date = expense['due_date']
+        if not expense['installments']:
+            payment_plan[due_date] = payment_plan.get(due_date, 0) + expense['amount'] * expense['count']
+            continue
+        if due_date < next_payment_date:
+            continue
+        amount = round(expense['amount'] / expense['installments'], 2) * expense['count']
+        payment_plan[due_date] = payment_plan.get(due_date, 0) + amount
+        # installments of the months between the next payment date and the due date
+        due_month = due_date.year * 12 + due_date.month - 1
+        if due_month > first_month:
+            amount_changes[first_month] = amount_changes.get(first_month, 0) + amount
+            amount_changes[due_month] = amount_changes.get(due_month, 0) - amount
+            installment_changes[first_month] = installment_changes.get(first_month, 0) + 1
+            installment_changes[due_month] = installment_changes.get(due_month, 0) - 1
+            last_month = max(last_month, due_month)
+    amount = installments = 0
+    for month in range(first_month, last_month):
+        amount += amount_changes.get(month, 0)
+        installments += installment_changes.get(month, 0)
+        if installments:
+            payment_date = get_month_payment_date(card, month)
+            payment_plan[payment_date] = payment_plan.get(payment_date, 0) + amount
     sorted_payment_plan = get_sorted_payment_plan(payment_plan)
     convert_payment_plan_dates(sorted_payment_plan)
     return sorted_payment_plan
@@ -227,47 +359,54 @@ def is_owner(user, model, id):
     return object.user == user
 
 
+def get_category_sums(qs):
+    """
+    Takes a queryset of transactions and returns a dictionary of amount sums by category id.
+    """
+    return dict(qs.values_list("category").annotate(sum=Sum("amount")).order_by())
+
+def get_currency_category_sums(qs, target_currency, currency_lookup="account__currency"):
+    """
+    Takes a queryset of transactions and a target currency. Returns a dictionary of amount 
+    sums by category id converted to the target currency.
+    """
+    rows = (
+        qs.annotate(currency=F(currency_lookup))
+        .values("category", "currency")
+        .annotate(sum=Sum("amount"))
+        .order_by()
+    )
+    return convert_monthly_total_sums(rows, "category", target_currency)
+
 def get_category_stats(qs, category_type, parent, user):
-    categories = Category.objects.filter(Q(user=user, parent=parent, type=category_type)|Q(id=getattr(parent, 'id', None)))
+    parent_id = getattr(parent, 'id', None)
+    sums = get_category_sums(qs)
+    tree = get_category_tree(user, parent_id, *sums)
+    category_ids = tree.get_child_ids(parent_id, category_type)
+    if parent_id in tree:
+        category_ids = sorted([parent_id] + category_ids, key=tree.order.index)
     category_stats = {}
-    for category in categories:
-        descendant_categories = category.get_descendants(include_self=True)
-        sum = qs.filter(category__in=descendant_categories).aggregate(Sum("amount"))
-        if not sum["amount__sum"]:
+    for category_id in category_ids:
+        category_sum = tree.get_subtree_sum(category_id, sums)
+        if not category_sum:
             continue
-        category_stats[category.name] = {"sum": sum["amount__sum"], "id": category.id}
+        category_stats[tree.categories[category_id]["name"]] = {"sum": category_sum, "id": category_id}
     if not category_stats:
         category_stats["No data available"] = {"sum": 0, "id": 0}
     return category_stats
 
 def get_conversion_rate(from_currency, to_currency):
     """
-    Calculates rate between currencies. Takes 2 currencies and returns a float. 
+    Calculates rate between currencies. Takes 2 currencies and returns a decimal. 
     """
-    from_currency_rate = Rate.objects.get(currency=from_currency)
-    to_currency_rate = Rate.objects.get(currency=to_currency)
-    return to_currency_rate.rate / from_currency_rate.rate
+    return get_conversion_factor(from_currency, to_currency)
 
 def convert_money(from_currency, to_currency, amount):
     """
     A basic currency converter. Takes from currency, to currency and an amount.
     Returns converted amount.
     """
-    conversion_rate = get_conversion_rate(from_currency, to_currency)
-    return round(amount * conversion_rate, 2)
-
-def get_transactions_currencies(qs):
-    """
-    Accepts a queryset of transactions and returns a set of currencies 
-    which are of the accounts which transansactions made from.
-    """
-    currencies = qs.values_list('account__currency', flat=True)
-    return Currency.objects.filter(id__in=set(currencies)).prefetch_related('rate')
-
-def convert_category_stats(stats, from_currency, to_currency):
-    for key, value in stats.items():
-        value['sum'] = convert_money(from_currency, to_currency, value['sum'])
-    return stats
+    return round_money(amount * get_conversion_rate(from_currency, to_currency))
 
 def get_multi_currency_category_stats(qs, parent, user, target_currency=None):
     """
@@ -277,19 +416,18 @@ def get_multi_currency_category_stats(qs, parent, user, target_currency=None):
     category_stats = {}
     if not target_currency:
         target_currency = user.primary_currency
+    tree = get_category_tree(parent.user_id, parent.id)
+    category_ids = tree.get_descendant_ids(parent.id)
+    sums = get_currency_category_sums(qs.filter(category__in=category_ids), target_currency)
 
-    categories = parent.get_descendants(include_self=True).annotate(
-        sum=Sum(
-            F('transactions__amount')/F('transactions__account__currency__rate__rate')*target_currency.get_rate(), 
-            filter=Q(transactions__in=qs)
-            )
-    ).exclude(sum=None)
-
-    for category in categories:
+    for category_id in category_ids:
+        if category_id not in sums:
+            continue
+        name = tree.categories[category_id]["name"]
         try:
-            category_stats[category.name]['sum'] += category.sum
+            category_stats[name]['sum'] += sums[category_id]
         except KeyError:
-            category_stats[category.name] = {'sum':category.sum, 'id':category.id}
+            category_stats[name] = {'sum': sums[category_id], 'id': category_id}
 
     return category_stats
 
@@ -302,25 +440,17 @@ def get_multi_currency_category_json_stats(qs, parent, user, target_currency=Non
     labels = []
     if not target_currency:
         target_currency = user.primary_currency
-    if not card:
-        categories = parent.get_descendants(include_self=True).annotate(
-            sum=Sum(
-                F('transactions__amount')/F('transactions__account__currency__rate__rate')*target_currency.get_rate(), 
-                filter=Q(transactions__in=qs)
-                )
-        ).exclude(sum=None)
-    else:
-        categories = parent.get_descendants(include_self=True).annotate(
-            sum=Sum(
-                F('transactions__amount')/F('transactions__credit_card__currency__rate__rate')*target_currency.get_rate(), 
-                filter=Q(transactions__in=qs)
-                )
-        ).exclude(sum=None)
+    tree = get_category_tree(parent.user_id, parent.id)
+    category_ids = tree.get_descendant_ids(parent.id)
+    currency_lookup = 'credit_card__currency' if card else 'account__currency'
+    sums = get_currency_category_sums(qs.filter(category__in=category_ids), target_currency, currency_lookup)
 
-    for category in categories:
-        labels.append(category.name)
-        if category.sum:
-            sum_data.append(round(category.sum, 2))
+    for category_id in category_ids:
+        if category_id not in sums:
+            continue
+        labels.append(tree.categories[category_id]["name"])
+        if sums[category_id]:
+            sum_data.append(round(sums[category_id], 2))
     data = {
         "data": sum_data,
         "labels": labels,
@@ -337,66 +467,99 @@ def get_multi_currency_main_category_stats(qs, category_type, user, target_curre
     if not target_currency:
         target_currency = user.primary_currency
 
-    categories = Category.objects.filter(user=user, type=category_type)
-
-    if qs:
-        categories_with_sum = categories.annotate(
-            sum=Sum(
-                F('transactions__amount')/F('transactions__account__currency__rate__rate')*target_currency.get_rate(), 
-                filter=Q(transactions__in=qs)
-                )
-        ).exclude(sum=None)
-    else: 
-        categories_with_sum = Category.objects.none()
-    children_categories = Category.objects.filter(type=category_type, user=user, parent=None, is_transfer=False)
-    for category in children_categories:
-        for category_with_sum in categories_with_sum:
-            if category.tree_id == category_with_sum.tree_id:
-                try:
-                    category_stats[category.name]['sum'] += category_with_sum.sum
-                except KeyError:
-                    category_stats[category.name] = {'sum':category_with_sum.sum, 'id':category.id}
+    sums = get_currency_category_sums(qs, target_currency)
+    tree = get_category_tree(user, *sums)
+    for category_id in tree.get_main_category_ids(category_type):
+        if tree.categories[category_id]["is_transfer"]:
+            continue
+        category_sum = tree.get_subtree_sum(category_id, sums)
+        if category_sum is not None:
+            category_stats[tree.categories[category_id]["name"]] = {'sum': category_sum, 'id': category_id}
 
     return category_stats
 
-def get_category_detail_stats(qs, parent):
-    categories = parent.get_descendants(include_self=True)
+def get_category_monthly_totals(user, period=None):
+    """
+    Returns a queryset of user's CategoryMonthlyTotal objects in the period. period is a 
+    dictionary of 'year' and 'month' lookups. An empty period returns all totals.
+    """
+    return CategoryMonthlyTotal.objects.filter(user=user, count__gt=0, **(period or {})).exclude(
+        category__is_transfer=True
+    )
+
+def convert_monthly_total_sums(rows, key, target_currency):
+    """
+    Takes rows of sums grouped by a key and currency, converts sums to target currency 
+    and returns a dictionary of converted sums in which keys are key values.
+    """
+    rows = list(rows)
+    converted = convert_amounts([(row['sum'], row['currency']) for row in rows], target_currency)
+    sums = {}
+    for row, amount in zip(rows, converted):
+        sums[row[key]] = sums.get(row[key], 0) + amount
+    return sums
+
+def get_monthly_total_main_category_stats(user, category_type, period=None, target_currency=None):
+    """
+    Gets a user, a category type, a period and target currency. Returns main category 
+    stats of ins outs page using CategoryMonthlyTotal objects.
+    """
     category_stats = {}
-    category_sums = categories.annotate(sum=Sum('transactions__amount', filter=Q(transactions__in=qs)))
-    for category in category_sums:
-        if not category.sum:
-            continue
-        category_stats[category.name] = {'sum': category.sum, "id": category.id}
-    if not category_stats:
-        category_stats["No data available"] = {"sum": 0, "id": 0}
+    if not target_currency:
+        target_currency = user.primary_currency
+    rows = (
+        get_category_monthly_totals(user, period)
+        .filter(type=category_type)
+        .exclude(Q(category__is_protected=True) & Q(category__name__in=['Pay Card', 'Balance Adjustment']))
+        .values('category__tree_id', 'currency')
+        .annotate(sum=Sum('total'))
+        .order_by()
+    )
+    sums = convert_monthly_total_sums(rows, 'category__tree_id', target_currency)
+    main_categories = Category.objects.filter(type=category_type, user=user, parent=None, is_transfer=False)
+    for category in main_categories:
+        if category.tree_id in sums:
+            category_stats[category.name] = {'sum': round(sums[category.tree_id], 2), 'id': category.id}
     return category_stats
 
-def add_category_stats(main_stats, added_stats):
-    for key, value in added_stats.items():
+def get_monthly_total_category_stats(parent, user, period=None, target_currency=None):
+    """
+    Gets a parent category, a user, a period and target currency. Returns category 
+    detail page stats of the parent and its descendants using CategoryMonthlyTotal objects.
+    """
+    category_stats = {}
+    if not target_currency:
+        target_currency = user.primary_currency
+    tree = get_category_tree(user, parent.id)
+    category_ids = tree.get_descendant_ids(parent.id)
+    rows = (
+        get_category_monthly_totals(user, period)
+        .filter(category__in=category_ids)
+        .values('category', 'currency')
+        .annotate(sum=Sum('total'))
+        .order_by()
+    )
+    sums = convert_monthly_total_sums(rows, 'category', target_currency)
+    for category_id in category_ids:
+        if category_id not in sums:
+            continue
+        name = tree.categories[category_id]["name"]
         try:
-            main_stats[key]['sum'] += value['sum']
+            category_stats[name]['sum'] += round(sums[category_id], 2)
         except KeyError:
-            main_stats[key] = value
+            category_stats[name] = {'sum': round(sums[category_id], 2), 'id': category_id}
+    return category_stats
 
-def get_multi_currency_category_detail_stats(qs, parent, to_currency):
-    stats = {}
-    currencies = get_transactions_currencies(qs)
-    for currency in currencies:
-        currency_transactions = qs.filter(account__currency=currency)
-        category_stats = get_category_detail_stats(currency_transactions, parent)
-        convert_category_stats(category_stats, currency, to_currency)
-        add_category_stats(stats, category_stats)
-    return stats 
-        
 def get_subcategory_stats(qs, category):
     sum_data = []
     labels = []
-    categories = category.get_descendants(include_self=True)
-    for category in categories:
-        sum = qs.filter(category=category).aggregate(Sum("amount"))
-        if sum["amount__sum"]:
-            labels.append(category.name)
-            sum_data.append(sum["amount__sum"])
+    tree = get_category_tree(category.user_id, category.id)
+    category_ids = tree.get_descendant_ids(category.id)
+    sums = get_category_sums(qs.filter(category__in=category_ids))
+    for category_id in category_ids:
+        if sums.get(category_id):
+            labels.append(tree.categories[category_id]["name"])
+            sum_data.append(sums[category_id])
     data = {
         "data": sum_data,
         "labels": labels,
@@ -432,30 +595,13 @@ def get_loan_progress(loan_object):
         return round(progress, 2)
 
 
-def get_payment_stats(loan_object):
-    data = {}
-    data[loan_object.created.strftime("%Y-%m-%d")] = abs(loan_object.initial)
-    transactions = Transaction.objects.filter(
-        content_type__model="loan", object_id=loan_object.id
-    ).order_by("date")
-    balance = loan_object.initial
-    for tr in transactions:
-        balance += (tr.amount if tr.category.type=='I' else -tr.amount)
-        data[tr.date.strftime("%Y-%m-%d")] = abs(balance)
-    return data
-
-
 def get_monthly_asset_balance_change(asset):
     """
     Takes an asset(account or loan) and returns a queryset of dictionaries of monthly change.
     (total incomes - total expences)
     """
-    transactions = Transaction.objects.filter(
-        content_type__model=asset.__class__.__name__.lower(),
-        object_id=asset.id,
-    )
     monthly_total = (
-        transactions.annotate(month=ExtractMonth("date"), year=ExtractYear("date"))
+        asset.transactions.annotate(month=ExtractMonth("date"), year=ExtractYear("date"))
         .values("month", "year")
         .annotate(
             total=Coalesce(Sum("amount", filter=Q(type="I")), Decimal(0))
@@ -466,13 +612,6 @@ def get_monthly_asset_balance_change(asset):
     return monthly_total
 
 
-def sort_balance_data(data):
-    """
-    Takes a dictionary and returns a list of tuples sorted by dictionary keys.
-    """
-    return sorted(data.items())
-
-
 def convert_str_to_date(str):
     return datetime.strptime(str, "%Y-%m")
 
@@ -497,51 +636,6 @@ def get_valid_date(year, month, day):
     except ValueError:
         return get_valid_date(year, month, day-1)
 
-def fill_missing_monthly_data(data):
-    today = date.today()
-    this_month = f"{today.year}-{today.month:02d}"
-    start_date = min(data)
-    end_date = max(max(data), this_month)
-    current_date = start_date
-    current_value = data[current_date]
-    while current_date <= end_date:
-        if current_date in data:
-            current_value = data[current_date]
-        else:
-            data[current_date] = current_value
-        current_date = get_next_month(current_date)
-    return data
-
-
-def get_monthly_asset_balance(asset):
-    """
-    Takes an asset(account or loan) and returns a dictionary of monthly balance.
-    (total incomes - total expences)
-    """
-    data = {}
-    data[asset.created.strftime("%Y-%m")] = asset.initial
-    monthly_totals = get_monthly_asset_balance_change(asset)
-    balance = asset.initial
-    for item in monthly_totals:
-        balance += item["total"]
-        data[f"{item['year']}-{item['month']:02d}"] = balance
-    return data
-
-
-def get_monthly_currency_balance(user, currency):
-    """
-    Takes an currency and returns a dictionary of monthly balance for all accounts in that currency.
-    (total incomes - total expences)
-    """
-    accounts = Account.objects.filter(user=user, currency=currency)
-    data = {}
-    for account in accounts:
-        monthly_balance = get_monthly_asset_balance(account)
-        monthly_balance = fill_missing_monthly_data(monthly_balance)
-        for key, value in monthly_balance.items():
-            data[key] = data.get(key, 0) + value
-    return sort_balance_data(data)
-
 def get_user_currencies(user):
     """
     Takes a user and returns a set of user's active accounts.
@@ -554,21 +648,7 @@ def get_user_currencies(user):
 
 
 def get_worth_stats(user):
-    stats = {}
-    currencies = get_user_currencies(user)
-    for currency in currencies:
-        stats[currency] = get_monthly_currency_balance(user=user, currency=currency)
-    return stats
-
-def get_total_worth_stats(user, stats):
-    primary_currency = user.primary_currency
-    total_stats = {}
-    for currency, currency_stats in stats.items():
-        for date, amount in currency_stats:
-            amount = convert_money(currency, primary_currency, amount)
-            total_stats[date] = total_stats.get(date, 0) + amount
-    total_stats_list = [(date, amount) for date, amount in total_stats.items()]
-    return {primary_currency: total_stats_list}
+    return net_worth.get_worth_stats(net_worth.get_currency_balances(user))
 
 def get_net_worth_by_currency(user, currency):
     """
@@ -647,36 +727,206 @@ def get_users_grand_total(user, data):
     return {'currency': user_currency, 'total': round(grand_total, 2)}
 
 def withdraw_asset_balance(transaction):
-    asset = transaction.content_object
-    amount = transaction.amount
-    if transaction.type == 'E':
-        asset.balance += amount
-    else:
-        asset.balance -= amount
-    asset.save()
+    '''
+    Reverts a transaction's effect on its account or loan balance. Accepts a transaction object.
+    '''
+    change_asset_balance(transaction, -1)
 
 def handle_transaction_delete(transaction_obj):
-    with transaction.atomic():
+    with batch_balance_updates():
         if transaction_obj.has_transfer():
             couple_transaction_obj = transaction_obj.get_couple_transaction()
             withdraw_asset_balance(transaction_obj)
             withdraw_asset_balance(couple_transaction_obj)
+            withdraw_category_monthly_total(couple_transaction_obj)
+            withdraw_transaction_name_usage(couple_transaction_obj)
             couple_transaction_obj.delete()
         else: 
             withdraw_asset_balance(transaction_obj)
+        withdraw_category_monthly_total(transaction_obj)
+        withdraw_transaction_name_usage(transaction_obj)
         transaction_obj.delete()
 
 def edit_asset_balance(transaction):
     '''
     Edits account or loan balance when a transaction is made. Accepts a transaction object.
     '''
-    asset = transaction.content_object
-    amount = transaction.amount
-    if transaction.type == 'E':
-        asset.balance -= amount 
-    else:
-        asset.balance += amount 
-    asset.save()
+    change_asset_balance(transaction, 1)
+
+def update_category_monthly_total(transaction_obj, sign):
+    '''
+    Adds (sign=1) or removes (sign=-1) an account transaction to/from related 
+    CategoryMonthlyTotal object. Transactions of other assets are not tracked.
+    '''
+    asset = transaction_obj.content_object
+    if not isinstance(asset, Account) or not transaction_obj.category_id:
+        return
+    transaction_date = Transaction._meta.get_field('date').to_python(transaction_obj.date)
+    amount = Transaction._meta.get_field('amount').to_python(transaction_obj.amount)
+    lookup = {
+        'user_id': asset.user_id,
+        'category_id': transaction_obj.category_id,
+        'currency_id': asset.currency_id,
+        'year': transaction_date.year,
+        'month': transaction_date.month,
+        'type': transaction_obj.type,
+    }
+    totals = CategoryMonthlyTotal.objects.filter(**lookup)
+    change = {'total': F('total') + sign * abs(amount), 'count': F('count') + sign}
+    updated = totals.update(**change)
+    if sign < 0:
+        # a month without transactions left has no total
+        totals.filter(count__lte=0).delete()
+    elif not updated:
+        try:
+            with transaction.atomic():
+                CategoryMonthlyTotal.objects.create(**lookup, total=abs(amount), count=1)
+        except IntegrityError:
+            # a concurrent request created the total after the update above
+            totals.update(**change)
+
+def edit_category_monthly_total(transaction_obj):
+    '''
+    Adds a transaction to category monthly totals. Accepts a transaction object.
+    '''
+    update_category_monthly_total(transaction_obj, 1)
+
+def withdraw_category_monthly_total(transaction_obj):
+    '''
+    Removes a transaction from category monthly totals. Accepts a transaction object.
+    '''
+    update_category_monthly_total(transaction_obj, -1)
+
+def rebuild_category_monthly_totals(user=None):
+    '''
+    Deletes and recreates CategoryMonthlyTotal objects of a user from account transactions. 
+    Rebuilds totals of all users if no user is given. Returns created object count.
+    '''
+    totals = CategoryMonthlyTotal.objects.all()
+    transactions = Transaction.objects.filter(content_type__model='account', category__isnull=False)
+    if user:
+        totals = totals.filter(user=user)
+        transactions = transactions.filter(account__user=user)
+    rows = (
+        transactions.annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('account__user', 'category', 'account__currency', 'year', 'month', 'type')
+        .annotate(sum=Sum('amount'), transaction_count=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        totals.delete()
+        created = CategoryMonthlyTotal.objects.bulk_create(
+            [
+                CategoryMonthlyTotal(
+                    user_id=row['account__user'],
+                    category_id=row['category'],
+                    currency_id=row['account__currency'],
+                    year=row['year'],
+                    month=row['month'],
+                    type=row['type'],
+                    total=row['sum'],
+                    count=row['transaction_count'],
+                )
+                for row in rows.iterator()
+            ],
+            batch_size=1000
+        )
+    return len(created)
+
+TRANSACTION_NAME_ASSET_KINDS = ['account', 'creditcard']
+TRANSACTION_NAME_SUGGESTION_LIMIT = 10
+
+def update_transaction_name_usage(transaction_obj, sign):
+    '''
+    Adds (sign=1) or removes (sign=-1) an account or credit card transaction to/from the 
+    usage count of its TransactionName object. Names which are not used anymore are deleted.
+    '''
+    if transaction_obj.asset_kind not in TRANSACTION_NAME_ASSET_KINDS or not transaction_obj.user_id:
+        return
+    lookup = {
+        'user_id': transaction_obj.user_id,
+        'type': transaction_obj.type,
+        'name': transaction_obj.name,
+    }
+    names = TransactionName.objects.filter(**lookup)
+    if sign < 0:
+        names.update(count=F('count') - 1)
+        names.filter(count__lte=0).delete()
+        return
+    transaction_date = Transaction._meta.get_field('date').to_python(transaction_obj.date)
+    change = {'count': F('count') + 1, 'last_used': Greatest('last_used', Value(transaction_date))}
+    updated = names.update(**change)
+    if not updated:
+        try:
+            with transaction.atomic():
+                TransactionName.objects.create(**lookup, count=1, last_used=transaction_date)
+        except IntegrityError:
+            # a concurrent request created the name after the update above
+            names.update(**change)
+
+def edit_transaction_name_usage(transaction_obj):
+    '''
+    Adds a transaction to transaction name usages. Accepts a transaction object.
+    '''
+    update_transaction_name_usage(transaction_obj, 1)
+
+def withdraw_transaction_name_usage(transaction_obj):
+    '''
+    Removes a transaction from transaction name usages. Accepts a transaction object.
+    '''
+    update_transaction_name_usage(transaction_obj, -1)
+
+def rebuild_transaction_names(user=None):
+    '''
+    Deletes and recreates TransactionName objects of a user from account and credit card 
+    transactions. Rebuilds names of all users if no user is given. Returns created object count.
+    '''
+    names = TransactionName.objects.all()
+    transactions = Transaction.objects.filter(asset_kind__in=TRANSACTION_NAME_ASSET_KINDS, user__isnull=False)
+    if user:
+        names = names.filter(user=user)
+        transactions = transactions.filter(user=user)
+    rows = (
+        transactions.values('user', 'type', 'name')
+        .annotate(transaction_count=Count('id'), last_used=Max('date'))
+        .order_by()
+    )
+    with transaction.atomic():
+        names.delete()
+        created = TransactionName.objects.bulk_create(
+            [
+                TransactionName(
+                    user_id=row['user'],
+                    type=row['type'],
+                    name=row['name'],
+                    search_name=row['name'].lower(),
+                    count=row['transaction_count'],
+                    last_used=row['last_used'],
+                )
+                for row in rows.iterator()
+            ],
+            batch_size=1000
+        )
+    return len(created)
+
+def get_transaction_name_suggestions(user, query, type, limit=TRANSACTION_NAME_SUGGESTION_LIMIT):
+    '''
+    Returns at most limit transaction names of a user and a transaction type matching a 
+    query. Names starting with the query come first, then names containing it. Each group 
+    is ranked by usage count and last used date.
+    '''
+    search = query.lower()
+    names = (
+        TransactionName.objects.filter(user=user, type=type)
+        .order_by('-count', '-last_used', 'name')
+        .values_list('name', flat=True)
+    )
+    suggestions = list(names.filter(search_name__startswith=search)[:limit])
+    if len(suggestions) < limit:
+        suggestions += names.filter(search_name__contains=search).exclude(
+            search_name__startswith=search
+        )[:limit - len(suggestions)]
+    return suggestions
 
 def get_transaction_installment_due_date(transaction_date, installments, card):
     """
@@ -700,6 +950,8 @@ def create_transaction(data):
     with transaction.atomic():
         transaction_obj = Transaction.objects.create(**data)
         edit_asset_balance(transaction_obj)
+        edit_category_monthly_total(transaction_obj)
+        edit_transaction_name_usage(transaction_obj)
     return transaction_obj
 
 def get_from_transaction(data, user):
@@ -736,7 +988,7 @@ def create_transfer(data, user):
     '''
     Accepts a data dictionary and user object. Creates a transfer object and related transaction objects.
     '''
-    with transaction.atomic():
+    with batch_balance_updates():
         from_transaction = get_from_transaction(data, user)
         to_transaction = get_to_transaction(data, user)
         Transfer.objects.create(
@@ -768,7 +1020,7 @@ def handle_debt_payment(form, paid_asset):
     '''
     Accepts a Django form, creates transaction and transfer objects needed for loan payment process.
     '''
-    with transaction.atomic():
+    with batch_balance_updates():
         name = 'Pay Loan' if paid_asset=='loan' else 'Pay Card'
         account_transaction = create_transaction(get_payment_transaction_data(form, 'account', name))
         paid_asset_transaction = create_transaction(get_payment_transaction_data(form, paid_asset, name))
@@ -782,29 +1034,32 @@ def handle_debt_payment(form, paid_asset):
 def handle_asset_delete(asset):
     '''
     Accepts an asset(account or loan) object and creates required transactions to zero account balance.
+    The asset row is locked so the balance can't change between reading and zeroing it.
     '''
-    if asset.balance > 0:
-        category = Category.objects.get(user=asset.user, type='E', name='Asset Delete')
-        data = {
-            'content_object': asset,
-            'name': 'Asset Delete',
-            'amount': asset.balance,
-            'category': category,
-            'type': 'E',
-            'installments': None
-        }
-        create_transaction(data)
-    if asset.balance < 0:
-        category = Category.objects.get(user=asset.user, type='I', name='Asset Delete')
-        data = {
-            'content_object': asset,
-            'name': 'Asset Delete',
-            'amount': asset.balance,
-            'category': category,
-            'type': 'I',
-            'installments': None
-        }
-        create_transaction(data)
+    with transaction.atomic():
+        lock_asset_balance(asset)
+        if asset.balance > 0:
+            category = Category.objects.get(user=asset.user, type='E', name='Asset Delete')
+            data = {
+                'content_object': asset,
+                'name': 'Asset Delete',
+                'amount': asset.balance,
+                'category': category,
+                'type': 'E',
+                'installments': None
+            }
+            create_transaction(data)
+        if asset.balance < 0:
+            category = Category.objects.get(user=asset.user, type='I', name='Asset Delete')
+            data = {
+                'content_object': asset,
+                'name': 'Asset Delete',
+                'amount': asset.balance,
+                'category': category,
+                'type': 'I',
+                'installments': None
+            }
+            create_transaction(data)
 
 def handle_transfer_delete(transfer):
     '''
@@ -814,14 +1069,23 @@ def handle_transfer_delete(transfer):
     '''
     handle_transaction_delete(transfer.from_transaction)
 
-def edit_transaction(transaction, data):
-    withdraw_asset_balance(transaction)
-    for key, value in data.items():
-        setattr(transaction, key, value)
-    transaction.save()
-    transaction.refresh_from_db()
-    transaction.content_object.refresh_from_db()
-    edit_asset_balance(transaction)
+def edit_transaction(transaction_obj, data):
+    '''
+    Accepts a transaction object and a dictionary of new field values. Withdraws the stored
+    transaction from balances and totals and adds the edited one. The transaction row is
+    locked so concurrent edits withdraw what the previous edit stored.
+    '''
+    with batch_balance_updates():
+        initial_obj = Transaction.objects.select_for_update().get(pk=transaction_obj.pk)
+        withdraw_asset_balance(initial_obj)
+        withdraw_category_monthly_total(initial_obj)
+        withdraw_transaction_name_usage(initial_obj)
+        for key, value in data.items():
+            setattr(transaction_obj, key, value)
+        transaction_obj.save()
+        edit_asset_balance(transaction_obj)
+        edit_category_monthly_total(transaction_obj)
+        edit_transaction_name_usage(transaction_obj)
 
 def handle_transfer_edit(object, data):
     from_transaction_data = {
@@ -834,75 +1098,12 @@ def handle_transfer_edit(object, data):
         'amount': data  ['to_amount'],
         'date': data['date']
     }
-    with transaction.atomic():
+    with batch_balance_updates():
         edit_transaction(object.from_transaction, from_transaction_data)
         edit_transaction(object.to_transaction, to_transaction_data)
         object.date = data['date']
         object.save()
 
-def get_currency_ins_outs(currency, qs, user):
-    currency_accounts_list = Account.objects.filter(user=user, currency=currency).values_list('id', flat=True)
-    expense = qs.filter(
-        content_type__model='account', 
-        object_id__in=currency_accounts_list,
-        type='E'
-    ).aggregate(Sum('amount'))['amount__sum'] or 0 #aggregate returns a dictionary with 'amount__sum' key
-    income = qs.filter(
-        content_type__model='account', 
-        object_id__in=currency_accounts_list,
-        type='I'
-    ).aggregate(Sum('amount'))['amount__sum'] or 0 #aggregate returns a dictionary with 'amount__sum' key
-    currency_ins_outs = {
-        'currency': currency,
-        'expense': expense,
-        'income': income,
-        'balance': income-expense
-    }
-    return currency_ins_outs
-
-def get_report_total(qs, target_currency):
-    total = {
-        'currency': target_currency.name,
-        'expense': 0,
-        'income': 0,
-        'balance': 0
-    }
-    for currency in qs:
-        rate = target_currency.rate.rate / currency.rate.rate
-        total['expense'] += round(currency.expense * rate, 2)
-        total['income'] += round(currency.income * rate, 2)
-        total['balance'] += round(currency.balance * rate, 2)
-    return total
-
-def get_ins_outs_report(user, qs, target_currency=None):
-    report = []
-    if not target_currency:
-        target_currency = user.primary_currency
-    currencies = Currency.objects.filter(accounts__user=user).prefetch_related('rate').annotate(
-        expense = Coalesce(Sum('accounts__transactions__amount', filter=Q(accounts__transactions__in=qs)&Q(accounts__transactions__type='E')), Decimal(0)),
-        income = Coalesce(Sum('accounts__transactions__amount', filter=Q(accounts__transactions__in=qs)&Q(accounts__transactions__type='I')), Decimal(0))
-    ).annotate(
-        balance = F('income') - F('expense')
-    )
-    for currency in currencies:
-        if currency.expense or currency.income:
-            data = {
-                'currency': currency,
-                'expense': currency.expense,
-                'income': currency.income,
-                'balance': currency.balance
-            }
-        else:
-            data = {
-                'currency': currency,
-                'expense': 0,
-                'income': 0,
-                'balance': 0
-            }
-        report.append(data)
-    total = get_report_total(currencies, target_currency)
-    return report, total
-
 def create_guest_user():
     username = uuid.uuid4().hex
     email = f"{username}@example.com"
@@ -922,48 +1123,52 @@ def get_session_from_db(request):
 
 def create_guest_user_accounts(user):
     account_creation_date = date.today() + relativedelta(days=-100)
-    with freeze_time(account_creation_date.__str__()):
-        bank_account = Account.objects.create(
-            user = user, 
-            name = guest_user_data.bank_account["name"],
-            balance = guest_user_data.bank_account['initial'],
-            initial = guest_user_data.bank_account['initial'],
-            currency = Currency.objects.get(code=guest_user_data.bank_account['currency'])
-        )
-        foreign_currency_account = Account.objects.create(
-            user = user, 
-            name = guest_user_data.foreign_currency_account["name"],
-            balance = guest_user_data.foreign_currency_account['initial'],
-            initial = guest_user_data.foreign_currency_account['initial'],
-            currency = Currency.objects.get(code=guest_user_data.foreign_currency_account['currency'])
-        )
-        wallet = Account.objects.create(
-            user = user, 
-            name = guest_user_data.wallet["name"],
-            balance = guest_user_data.wallet['initial'],
-            initial = guest_user_data.wallet['initial'],
-            currency = Currency.objects.get(code=guest_user_data.wallet['currency'])
-        )
-        loan = Loan.objects.create(
-            user = user, 
-            name = guest_user_data.loan["name"],
-            initial = guest_user_data.loan['initial'],
-            balance = guest_user_data.loan['initial'],
-            currency = Currency.objects.get(code=guest_user_data.loan['currency'])
-        )
-        credit_card = CreditCard.objects.create(
-            user = user, 
-            name = guest_user_data.credit_card["name"],
-            payment_day = guest_user_data.credit_card['payment_day'],
-            currency = Currency.objects.get(code=guest_user_data.credit_card['currency'])
-        )
-        user_accounts = {
-            'bank_account': bank_account,
-            'wallet': wallet,
-            'loan': loan,
-            'credit_card': credit_card,
-            'foreign_currency_account': foreign_currency_account
-        }
+    created = datetime(account_creation_date.year, account_creation_date.month, account_creation_date.day, tzinfo=UTC)
+    bank_account = Account.objects.create(
+        user = user, 
+        name = guest_user_data.bank_account["name"],
+        balance = guest_user_data.bank_account['initial'],
+        initial = guest_user_data.bank_account['initial'],
+        currency = Currency.objects.get(code=guest_user_data.bank_account['currency'])
+    )
+    foreign_currency_account = Account.objects.create(
+        user = user, 
+        name = guest_user_data.foreign_currency_account["name"],
+        balance = guest_user_data.foreign_currency_account['initial'],
+        initial = guest_user_data.foreign_currency_account['initial'],
+        currency = Currency.objects.get(code=guest_user_data.foreign_currency_account['currency'])
+    )
+    wallet = Account.objects.create(
+        user = user, 
+        name = guest_user_data.wallet["name"],
+        balance = guest_user_data.wallet['initial'],
+        initial = guest_user_data.wallet['initial'],
+        currency = Currency.objects.get(code=guest_user_data.wallet['currency'])
+    )
+    loan = Loan.objects.create(
+        user = user, 
+        name = guest_user_data.loan["name"],
+        initial = guest_user_data.loan['initial'],
+        balance = guest_user_data.loan['initial'],
+        currency = Currency.objects.get(code=guest_user_data.loan['currency'])
+    )
+    credit_card = CreditCard.objects.create(
+        user = user, 
+        name = guest_user_data.credit_card["name"],
+        payment_day = guest_user_data.credit_card['payment_day'],
+        currency = Currency.objects.get(code=guest_user_data.credit_card['currency'])
+    )
+    user_accounts = {
+        'bank_account': bank_account,
+        'wallet': wallet,
+        'loan': loan,
+        'credit_card': credit_card,
+        'foreign_currency_account': foreign_currency_account
+    }
+    # created is an auto_now_add field, so backdate assets with an update
+    for asset in user_accounts.values():
+        type(asset).objects.filter(pk=asset.pk).update(created=created)
+        asset.created = created
     return user_accounts
 
 def get_guest_user_expense_categories(user):
@@ -1046,29 +1251,271 @@ def create_guest_user_data(user):
             type = 'I'
         )
     edit_guest_user_assets_balance(user)
+    rebuild_category_monthly_totals(user)
     refresh_user_accounts_objects(user_accounts)
     create_guest_user_transfers(user, user_accounts)
     create_guest_user_debt_payments(user, user_accounts)
 
+GUEST_USER_SNAPSHOT_KEY = "main:guest_user_snapshot"
+GUEST_USER_ASSET_MODELS = {"account": Account, "creditcard": CreditCard, "loan": Loan}
+
+def get_category_keys(user):
+    """
+    Takes a user and returns a dictionary in which keys are category ids and values are
+    (type, main category name, name) tuples identifying the category in any user's tree.
+    """
+    categories = list(Category.objects.filter(user=user).values("id", "tree_id", "level", "type", "name"))
+    main_categories = {category["tree_id"]: category["name"] for category in categories if category["level"] == 0}
+    return {
+        category["id"]: (category["type"], main_categories[category["tree_id"]], category["name"])
+        for category in categories
+    }
+
+def build_guest_user_snapshot():
+    """
+    Creates demo data for a temporary guest user with create_guest_user_data and returns
+    it as a dictionary that doesn't contain any ids. All changes are rolled back.
+    """
+    with transaction.atomic():
+        user = create_guest_user()
+        create_guest_user_data(user)
+        category_keys = get_category_keys(user)
+        assets = {}
+        for asset_kind, model in GUEST_USER_ASSET_MODELS.items():
+            rows = model.objects.filter(user=user).annotate(currency_code=F("currency__code")).values()
+            for row in rows:
+                for field in ["user_id", "currency_id", "updated"]:
+                    row.pop(field)
+                assets[(asset_kind, row.pop("id"))] = row
+        transactions = []
+        transaction_indexes = {}
+        for row in Transaction.objects.filter(user=user).order_by("created", "id").values():
+            transaction_indexes[row["id"]] = len(transactions)
+            transactions.append({
+                "asset": (row["asset_kind"], row["object_id"]),
+                "category": category_keys.get(row["category_id"]),
+                "name": row["name"],
+                "amount": row["amount"],
+                "date": row["date"],
+                "type": row["type"],
+                "installments": row["installments"],
+            })
+        transfers = [
+            {
+                "from_transaction": transaction_indexes[row["from_transaction_id"]],
+                "to_transaction": transaction_indexes[row["to_transaction_id"]],
+                "date": row["date"],
+            }
+            for row in Transfer.objects.filter(user=user).values("from_transaction_id", "to_transaction_id", "date")
+        ]
+        transaction.set_rollback(True)
+    return {"date": date.today(), "assets": assets, "transactions": transactions, "transfers": transfers}
+
+def refresh_guest_user_snapshot():
+    """
+    Builds the guest user snapshot and caches it. The cached snapshot doesn't expire,
+    fill_guest_user_pool replaces it once a day, so guest logins don't build it.
+    """
+    snapshot = build_guest_user_snapshot()
+    cache.set(GUEST_USER_SNAPSHOT_KEY, snapshot, None)
+    return snapshot
+
+def get_guest_user_snapshot():
+    """
+    Returns the cached guest user snapshot. It is only built here if the cache lost it.
+    """
+    return cache.get(GUEST_USER_SNAPSHOT_KEY) or refresh_guest_user_snapshot()
+
+def create_transaction_summaries(transactions):
+    """
+    Creates the CategoryMonthlyTotal, TransactionName and BalanceSnapshot objects of saved
+    transactions whose assets have no other transactions, as the rebuild functions would,
+    in one pass over the transaction objects instead of three over the database.
+    """
+    totals = {}
+    names = {}
+    changes = {}
+    openings = {}
+    for transaction_obj in transactions:
+        asset = transaction_obj.content_object
+        if transaction_obj.asset_kind == 'account' and transaction_obj.category_id:
+            key = (
+                asset.user_id, transaction_obj.category_id, asset.currency_id,
+                transaction_obj.date.year, transaction_obj.date.month, transaction_obj.type,
+            )
+            total, count = totals.get(key, (0, 0))
+            totals[key] = (total + transaction_obj.amount, count + 1)
+        if transaction_obj.asset_kind in TRANSACTION_NAME_ASSET_KINDS:
+            key = (transaction_obj.user_id, transaction_obj.type, transaction_obj.name)
+            count, last_used = names.get(key, (0, transaction_obj.date))
+            names[key] = (count + 1, max(last_used, transaction_obj.date))
+        asset_key = (transaction_obj.content_type_id, transaction_obj.object_id)
+        openings[asset_key] = (asset.user_id, asset.initial)
+        key = (*asset_key, transaction_obj.date)
+        changes[key] = changes.get(key, 0) + get_balance_delta(transaction_obj)
+    CategoryMonthlyTotal.objects.bulk_create([
+        CategoryMonthlyTotal(
+            user_id=user_id, category_id=category_id, currency_id=currency_id,
+            year=year, month=month, type=type, total=total, count=count,
+        )
+        for (user_id, category_id, currency_id, year, month, type), (total, count) in totals.items()
+    ])
+    TransactionName.objects.bulk_create([
+        TransactionName(
+            user_id=user_id, type=type, name=name, search_name=name.lower(), count=count, last_used=last_used
+        )
+        for (user_id, type, name), (count, last_used) in names.items()
+    ])
+    create_balance_snapshots(openings, [(*key, change) for key, change in sorted(changes.items())])
+
+def clone_guest_user_data(user, snapshot=None):
+    """
+    Creates demo data of a guest user from the guest user snapshot with a few bulk inserts.
+    Dates are shifted by the number of days passed since the snapshot was built.
+    """
+    snapshot = snapshot or get_guest_user_snapshot()
+    shift = date.today() - snapshot["date"]
+    currencies = dict(Currency.objects.values_list("code", "id"))
+    category_ids = {key: category_id for category_id, key in get_category_keys(user).items()}
+    assets = {}
+    for asset_kind, model in GUEST_USER_ASSET_MODELS.items():
+        rows = {key: row for key, row in snapshot["assets"].items() if key[0] == asset_kind}
+        objects = {}
+        for key, row in rows.items():
+            fields = {field: value for field, value in row.items() if field not in ["created", "currency_code"]}
+            objects[key] = model(user=user, currency_id=currencies[row["currency_code"]], **fields)
+        model.objects.bulk_create(objects.values())
+        # created is an auto_now_add field, so backdate assets with an update
+        for created in {row["created"] for row in rows.values()}:
+            keys = [key for key, row in rows.items() if row["created"] == created]
+            model.objects.filter(pk__in=[objects[key].pk for key in keys]).update(created=created + shift)
+        assets.update(objects)
+    transactions = []
+    for row in snapshot["transactions"]:
+        transaction_obj = Transaction(
+            content_object=assets[row["asset"]],
+            category_id=category_ids.get(row["category"]),
+            name=row["name"],
+            amount=row["amount"],
+            date=row["date"] + shift,
+            type=row["type"],
+            installments=row["installments"],
+        )
+        transaction_obj.set_derived_fields()
+        transactions.append(transaction_obj)
+    Transaction.objects.bulk_create(transactions)
+    Transfer.objects.bulk_create([
+        Transfer(
+            user=user,
+            from_transaction=transactions[row["from_transaction"]],
+            to_transaction=transactions[row["to_transaction"]],
+            date=row["date"] + shift,
+        )
+        for row in snapshot["transfers"]
+    ])
+    create_transaction_summaries(transactions)
+    bump_ledger_version(user)
+
+# Pool metrics are counters in the default cache, shared by all workers through the database
+# cache. With a per-process CACHE_URL such as locmem:// each worker reports only its own
+# claims. Increments are a read and a write, so concurrent claims may be undercounted.
+GUEST_USER_POOL_METRICS_KEY = "main:guest_user_pool:{name}"
+
+def create_pooled_guest_user():
+    with transaction.atomic():
+        user = create_guest_user()
+        clone_guest_user_data(user)
+        PooledGuestUser.objects.create(user=user)
+    return user
+
+def fill_guest_user_pool(size=None):
+    """
+    Deletes pooled guest users whose demo data is from a previous day and creates new
+    ones until the pool has the given number of users. The guest user snapshot is rebuilt
+    first if it is from a previous day. Returns the number of created users.
+    """
+    size = settings.GUEST_USER_POOL_SIZE if size is None else size
+    snapshot = cache.get(GUEST_USER_SNAPSHOT_KEY)
+    if snapshot is None or snapshot["date"] < date.today():
+        refresh_guest_user_snapshot()
+    User.objects.filter(pooled_guest_user__created__lt=date.today()).delete()
+    missing = size - PooledGuestUser.objects.filter(created=date.today()).count()
+    for _ in range(missing):
+        create_pooled_guest_user()
+    return max(missing, 0)
+
+def claim_pooled_guest_user():
+    """
+    Takes a guest user out of the pool and returns it, or None if the pool is empty.
+    Rows locked by concurrent claims are skipped instead of waited for.
+    """
+    with transaction.atomic():
+        pooled_guest_user = (
+            PooledGuestUser.objects.select_for_update(skip_locked=True)
+            .filter(created=date.today())
+            .order_by("id")
+            .first()
+        )
+        if pooled_guest_user is None:
+            return None
+        pooled_guest_user.delete()
+    return User.objects.get(pk=pooled_guest_user.user_id)
+
+def increment_guest_user_pool_metric(name, delta=1):
+    key = GUEST_USER_POOL_METRICS_KEY.format(name=name)
+    cache.add(key, 0, None)
+    cache.incr(key, delta)
+
+def record_guest_user_pool_claim(seconds, claimed):
+    increment_guest_user_pool_metric("claims" if claimed else "misses")
+    increment_guest_user_pool_metric("claim_microseconds", int(seconds * 1_000_000))
+
+def get_guest_user_pool_metrics():
+    """
+    Returns current pool depth, number of claims served from the pool, number of misses
+    that created a guest user in the request and average claim latency in milliseconds.
+    Counters are read from the default cache, so they cover every worker sharing it.
+    """
+    names = ["claims", "misses", "claim_microseconds"]
+    values = cache.get_many([GUEST_USER_POOL_METRICS_KEY.format(name=name) for name in names])
+    claims, misses, claim_microseconds = [
+        values.get(GUEST_USER_POOL_METRICS_KEY.format(name=name), 0) for name in names
+    ]
+    requests = claims + misses
+    return {
+        "depth": PooledGuestUser.objects.filter(created=date.today()).count(),
+        "claims": claims,
+        "misses": misses,
+        "average_claim_ms": round(claim_microseconds / requests / 1000, 3) if requests else None,
+    }
+
 @transaction.atomic
 def setup_guest_user(request):
-    user = create_guest_user()
+    start = time.perf_counter()
+    user = claim_pooled_guest_user()
+    record_guest_user_pool_claim(time.perf_counter() - start, user is not None)
+    if user is None:
+        user = create_guest_user()
+        clone_guest_user_data(user)
     login(request, user)
     session_obj = get_session_from_db(request)
     user_session = GuestUserSession.objects.create(user=user, session=session_obj)
-    create_guest_user_data(user)
     return user
 
 def create_balance_adjustment_transaction(account, balance_diff):
     type = 'I' if balance_diff>0 else 'E'
     category = Category.objects.get(type=type, user=account.user, name="Balance Adjustment")
-    Transaction.objects.create(
+    transaction_obj = Transaction.objects.create(
         content_object=account, 
         type=type, 
         amount=abs(balance_diff), 
         category=category,
         name='Balance Adjustment'
     )
+    # the asset balance is saved by the edit form, only its snapshots follow the adjustment
+    apply_balance_snapshot_delta(account.__class__, account.pk, transaction_obj.date, get_balance_delta(transaction_obj))
+    edit_category_monthly_total(transaction_obj)
+    edit_transaction_name_usage(transaction_obj)
     
 @receiver(post_save, sender=User)
 def create_user_categories(sender, instance, created, **kwargs):
@@ -1081,3 +1528,25 @@ def create_user_categories(sender, instance, created, **kwargs):
 def create_user_preferences(sender, instance, created, **kwargs):
     if created:
         UserPreferences.objects.create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def reset_ledger_version(sender, instance, created, **kwargs):
+    if created:
+        bump_ledger_version(instance)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+@receiver(post_save, sender=CreditCard)
+@receiver(post_delete, sender=CreditCard)
+@receiver(post_save, sender=Loan)
+@receiver(post_delete, sender=Loan)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_save, sender=Transfer)
+@receiver(post_delete, sender=Transfer)
+def bump_owner_ledger_version(sender, instance, **kwargs):
+    bump_ledger_version(instance.user_id)
@@ -1,14 +1,18 @@
 import datetime
 from .models import Account, Category, Transaction, Transfer, CreditCard
+from .category_tree import get_category_tree
+from .pagination import get_cursor_page
+from .export import EXPORT_FORMATS, get_export_response
+from .reports import get_ins_outs_report
+from .snapshots import get_balance_at
 from .utils import (
     get_category_stats,
     get_comparison_stats,
-    get_ins_outs_report,
-    get_report_total,
     get_subcategory_stats,
     get_multi_currency_category_stats,
     get_multi_currency_main_category_stats,
-    get_multi_currency_category_detail_stats,
+    get_monthly_total_main_category_stats,
+    get_monthly_total_category_stats,
     get_multi_currency_category_json_stats,
     get_stats,
     get_credit_card_payment_plan,
@@ -18,9 +22,79 @@ from django.http import JsonResponse, Http404
 from django.contrib.auth.mixins import UserPassesTestMixin, LoginRequiredMixin
 from django.conf import settings
 from django.db.models import Q
+from django.db.models.functions import Coalesce
 
 
-class TransactionsDateArchiveMixin(LoginRequiredMixin):
+class MonthlyTotalPeriodMixin:
+    """
+    Provides the archive period as CategoryMonthlyTotal lookups for date archive views.
+    """
+
+    def get_monthly_total_period(self):
+        """
+        Returns a dictionary of year and month lookups of the archive period or None if 
+        the period (week or day) can not be built from monthly totals.
+        """
+        if "week" in self.kwargs or "day" in self.kwargs:
+            return None
+        return {key: self.kwargs[key] for key in ("year", "month") if key in self.kwargs}
+
+
+class CursorPaginationMixin:
+    """
+    Paginates date archive views with cursors (see main.pagination) instead of offsets.
+    Requests with a page parameter are still paginated by page number.
+    """
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.page_kwarg in self.kwargs or self.page_kwarg in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            page = get_cursor_page(queryset, self.request.GET.get("cursor", ""), page_size)
+        except ValueError:
+            raise Http404("Invalid cursor.")
+        return None, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["cursor_pagination"] = context.get("paginator") is None
+        return context
+
+
+class ExportMixin:
+    """
+    Streams the object list of a date archive view as CSV or JSON lines when the export
+    parameter is given (see main.export). export_fields maps column names to field
+    lookups or expressions.
+    """
+
+    export_fields = {}
+    export_name = None
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get("export")
+        if export_format is None:
+            return super().get(request, *args, **kwargs)
+        if export_format not in EXPORT_FORMATS:
+            raise Http404("Invalid export format.")
+        _, queryset, _ = self.get_dated_items()
+        return get_export_response(queryset, self.export_fields, export_format, self.get_export_filename())
+
+    def get_export_filename(self):
+        period = [str(self.kwargs[key]) for key in ("year", "month", "week", "day") if key in self.kwargs]
+        return "-".join([self.export_name] + period)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["export_formats"] = EXPORT_FORMATS
+        return context
+
+
+TRANSACTION_ASSET_NAME = Coalesce("account__name", "credit_card__name")
+TRANSACTION_CURRENCY = Coalesce("account__currency__code", "credit_card__currency__code")
+
+
+class TransactionsDateArchiveMixin(ExportMixin, CursorPaginationMixin, LoginRequiredMixin):
     model = Transaction
     date_field = "date"
     paginate_by = settings.DEFAULT_PAGINATION_QTY
@@ -35,28 +109,31 @@ class TransactionsDateArchiveMixin(LoginRequiredMixin):
     template_name = "main/group_table_paginator.html"
     make_object_list = True
     month_format = "%m"
+    export_name = "transactions"
+    export_fields = {
+        "date": "date",
+        "name": "name",
+        "type": "type",
+        "amount": "amount",
+        "currency": TRANSACTION_CURRENCY,
+        "category": "category__name",
+        "asset": TRANSACTION_ASSET_NAME,
+        "asset_type": "asset_kind",
+        "installments": "installments",
+    }
 
     def get_queryset(self):
-        user_accounts_list = Account.objects.filter(
-            user=self.request.user
-        ).values_list("pk", flat=True)
-        user_cards_list = CreditCard.objects.filter(
-            user=self.request.user
-        ).values_list("pk", flat=True)
         return (
             super()
             .get_queryset()
-            .filter(
-                Q(content_type__model="account") & Q(object_id__in=user_accounts_list) |
-                Q(content_type__model="creditcard") & Q(object_id__in=user_cards_list)
-            )
-            .exclude(Q(content_type__model='creditcard') & Q(category__name='Pay Card'))
+            .filter(user=self.request.user, asset_kind__in=["account", "creditcard"])
+            .exclude(Q(asset_kind='creditcard') & Q(category__name='Pay Card'))
             .exclude(Q(category__is_protected=True) & Q(category__name='Balance Adjustment'))
             .order_by("-date", "-created")
         )
 
 
-class TransfersDateArchiveMixin(LoginRequiredMixin):
+class TransfersDateArchiveMixin(ExportMixin, CursorPaginationMixin, LoginRequiredMixin):
     model = Transfer
     date_field = "date"
     paginate_by = settings.DEFAULT_PAGINATION_QTY
@@ -70,6 +147,16 @@ class TransfersDateArchiveMixin(LoginRequiredMixin):
     template_name = "main/group_table_paginator.html"
     make_object_list = True
     month_format = "%m"
+    export_name = "transfers"
+    export_fields = {
+        "date": "date",
+        "from_account": "from_transaction__account__name",
+        "from_amount": "from_transaction__amount",
+        "from_currency": "from_transaction__account__currency__code",
+        "to_account": "to_transaction__account__name",
+        "to_amount": "to_transaction__amount",
+        "to_currency": "to_transaction__account__currency__code",
+    }
 
     def get_queryset(self):
         excluded_categories = ['Pay Loan', 'Pay Card']
@@ -82,7 +169,7 @@ class TransfersDateArchiveMixin(LoginRequiredMixin):
         )
 
 
-class InsOutsDateArchiveMixin(LoginRequiredMixin):
+class InsOutsDateArchiveMixin(ExportMixin, MonthlyTotalPeriodMixin, LoginRequiredMixin):
 
     model = Transaction
     date_field = "date"
@@ -94,6 +181,17 @@ class InsOutsDateArchiveMixin(LoginRequiredMixin):
     extra_context = {"table_template": "main/table_transactions.html"}
     make_object_list = True
     month_format = "%m"
+    # the export holds the transactions behind the report, not the report rows
+    export_name = "ins-outs-transactions"
+    export_fields = {
+        "date": "date",
+        "name": "name",
+        "type": "type",
+        "amount": "amount",
+        "currency": "account__currency__code",
+        "category": "category__name",
+        "account": "account__name",
+    }
 
     def get_queryset(self):
         return (
@@ -109,12 +207,8 @@ class InsOutsDateArchiveMixin(LoginRequiredMixin):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         transactions = self.object_list
-        expense_category_stats = get_multi_currency_main_category_stats(
-            transactions, "E", self.request.user
-        )
-        income_category_stats = get_multi_currency_main_category_stats(
-            transactions, "I", self.request.user
-        )
+        expense_category_stats = self.get_main_category_stats(transactions, "E")
+        income_category_stats = self.get_main_category_stats(transactions, "I")
         comparison_stats = get_comparison_stats(
             expense_category_stats, income_category_stats
         )
@@ -132,8 +226,18 @@ class InsOutsDateArchiveMixin(LoginRequiredMixin):
         context.update(extra_context)
         return context
 
+    def get_main_category_stats(self, transactions, category_type):
+        period = self.get_monthly_total_period()
+        if period is None:
+            return get_multi_currency_main_category_stats(
+                transactions, category_type, self.request.user
+            )
+        return get_monthly_total_main_category_stats(
+            self.request.user, category_type, period
+        )
+
 
-class CategoryDateArchiveMixin(UserPassesTestMixin, LoginRequiredMixin):
+class CategoryDateArchiveMixin(MonthlyTotalPeriodMixin, UserPassesTestMixin, LoginRequiredMixin):
     model = Transaction
     date_field = "date"
     paginate_by = settings.DEFAULT_PAGINATION_QTY
@@ -162,22 +266,28 @@ class CategoryDateArchiveMixin(UserPassesTestMixin, LoginRequiredMixin):
         )
 
     def get_category(self):
-        category_id = self.kwargs.get("pk")
-        self.category = get_object_or_404(Category, pk=category_id)
+        if getattr(self, "category", None) is None:
+            self.category = get_object_or_404(Category, pk=self.kwargs.get("pk"))
         return self.category
 
     def get_category_descendants(self):
         """
-        returns a queryset of current category and it's descendants.
+        returns a list of ids of current category and it's descendants.
         """
         category = self.get_category()
-        return category.get_descendants(include_self=True)
+        return get_category_tree(category.user_id, category.id).get_descendant_ids(category.id)
 
     def get_context_data(self, **kwargs):
-        transactions = self.get_dated_items()[1]
-        category_stats = get_multi_currency_category_stats(
-            transactions, self.category, self.request.user
-        )
+        period = self.get_monthly_total_period()
+        if period is None:
+            transactions = self.get_dated_items()[1]
+            category_stats = get_multi_currency_category_stats(
+                transactions, self.category, self.request.user
+            )
+        else:
+            category_stats = get_monthly_total_category_stats(
+                self.category, self.request.user, period
+            )
         kwargs.update(
             {
                 "category": self.category,
@@ -190,7 +300,7 @@ class CategoryDateArchiveMixin(UserPassesTestMixin, LoginRequiredMixin):
         return super().get_context_data(**kwargs)
 
 
-class AccountDetailDateArchiveMixin(UserPassesTestMixin, LoginRequiredMixin):
+class AccountDetailDateArchiveMixin(CursorPaginationMixin, UserPassesTestMixin, LoginRequiredMixin):
 
     template_name = "main/group_account_bar_table_chart_script.html"
     model = Transaction
@@ -224,9 +334,19 @@ class AccountDetailDateArchiveMixin(UserPassesTestMixin, LoginRequiredMixin):
             .prefetch_related("content_object__currency")
         )
 
+    def get_period_end_balance(self, extra_context):
+        """
+        Returns the closing balance of the account at the end of the archive period, or
+        the current balance for archives that aren't limited to a period.
+        """
+        for key in ["next_day", "next_week", "next_month", "next_year"]:
+            if extra_context.get(key):
+                return get_balance_at(self.account, extra_context[key] - datetime.timedelta(days=1))
+        return self.account.balance
+
     def get_context_data(self, **kwargs):
-        transactions = self.get_dated_items()[1]
-        stats = get_stats(transactions, self.account.balance)
+        date_list, transactions, extra_context = self.get_dated_items()
+        stats = get_stats(transactions, self.get_period_end_balance(extra_context))
         expense_category_stats = get_category_stats(
             transactions, "E", None, self.request.user
         )
@@ -323,7 +443,7 @@ class SubcategoryDateArchiveMixin(UserPassesTestMixin, LoginRequiredMixin):
         return JsonResponse(data)
 
 
-class CreditCardDetailDateArchiveMixin(UserPassesTestMixin, LoginRequiredMixin):
+class CreditCardDetailDateArchiveMixin(CursorPaginationMixin, UserPassesTestMixin, LoginRequiredMixin):
 
     template_name = "main/group_table_paginator_chart_script.html"
     model = Transaction
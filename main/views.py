@@ -1,3 +1,4 @@
+import io
 from datetime import datetime, date
 from django.shortcuts import render, get_object_or_404
 from django.views import View
@@ -46,8 +47,10 @@ from .forms import (
     SetupForm,
     EditTransactionForm,
     CreateCreditCardForm,
-    PayCreditCardForm
+    PayCreditCardForm,
+    TransactionImportForm,
 )
+from .assets import get_asset_snapshot
 from .view_mixins import (
     InsOutsDateArchiveMixin,
     CategoryDateArchiveMixin,
@@ -62,6 +65,8 @@ from .utils import (
     edit_asset_balance,
     get_latest_transactions,
     get_latest_transfers,
+    get_dashboard_snapshot,
+    set_form_choices,
     get_account_data,
     get_account_balance_data,
     get_loan_data,
@@ -80,9 +85,6 @@ from .utils import (
     get_comparison_stats,
     get_subcategory_stats,
     get_loan_progress,
-    get_payment_stats,
-    get_worth_stats,
-    get_total_worth_stats,
     get_currency_details,
     get_users_grand_total,
     withdraw_asset_balance,
@@ -91,15 +93,24 @@ from .utils import (
     handle_asset_delete,
     handle_transfer_delete,
     handle_transfer_edit,
-    get_ins_outs_report,
-    get_report_total,
-    get_multi_currency_category_detail_stats,
     get_multi_currency_category_json_stats,
     setup_guest_user,
+    get_guest_user_pool_metrics,
     create_balance_adjustment_transaction,
+    edit_category_monthly_total,
+    withdraw_category_monthly_total,
+    edit_transaction_name_usage,
+    withdraw_transaction_name_usage,
+    get_transaction_name_suggestions,
+    rebuild_category_monthly_totals,
 )
+from .net_worth import get_net_worth_stats
+from .balances import batch_balance_updates
+from .loan_analytics import get_loan_analytics
+from .transaction_import import TransactionImportError, get_file_format, import_transactions
 from django.db import IntegrityError
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.db import transaction
 from django.db.models import Q
 from django.contrib import messages
@@ -117,6 +128,10 @@ def test_drive(request):
     user = setup_guest_user(request)
     return HttpResponseRedirect(reverse("main:main"))
 
+@staff_member_required
+def guest_user_pool_metrics(request):
+    return JsonResponse({"status": 200, "data": get_guest_user_pool_metrics()})
+
 @login_required(login_url=reverse_lazy("main:login"))
 def main(request):
     transfer_form = TransferForm(user=request.user)
@@ -126,7 +141,7 @@ def main(request):
     if request.method == "POST":
         # transfer form operations
         if request.POST.get("submit-transfer"):
-            form = TransferForm(request.POST, user=request.user)
+            form = TransferForm(request.POST, user=request.user, assets=get_asset_snapshot(request))
             if form.is_valid():
                 data = form.cleaned_data
                 try:
@@ -166,17 +181,24 @@ def main(request):
                     messages.error(request, error)
                 income_form = form
 
-    context = {
+    dashboard = get_dashboard_snapshot(request.user)
+    forms = {
         "expense_form": expense_form,
         "income_form": income_form,
         "transfer_form": transfer_form,
-        "transactions": get_latest_transactions(request.user, 5),
-        "transfers": get_latest_transfers(request.user, 5),
-        "account_data": get_account_data(request.user),
-        "account_balance_data": get_account_balance_data(request.user),
+    }
+    for name, form in forms.items():
+        if not form.is_bound:
+            set_form_choices(form, dashboard["form_choices"][name])
+    context = {
+        **forms,
+        "transactions": dashboard["transactions"],
+        "transfers": dashboard["transfers"],
+        "account_data": dashboard["account_data"],
+        "account_balance_data": dashboard["account_balance_data"],
         "show_account": True,
-        "has_card": CreditCard.objects.filter(user=request.user, is_active=True).exists(),
-        "has_loan": Loan.objects.filter(user=request.user, is_active=True).exists(),
+        "has_card": dashboard["has_card"],
+        "has_loan": dashboard["has_loan"],
     }
     return render(request, "main/main.html", context)
 
@@ -187,15 +209,7 @@ def transaction_name_autocomplete(request):
     type = request.GET.get("type", None)
     name_list = []
     if name_query:
-        user = request.user
-        accounts_list = Account.objects.filter(
-            user=user, is_active=True
-        ).values_list("id", flat=True)
-        incomes = Transaction.objects.filter(
-            object_id__in=accounts_list, name__icontains=name_query, type=type
-        )
-        for income in incomes:
-            name_list.append(income.name)
+        name_list = get_transaction_name_suggestions(request.user, name_query, type)
     return JsonResponse({"status": 200, "data": name_list})
 
 
@@ -382,6 +396,8 @@ class EditAccountView(SuccessMessageMixin, LoginRequiredMixin, UpdateView):
                 if balance_diff:
                     create_balance_adjustment_transaction(self.object, balance_diff)
                 self.object = form.save()
+                if "currency" in form.changed_data:
+                    rebuild_category_monthly_totals(self.request.user)
         except IntegrityError:
             messages.error(
                 self.request,
@@ -404,9 +420,10 @@ class DeleteAccountView(LoginRequiredMixin, DeleteView):
         )
 
     def form_valid(self, form):
-        handle_asset_delete(self.object)
-        self.object.is_active = False
-        self.object.save()
+        with transaction.atomic():
+            handle_asset_delete(self.object)
+            self.object.is_active = False
+            self.object.save(update_fields=["is_active"])
         messages.success(self.request, f"{self.object.name} account was deleted successfully.")
         return HttpResponseRedirect(self.get_success_url())
 
@@ -461,7 +478,7 @@ class PayCreditCardView(SuccessMessageMixin, LoginRequiredMixin, FormView):
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs.update({"user": self.request.user})
+        kwargs.update({"user": self.request.user, "assets": get_asset_snapshot(self.request)})
         return kwargs
 
     def form_valid(self, form):
@@ -475,11 +492,12 @@ class PayCreditCardView(SuccessMessageMixin, LoginRequiredMixin, FormView):
 
     def get_context_data(self, **kwargs):
         if "form" not in kwargs:
-            kwargs["form"] = self.form_class(user=self.request.user)
-        account_data = get_account_data(self.request.user)
-        card_data = get_credit_card_data(self.request.user)
-        card_balance_data = get_credit_card_balance_data(self.request.user)
-        account_balance_data = get_account_balance_data(self.request.user)
+            kwargs["form"] = self.form_class(user=self.request.user, assets=get_asset_snapshot(self.request))
+        assets = get_asset_snapshot(self.request)
+        account_data = get_account_data(self.request.user, assets)
+        card_data = get_credit_card_data(self.request.user, assets)
+        card_balance_data = get_credit_card_balance_data(self.request.user, assets)
+        account_balance_data = get_account_balance_data(self.request.user, assets)
         context = {
             "account_data": account_data,
             "card_data": card_data,
@@ -502,9 +520,10 @@ class DeleteCreditCardView(LoginRequiredMixin, DeleteView):
         )
 
     def form_valid(self, form):
-        handle_asset_delete(self.object)
-        self.object.is_active = False
-        self.object.save()
+        with transaction.atomic():
+            handle_asset_delete(self.object)
+            self.object.is_active = False
+            self.object.save(update_fields=["is_active"])
         messages.success(self.request, f"Credit card {self.object.name} was deleted successfully.")
         return HttpResponseRedirect(self.get_success_url())
 
@@ -610,9 +629,10 @@ class DeleteLoanView(LoginRequiredMixin, DeleteView):
         )
 
     def form_valid(self, form):
-        handle_asset_delete(self.object)
-        self.object.is_active = False
-        self.object.save()
+        with transaction.atomic():
+            handle_asset_delete(self.object)
+            self.object.is_active = False
+            self.object.save(update_fields=["is_active"])
         messages.success(self.request, f"{self.object.name} loan was deleted successfully.")
         return HttpResponseRedirect(self.get_success_url())
 
@@ -641,7 +661,7 @@ class LoanDetailView(LoginRequiredMixin, DetailView):
         extra_context = {
             "progress": get_loan_progress(self.object),
             "transactions": page_obj,
-            "payment_stats": get_payment_stats(self.object),
+            "payment_stats": get_loan_analytics(self.object),
             "form": form,
         }
         return super().get_context_data(**extra_context)
@@ -716,7 +736,7 @@ class PayLoanView(SuccessMessageMixin, LoginRequiredMixin, FormView):
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs.update({"user": self.request.user})
+        kwargs.update({"user": self.request.user, "assets": get_asset_snapshot(self.request)})
         return kwargs
 
     def form_valid(self, form):
@@ -730,11 +750,12 @@ class PayLoanView(SuccessMessageMixin, LoginRequiredMixin, FormView):
 
     def get_context_data(self, **kwargs):
         if "form" not in kwargs:
-            kwargs["form"] = self.form_class(user=self.request.user)
-        account_data = get_account_data(self.request.user)
-        loan_data = get_loan_data(self.request.user)
-        loan_balance_data = get_loan_balance_data(self.request.user)
-        account_balance_data = get_account_balance_data(self.request.user)
+            kwargs["form"] = self.form_class(user=self.request.user, assets=get_asset_snapshot(self.request))
+        assets = get_asset_snapshot(self.request)
+        account_data = get_account_data(self.request.user, assets)
+        loan_data = get_loan_data(self.request.user, assets)
+        loan_balance_data = get_loan_balance_data(self.request.user, assets)
+        account_balance_data = get_account_balance_data(self.request.user, assets)
         context = {
             "account_data": account_data,
             "loan_data": loan_data,
@@ -940,10 +961,10 @@ class WorthView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         kwargs = super().get_context_data(**kwargs)
-        stats = get_worth_stats(self.request.user)
+        stats, total_stats = get_net_worth_stats(self.request.user)
         extra_context = {
             "stats": stats,
-            "total_stats": get_total_worth_stats(self.request.user, stats),
+            "total_stats": total_stats,
             "currency_details": get_currency_details(self.request.user),
         }
         extra_context["grand_total"] = get_users_grand_total(
@@ -1003,12 +1024,16 @@ class EditTransactionView(LoginRequiredMixin, UpdateView):
 
     def form_valid(self, form):
         try:
-            with transaction.atomic():
-                withdraw_asset_balance(
-                    self.get_object()
-                )  # get initial object from get_object method
+            with batch_balance_updates():
+                # lock the stored transaction so a concurrent edit can't be withdrawn twice
+                initial_object = self.get_queryset().select_for_update().get(pk=self.object.pk)
+                withdraw_asset_balance(initial_object)
+                withdraw_category_monthly_total(initial_object)
+                withdraw_transaction_name_usage(initial_object)
                 self.object = form.save()
                 edit_asset_balance(self.object)
+                edit_category_monthly_total(self.object)
+                edit_transaction_name_usage(self.object)
                 messages.success(self.request, "Transaction edited successfully.")
         except IntegrityError:
             messages.error(self.request, "Error during transaction update")
@@ -1017,6 +1042,30 @@ class EditTransactionView(LoginRequiredMixin, UpdateView):
         return HttpResponseRedirect(self.get_success_url())
 
 
+class ImportTransactionsView(LoginRequiredMixin, FormView):
+    form_class = TransactionImportForm
+    success_url = reverse_lazy("main:transactions")
+    template_name = "main/transaction_import.html"
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs.update({"user": self.request.user})
+        return kwargs
+
+    def form_valid(self, form):
+        upload = form.cleaned_data["file"]
+        lines = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        try:
+            count = import_transactions(
+                self.request.user, lines, get_file_format(upload.name), form.cleaned_data["account"]
+            )
+        except (TransactionImportError, UnicodeDecodeError) as e:
+            form.add_error("file", str(e))
+            return self.form_invalid(form)
+        messages.success(self.request, f"{count} transactions imported successfully.")
+        return super().form_valid(form)
+
+
 class DeleteTransactionView(LoginRequiredMixin, DeleteView):
     model = Transaction
     success_url = reverse_lazy("main:transactions")
@@ -1105,7 +1154,7 @@ class EditTransferView(LoginRequiredMixin, UpdateView):
         kwargs = super().get_context_data(**kwargs)
         kwargs.update(
             {
-                "account_data": get_account_data(self.request.user),
+                "account_data": get_account_data(self.request.user, get_asset_snapshot(self.request)),
             }
         )
         return kwargs
@@ -1120,7 +1169,7 @@ class EditTransferView(LoginRequiredMixin, UpdateView):
             "date": self.object.date,
             "user": self.request.user,
         }
-        kwargs.update({"user": self.request.user})
+        kwargs.update({"user": self.request.user, "assets": get_asset_snapshot(self.request)})
         kwargs["data"] = kwargs.get("data", data)
         del kwargs["instance"]
         return kwargs
@@ -1,15 +1,6 @@
 '''
 This file reads data from rates.json and creates Rate objects.
 '''
-import json
-from main.models import Currency, Rate
+from django.core.management import call_command
 
-with open('rates.json', 'r') as f:
-    data = json.load(f)
-
-rates = data['rates']
-
-currencies = Currency.objects.all()
-for currency in currencies:
-    rate = Rate(currency=currency, rate=rates[currency.code])
-    rate.save()
\ No newline at end of file
+call_command("refresh_rates", file="rates.json")
@@ -109,6 +109,12 @@ WSGI_APPLICATION = "wallet.wsgi.application"
 
 DATABASES = {"default": env.db()}
 
+# Cache shared by all workers and processes, so version stamps (rates, category trees,
+# dashboards), invalidations, the guest user reaper lock and guest user pool metrics reach
+# every gunicorn worker. Defaults to the database cache table created by build.sh; set
+# CACHE_URL (e.g. a redis url) to use another shared backend.
+CACHES = {"default": env.cache("CACHE_URL", default="dbcache://cache_table")}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -180,3 +186,13 @@ INTERNAL_IPS = [
 ]
 
 CURRENCY_RATES_API_KEY = env("CURRENCY_RATES_API_KEY")
+
+# Seconds a worker uses its in-memory currency rates before checking the shared rates version.
+CURRENCY_RATES_CHECK_INTERVAL = 10
+
+# Number of ready guest users kept by the fill_guest_user_pool command.
+GUEST_USER_POOL_SIZE = env.int("GUEST_USER_POOL_SIZE", default=10)
+
+# Seconds between in-process runs of the expired guest user reaper. Web workers take turns
+# through a lock in the default cache. 0 disables it.
+GUEST_USER_REAPER_INTERVAL = env.int("GUEST_USER_REAPER_INTERVAL", default=0)
@@ -15,4 +15,11 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wallet.settings")
 
 application = get_wsgi_application()
 
+from django.conf import settings  # noqa: E402
+
+if settings.GUEST_USER_REAPER_INTERVAL:
+    from main.guest_reaper import start_guest_user_reaper
+
+    start_guest_user_reaper(settings.GUEST_USER_REAPER_INTERVAL)
+
 app = application  # for vercel deployment